@@ -0,0 +1,3 @@
+from .sshserver import SSHServerFixture
+from .trees import make_tree
+from .suite import BenchmarkSuite, compare
@@ -0,0 +1,45 @@
+import argparse, sys
+from pyrc.bench.suite import BenchmarkSuite, compare, STRATEGIES
+from pyrc.bench.trees import TREES
+
+def main() -> None:
+	"""
+	python -m pyrc.bench run -o bench.json [--scale 0.5] [--repeat 3] [--trees tiny huge]
+	python -m pyrc.bench compare before.json after.json [--threshold 0.1]
+	"""
+	parser = argparse.ArgumentParser(prog = "python -m pyrc.bench", description = "pyrc transfer benchmarks")
+	commands = parser.add_subparsers(dest = "command", required = True)
+
+	run = commands.add_parser("run", help = "run the benchmark suite and save its results as JSON")
+	run.add_argument("-o", "--output", default = "bench.json")
+	run.add_argument("--workdir", default = None, help = "where trees are generated (kept between runs)")
+	run.add_argument("--scale", type = float, default = 1.0)
+	run.add_argument("--repeat", type = int, default = 3)
+	run.add_argument("--workers", type = int, default = 4)
+	run.add_argument("--trees", nargs = "+", choices = TREES, default = list(TREES))
+	run.add_argument("--strategies", nargs = "+", choices = STRATEGIES, default = list(STRATEGIES))
+
+	cmp = commands.add_parser("compare", help = "compare two result files")
+	cmp.add_argument("before")
+	cmp.add_argument("after")
+	cmp.add_argument("--threshold", type = float, default = 0.1)
+
+	args = parser.parse_args()
+	if args.command == "run":
+		suite = BenchmarkSuite(args.workdir, args.scale, args.repeat, args.trees, args.strategies, args.workers)
+		for r in suite.run():
+			rate = f"{r['throughput'] / (1 << 20):10.2f} MB/s" if r.get("throughput") else ""
+			latency = f"{r['latency'] * 1000:10.3f} ms/call" if "latency" in r else ""
+			print(f"{r['name']:28} {r['tree']:6} {r['median']:10.4f} s {rate}{latency}")
+		suite.save(args.output)
+	else:
+		regressions = 0
+		for r in compare(args.before, args.after, args.threshold):
+			regressions += r["regression"]
+			ratio = f"x{r['ratio']:.2f}" if r["ratio"] is not None else ""
+			flag = "REGRESSION" if r["regression"] else ""
+			print(f"{r['name']:28} {r['tree']:6} {r['before']:10.4f} s -> {r['after']:10.4f} s  {ratio} {flag}")
+		sys.exit(1 if regressions > 0 else 0)
+
+if __name__ == "__main__":
+	main()
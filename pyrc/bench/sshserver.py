@@ -0,0 +1,285 @@
+import os, socket, threading, subprocess
+import paramiko
+from paramiko import (
+	ServerInterface, SFTPServerInterface, SFTPServer, SFTPAttributes, SFTPHandle,
+	AUTH_SUCCESSFUL, OPEN_SUCCEEDED, SFTP_OK
+)
+
+def _set_file_attr(path, attr):
+	"""
+	SFTPServer.set_file_attr, except that sizes are set with truncate(2)
+	(paramiko reopens the file with "w+" which empties it first)
+	"""
+	if attr._flags & attr.FLAG_SIZE:
+		os.truncate(path, attr.st_size)
+		attr._flags &= ~attr.FLAG_SIZE
+	SFTPServer.set_file_attr(path, attr)
+
+# ------------------ LocalSFTPHandle
+class LocalSFTPHandle(SFTPHandle):
+	def stat(self):
+		try:
+			return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+		except OSError as e:
+			return SFTPServer.convert_errno(e.errno)
+
+	def chattr(self, attr):
+		try:
+			_set_file_attr(self.filename, attr)
+			return SFTP_OK
+		except OSError as e:
+			return SFTPServer.convert_errno(e.errno)
+
+# ------------------ LocalSFTPServer
+class LocalSFTPServer(SFTPServerInterface):
+	"""
+	SFTP subsystem serving the local filesystem (absolute paths, relative ones from the server's home)
+	"""
+	def __init__(self, server, *args, **kwargs):
+		super().__init__(server, *args, **kwargs)
+		self.home = server.home
+
+	def _realpath(self, path:str) -> str:
+		return os.path.join(self.home, path) if not os.path.isabs(path) else path
+
+	def list_folder(self, path):
+		path = self._realpath(path)
+		try:
+			out = []
+			for name in os.listdir(path):
+				attr = SFTPAttributes.from_stat(os.lstat(os.path.join(path, name)))
+				attr.filename = name
+				out.append(attr)
+			return out
+		except OSError as e:
+			return SFTPServer.convert_errno(e.errno)
+
+	def stat(self, path):
+		try:
+			return SFTPAttributes.from_stat(os.stat(self._realpath(path)))
+		except OSError as e:
+			return SFTPServer.convert_errno(e.errno)
+
+	def lstat(self, path):
+		try:
+			return SFTPAttributes.from_stat(os.lstat(self._realpath(path)))
+		except OSError as e:
+			return SFTPServer.convert_errno(e.errno)
+
+	def open(self, path, flags, attr):
+		path = self._realpath(path)
+		try:
+			mode = getattr(attr, "st_mode", None)
+			fd = os.open(path, flags, mode if mode is not None else 0o666)
+		except OSError as e:
+			return SFTPServer.convert_errno(e.errno)
+		if (flags & os.O_CREAT) and (attr is not None):
+			attr._flags &= ~attr.FLAG_PERMISSIONS
+			SFTPServer.set_file_attr(path, attr)
+		if flags & os.O_WRONLY:
+			fstr = "ab" if flags & os.O_APPEND else "wb"
+		elif flags & os.O_RDWR:
+			fstr = "a+b" if flags & os.O_APPEND else "r+b"
+		else:
+			fstr = "rb"
+		try:
+			f = os.fdopen(fd, fstr)
+		except OSError as e:
+			return SFTPServer.convert_errno(e.errno)
+		handle = LocalSFTPHandle(flags)
+		handle.filename = path
+		handle.readfile = f
+		handle.writefile = f
+		return handle
+
+	def remove(self, path):
+		try:
+			os.remove(self._realpath(path))
+		except OSError as e:
+			return SFTPServer.convert_errno(e.errno)
+		return SFTP_OK
+
+	def rename(self, oldpath, newpath):
+		try:
+			os.rename(self._realpath(oldpath), self._realpath(newpath))
+		except OSError as e:
+			return SFTPServer.convert_errno(e.errno)
+		return SFTP_OK
+
+	def posix_rename(self, oldpath, newpath):
+		return self.rename(oldpath, newpath)
+
+	def mkdir(self, path, attr):
+		try:
+			os.mkdir(self._realpath(path))
+		except OSError as e:
+			return SFTPServer.convert_errno(e.errno)
+		return SFTP_OK
+
+	def rmdir(self, path):
+		try:
+			os.rmdir(self._realpath(path))
+		except OSError as e:
+			return SFTPServer.convert_errno(e.errno)
+		return SFTP_OK
+
+	def chattr(self, path, attr):
+		try:
+			_set_file_attr(self._realpath(path), attr)
+		except OSError as e:
+			return SFTPServer.convert_errno(e.errno)
+		return SFTP_OK
+
+	def canonicalize(self, path):
+		return os.path.normpath(self._realpath(path))
+
+# ------------------ LocalSSHServer
+class LocalSSHServer(ServerInterface):
+	"""
+	paramiko server accepting any credentials and executing commands on localhost with bash
+	"""
+	def __init__(self, home:str) -> None:
+		self.home = home
+
+	def get_allowed_auths(self, username):
+		return "password,publickey"
+
+	def check_auth_password(self, username, password):
+		return AUTH_SUCCESSFUL
+
+	def check_auth_publickey(self, username, key):
+		return AUTH_SUCCESSFUL
+
+	def check_channel_request(self, kind, chanid):
+		return OPEN_SUCCEEDED
+
+	def check_channel_env_request(self, channel, name, value):
+		return False
+
+	def check_channel_exec_request(self, channel, command):
+		threading.Thread(target = self.__exec, args = (channel, command), daemon = True).start()
+		return True
+
+	def __exec(self, channel, command:bytes) -> None:
+		p = subprocess.Popen(
+			["bash", "-c", command.decode("utf-8")],
+			cwd = self.home,
+			stdin = subprocess.PIPE, stdout = subprocess.PIPE, stderr = subprocess.PIPE
+		)
+
+		def pump_stdin():
+			try:
+				while True:
+					data = channel.recv(32768)
+					if not data:
+						break
+					p.stdin.write(data)
+					p.stdin.flush()
+			except (OSError, ValueError):
+				pass
+			finally:
+				try:
+					p.stdin.close()
+				except OSError:
+					pass
+
+		def pump(src, send):
+			try:
+				while True:
+					data = src.read1(32768)
+					if not data:
+						break
+					send(data)
+			except (OSError, EOFError):
+				# The client closed the channel, stop the command
+				p.kill()
+
+		threads = [
+			threading.Thread(target = pump_stdin, daemon = True),
+			threading.Thread(target = pump, args = (p.stdout, channel.sendall), daemon = True),
+			threading.Thread(target = pump, args = (p.stderr, channel.sendall_stderr), daemon = True)
+		]
+		[t.start() for t in threads]
+		threads[1].join()
+		threads[2].join()
+		try:
+			status = p.wait()
+			# Killed by a signal: report it the way a shell does
+			channel.send_exit_status(status if status >= 0 else 128 - status)
+			channel.shutdown_write()
+		except (OSError, EOFError):
+			pass
+		# The channel is left for the client to close: closing it here could overtake the reply
+		# to the exec request, and the client would take the command for refused
+
+# ------------------ SSHServerFixture
+class SSHServerFixture(object):
+	"""
+	In-process SSH server listening on localhost, commands run as the current user.
+		with SSHServerFixture() as server:
+			fs = RemoteSSHFileSystem(**server.connect_kwargs())
+	"""
+	__hostkey = None
+
+	def __init__(self, home:str = None) -> None:
+		self.home = os.path.expanduser("~") if home is None else home
+		self.__socket = None
+		self.__transports = []
+		self.__thread = None
+		if SSHServerFixture.__hostkey is None:
+			SSHServerFixture.__hostkey = paramiko.RSAKey.generate(2048)
+
+	@property
+	def port(self) -> int:
+		return self.__socket.getsockname()[1]
+
+	def connect_kwargs(self) -> dict:
+		return {
+			"hostname" : "127.0.0.1",
+			"port" : self.port,
+			"username" : "pyrc",
+			"password" : "pyrc",
+			"look_for_keys" : False,
+			"allow_agent" : False
+		}
+
+	def start(self) -> 'SSHServerFixture':
+		self.__socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.__socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self.__socket.bind(("127.0.0.1", 0))
+		self.__socket.listen(64)
+		self.__thread = threading.Thread(target = self.__serve, daemon = True)
+		self.__thread.start()
+		return self
+
+	def __serve(self) -> None:
+		while True:
+			try:
+				client, addr = self.__socket.accept()
+			except OSError:
+				return
+			client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+			transport = paramiko.Transport(client)
+			transport.add_server_key(SSHServerFixture.__hostkey)
+			transport.set_subsystem_handler("sftp", SFTPServer, LocalSFTPServer)
+			try:
+				transport.start_server(server = LocalSSHServer(self.home))
+			except (paramiko.SSHException, EOFError, OSError):
+				# The client gave up during the handshake (e.g. an unknown host key)
+				transport.close()
+				continue
+			self.__transports.append(transport)
+
+	def stop(self) -> None:
+		if self.__socket is not None:
+			self.__socket.close()
+			self.__socket = None
+		for t in self.__transports:
+			t.close()
+		self.__transports = []
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, exception_type, exception_value, traceback):
+		self.stop()
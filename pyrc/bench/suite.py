@@ -0,0 +1,190 @@
+import os, json, time, shutil, platform, statistics, subprocess, tempfile
+import paramiko
+from pyrc.system.local import LocalFileSystem
+from pyrc.remote.sshconnector import RemoteSSHFileSystem
+from pyrc.remote.transfer import transfer
+from pyrc.bench.sshserver import SSHServerFixture
+from pyrc.bench.trees import TREES, make_tree
+
+# Directory strategies of transfer() that are benchmarked
+STRATEGIES = ("scp", "tar", "pack")
+
+def _commit() -> str:
+	"""
+	Commit of the pyrc sources, if they are a git checkout
+	"""
+	try:
+		out = subprocess.run(
+			["git", "rev-parse", "HEAD"],
+			cwd = os.path.dirname(os.path.abspath(__file__)),
+			stdout = subprocess.PIPE, stderr = subprocess.DEVNULL
+		)
+		return out.stdout.decode("utf-8").strip() if out.returncode == 0 else None
+	except OSError:
+		return None
+
+# ------------------ BenchmarkSuite
+class BenchmarkSuite(object):
+	"""
+	Transfer and listing benchmarks against an in-process SSH server (see SSHServerFixture) running commands on localhost.
+	The server shares the interpreter of the benchmark, so absolute numbers are pessimistic:
+	results are meant to be compared between commits on the same machine (see compare).
+		suite = BenchmarkSuite(workdir = "/tmp/pyrc-bench", scale = 0.5)
+		results = suite.run()
+		suite.save("bench.json")
+	"""
+	def __init__(self,
+			workdir:str = None,
+			scale:float = 1.0,
+			repeat:int = 3,
+			trees:'list[str]' = TREES,
+			strategies:'list[str]' = STRATEGIES,
+			workers:int = 4
+		) -> None:
+		"""
+		Args:
+			workdir (str, optional): Where trees are generated (and kept between runs) and copied. Defaults to a temporary directory.
+			scale (float, optional): Size factor of the synthetic trees (see make_tree). Defaults to 1.0.
+			repeat (int, optional): Runs of every case, the median is reported. Defaults to 3.
+			trees (list[str], optional): Synthetic trees to use. Defaults to all of them.
+			strategies (list[str], optional): Directory strategies of transfer() to compare. Defaults to STRATEGIES.
+			workers (int, optional): Workers of the parallel cases. Defaults to 4.
+		"""
+		self.workdir = tempfile.mkdtemp(prefix = "pyrc-bench-") if workdir is None else workdir
+		self.scale = scale
+		self.repeat = repeat
+		self.trees = list(trees)
+		self.strategies = list(strategies)
+		self.workers = workers
+		self.results:'list[dict]' = []
+
+	def meta(self) -> dict:
+		return {
+			"commit" : _commit(),
+			"date" : time.strftime("%Y-%m-%dT%H:%M:%S"),
+			"python" : platform.python_version(),
+			"paramiko" : paramiko.__version__,
+			"system" : platform.system(),
+			"scale" : self.scale,
+			"repeat" : self.repeat,
+			"workers" : self.workers
+		}
+
+	def case(self, name:str, tree:str, fct, setup = None, nbytes:int = None, nfiles:int = None, calls:int = 1) -> dict:
+		"""
+		Time 'fct' 'repeat' times ('setup' runs before each timing, untimed) and record the result.
+		Throughputs are given when the case moves 'nbytes' bytes, latencies are per call when 'fct' does 'calls' calls.
+		"""
+		seconds = []
+		for _ in range(self.repeat):
+			if setup is not None:
+				setup()
+			start = time.perf_counter()
+			fct()
+			seconds.append(time.perf_counter() - start)
+
+		median = statistics.median(seconds)
+		result = { "name" : name, "tree" : tree, "seconds" : seconds, "median" : median }
+		if nbytes is not None:
+			result["bytes"] = nbytes
+			result["throughput"] = nbytes / median if median > 0 else None
+		if nfiles is not None:
+			result["files"] = nfiles
+			result["files_per_second"] = nfiles / median if median > 0 else None
+		if calls > 1:
+			result["latency"] = median / calls
+		self.results.append(result)
+		return result
+
+	def run(self) -> 'list[dict]':
+		"""
+		Generate the trees and run every case
+		Returns:
+			list[dict]: one record per case (see case)
+		"""
+		self.results = []
+		local = LocalFileSystem()
+		with SSHServerFixture() as server:
+			remote = RemoteSSHFileSystem(**server.connect_kwargs())
+			remote.open()
+			try:
+				for tree in self.trees:
+					self.__run_tree(tree, local, remote)
+			finally:
+				remote.close()
+		return self.results
+
+	def __run_tree(self, tree:str, local:LocalFileSystem, remote:RemoteSSHFileSystem) -> None:
+		src = os.path.join(self.workdir, "trees", tree)
+		nfiles, nbytes = make_tree(src, tree, self.scale)
+		up = os.path.join(self.workdir, "up")
+		down = os.path.join(self.workdir, "down")
+
+		def clean(*dirs):
+			def setup():
+				for d in dirs:
+					shutil.rmtree(d, ignore_errors = True)
+					os.makedirs(d)
+				# The remote side saw nothing of it
+				remote.invalidate_stat_cache(*dirs)
+			return setup
+
+		# Directory transfers, for every strategy and in both directions
+		for strategy in self.strategies:
+			workers = 1 if strategy == "tar" else self.workers
+			self.case(
+				f"transfer.upload.{strategy}", tree,
+				lambda: transfer(src, up, local, remote, strategy = strategy, workers = workers),
+				setup = clean(up), nbytes = nbytes, nfiles = nfiles
+			)
+			self.case(
+				f"transfer.download.{strategy}", tree,
+				lambda: transfer(os.path.join(up, tree), down, remote, local, strategy = strategy, workers = workers),
+				setup = clean(down), nbytes = nbytes, nfiles = nfiles
+			)
+
+		# Connector entry points with their defaults
+		self.case("upload", tree, lambda: remote.upload(src, up), setup = clean(up), nbytes = nbytes, nfiles = nfiles)
+		self.case("download", tree, lambda: remote.download(os.path.join(up, tree), down), setup = clean(down), nbytes = nbytes, nfiles = nfiles)
+
+		# Listings and predicates of the remote copy
+		remote_root = os.path.join(up, tree)
+		self.case("lsdir", tree, lambda: remote.lsdir(remote_root), nfiles = nfiles)
+		self.case("walk0", tree, lambda: remote.walk0(remote_root))
+		probes = [os.path.join(remote_root, name) for name in sorted(os.listdir(src))[:20]]
+		for predicate in ("isfile", "isdir", "islink", "isexe"):
+			fct = getattr(remote, predicate)
+			self.case(predicate, tree, lambda: [fct(p) for p in probes], calls = len(probes))
+
+	def save(self, path:str) -> None:
+		"""
+		Write the metadata and results of the last run as JSON
+		"""
+		with open(path, "w") as f:
+			json.dump({ "meta" : self.meta(), "results" : self.results }, f, indent = 2)
+
+def compare(before:str, after:str, threshold:float = 0.1) -> 'list[dict]':
+	"""
+	Compare two result files of BenchmarkSuite.save, case by case (median times).
+	Args:
+		threshold (float, optional): Relative slowdown from which a case is flagged as a regression. Defaults to 0.1.
+	Returns:
+		list[dict]: name, tree, both medians, their ratio (after / before) and the regression flag of every case found in both files
+	"""
+	def load(path:str) -> dict:
+		with open(path, "r") as f:
+			return { (r["name"], r["tree"]) : r for r in json.load(f)["results"] }
+
+	old, new = load(before), load(after)
+	rows = []
+	for key in [k for k in old if k in new]:
+		ratio = new[key]["median"] / old[key]["median"] if old[key]["median"] > 0 else None
+		rows.append({
+			"name" : key[0],
+			"tree" : key[1],
+			"before" : old[key]["median"],
+			"after" : new[key]["median"],
+			"ratio" : ratio,
+			"regression" : ratio is not None and ratio > 1 + threshold
+		})
+	return rows
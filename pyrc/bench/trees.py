@@ -0,0 +1,48 @@
+import os, random
+
+# Synthetic trees of the benchmark suite, sizes are multiplied by 'scale'
+TREES = ("tiny", "huge", "deep")
+
+def make_tree(root:str, kind:str, scale:float = 1.0, seed:int = 0) -> 'tuple[int, int]':
+	"""
+	Create the synthetic tree 'kind' in the directory 'root' (created, and left as is if it already exists):
+		"tiny": many small files (2000 files of 10 bytes to 4KB in 40 directories)
+		"huge": few large incompressible files (3 files of 32MB)
+		"deep": a 64 levels deep chain of directories with a few files at every level
+	Args:
+		scale (float, optional): Multiplies the number of files ("tiny", "deep") or their sizes ("huge"). Defaults to 1.0.
+		seed (int, optional): Seed of the file sizes and contents. Defaults to 0.
+	Returns:
+		tuple[int, int]: number of files and total size (in bytes) of the tree
+	"""
+	if kind not in TREES:
+		raise ValueError(f"Unknown benchmark tree {kind}")
+
+	rand = random.Random(seed)
+	if not os.path.isdir(root):
+		os.makedirs(root)
+		if kind == "tiny":
+			dirs = [os.path.join(root, f"d{i:02d}") for i in range(40)]
+			[os.makedirs(d) for d in dirs]
+			for i in range(int(2000 * scale)):
+				with open(os.path.join(dirs[i % len(dirs)], f"f{i:06d}.txt"), "wb") as f:
+					f.write(rand.randbytes(rand.randint(10, 4096)))
+		elif kind == "huge":
+			for i in range(3):
+				with open(os.path.join(root, f"blob{i}.bin"), "wb") as f:
+					for _ in range(max(1, int(32 * scale))):
+						f.write(rand.randbytes(1 << 20))
+		elif kind == "deep":
+			node = root
+			for level in range(64):
+				for i in range(max(1, int(4 * scale))):
+					with open(os.path.join(node, f"f{i}.txt"), "wb") as f:
+						f.write(rand.randbytes(rand.randint(100, 8192)))
+				node = os.path.join(node, f"l{level:02d}")
+				os.makedirs(node)
+
+	nfiles, nbytes = 0, 0
+	for dirpath, dirnames, filenames in os.walk(root):
+		nfiles += len(filenames)
+		nbytes += sum([os.path.getsize(os.path.join(dirpath, f)) for f in filenames])
+	return nfiles, nbytes
@@ -69,11 +69,6 @@ class DockerContainer(FileSystemCommand):
 			"platform" : "unknown"
 		}
 
-	#@overrides
-	def ls(self, path:str)-> 'list[str]':
-		out = super().ls(path)
-		return out[0].split("\n")
-
 	def append_bashrc(self, line:str) -> None:
 		"""
 		Append the given line to the end of ~/.bashrc
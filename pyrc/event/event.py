@@ -1,7 +1,8 @@
+import os, codecs, collections, queue, selectors, threading
 from typing import Generator
 import rich
 from rich.console import Console
-from pyrc.event.progress import RemoteFileTransfer
+from pyrc.event.progress import RemoteFileTransfer, AggregateFileTransfer
 
 class bcolors:
     HEADER = '\033[95m'
@@ -14,11 +15,24 @@ class bcolors:
     BOLD = '\033[1m'
     UNDERLINE = '\033[4m'
 
+# Bytes asked to a flux per read, a read returns whatever is available up to this size
+FLUX_CHUNK = 1 << 20
+
 class FluxIterator:
+    """
+    Lines of a command output flux (a paramiko channel file, a subprocess pipe or a generator of chunks, like docker's),
+    without their newline. The flux is read by chunks of up to FLUX_CHUNK bytes, as soon as they are available,
+    decoded incrementally (a UTF-8 character may be cut between two chunks) and split in bulk.
+    Lines are the ones readline() gives (with '\n' removed), wherever chunks end.
+    Fluxes without a chunked read (e.g. ShellFlux) are read line by line.
+    With split = False, the decoded chunks are returned as they are read instead (newlines included).
+    """
 
-    # TODO : Use yield ? Can it be generic ?
     @staticmethod
     def next(flux) -> str:
+        """
+        Next line of 'flux', without reading ahead (the flux can be handed to another reader afterwards)
+        """
         # If the flux is not a Generator
         # We assume is a pipe-style object like in paramiko or subprocess
         if flux is None: return None
@@ -38,17 +52,193 @@ class FluxIterator:
             out = out.decode("utf-8")
         return out.strip('\n')
 
-    def __init__(self, flux):
+    @staticmethod
+    def reader(flux):
+        """
+        Function returning the next chunk (bytes or str) of 'flux', empty or None once it is exhausted
+        """
+        if isinstance(flux, Generator):
+            return lambda: next(flux, None)
+        channel = getattr(flux, "channel", None)
+        if channel is not None and hasattr(channel, "recv_stderr"):
+            # paramiko ChannelFile.read waits for a full chunk, the channel returns what it already received
+            if type(flux).__name__ == "ChannelStderrFile":
+                return lambda: channel.recv_stderr(FLUX_CHUNK)
+            return lambda: channel.recv(FLUX_CHUNK)
+        if hasattr(flux, "read1"):
+            # Buffered subprocess pipes: a single read of what is available
+            return lambda: flux.read1(FLUX_CHUNK)
+        return flux.readline
+
+    def __init__(self, flux, split:bool = True):
         self._flux = flux
+        self._split = split
+        self._read = None if flux is None else FluxIterator.reader(flux)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._lines = collections.deque()
+        # Start of a line whose end is not read yet
+        self._pending = ""
+
+    def feed(self, chunk) -> 'list[str]':
+        """
+        Lines completed by 'chunk' (bytes or str), or the last line if 'chunk' is empty or None (end of the flux)
+        """
+        if not chunk:
+            last = self._pending + self._decoder.decode(b"", final = True)
+            self._pending = ""
+            return [last] if last != "" else []
+        text = self._pending + (chunk if type(chunk) == str else self._decoder.decode(chunk))
+        if not self._split:
+            return [text] if text != "" else []
+        *lines, self._pending = text.split("\n")
+        return lines
+
+    def __fill(self) -> None:
+        chunk = self._read()
+        if not chunk:
+            self._read = None
+        self._lines.extend(self.feed(chunk))
 
     def __iter__(self):
         return self
 
     def __next__(self): # Python 2: def next(self)
-        n = FluxIterator.next(self._flux)
-        if n is None:
-            raise StopIteration
-        return n
+        while len(self._lines) == 0:
+            if self._read is None:
+                raise StopIteration
+            self.__fill()
+        return self._lines.popleft()
+
+class MergedFluxIterator:
+    """
+    Lines of the stdout and stderr fluxes of a command in their order of arrival, as (stdoutline, stderrline) pairs
+    where the other line is "". Both fluxes are drained together, so a command filling one of its pipes
+    while the other one is read never blocks:
+    paramiko channel files wait on their channel (recv_ready / recv_stderr_ready), subprocess pipes on a selector,
+    and other fluxes (generators, ShellFlux) are each read by a thread.
+    With split_stdout = False, stdout comes as raw text chunks instead of lines (see FluxIterator).
+    Readers that stop iterating early must close() the iterator before the fluxes are reused (e.g. by a PersistentShell):
+    it waits for the reading threads, which drain their flux to its end without keeping what they read.
+    """
+    # Lines read ahead by the threads of thread drained fluxes
+    QUEUE_SIZE = 4096
+
+    def __init__(self, stdout, stderr, split_stdout:bool = True):
+        self._pairs = MergedFluxIterator.pairs(stdout, stderr, split_stdout)
+
+    @staticmethod
+    def pairs(stdout, stderr, split_stdout:bool = True):
+        outit, errit = FluxIterator(stdout, split_stdout), FluxIterator(stderr)
+        if stdout is None or stderr is None:
+            for line in (outit if stderr is None else errit):
+                yield (line, "") if stderr is None else ("", line)
+            return
+
+        channel = getattr(stdout, "channel", None)
+        if channel is not None and channel is getattr(stderr, "channel", None) and hasattr(channel, "recv_stderr_ready"):
+            yield from MergedFluxIterator.__channel(channel, outit, errit)
+        elif os.name != "nt" and all(hasattr(f, "read1") and hasattr(f, "fileno") for f in (stdout, stderr)):
+            # Windows only selects sockets
+            yield from MergedFluxIterator.__pipes(stdout, stderr, outit, errit)
+        else:
+            yield from MergedFluxIterator.__threads(outit, errit)
+
+    @staticmethod
+    def __channel(channel, outit:FluxIterator, errit:FluxIterator):
+        # The channel's file descriptor is readable when either stream has data or the channel got EOF
+        selector = selectors.DefaultSelector()
+        selector.register(channel, selectors.EVENT_READ)
+        try:
+            while True:
+                # Read before the ready checks: nothing arrives after EOF
+                eof = channel.eof_received or channel.closed
+                ready = False
+                if channel.recv_ready():
+                    ready = True
+                    for line in outit.feed(channel.recv(FLUX_CHUNK)):
+                        yield line, ""
+                if channel.recv_stderr_ready():
+                    ready = True
+                    for line in errit.feed(channel.recv_stderr(FLUX_CHUNK)):
+                        yield "", line
+                if not ready:
+                    if eof:
+                        break
+                    selector.select()
+        finally:
+            selector.close()
+        for line in outit.feed(None):
+            yield line, ""
+        for line in errit.feed(None):
+            yield "", line
+
+    @staticmethod
+    def __pipes(stdout, stderr, outit:FluxIterator, errit:FluxIterator):
+        selector = selectors.DefaultSelector()
+        selector.register(stdout, selectors.EVENT_READ, data = (outit, True))
+        selector.register(stderr, selectors.EVENT_READ, data = (errit, False))
+        try:
+            while len(selector.get_map()) > 0:
+                for key, events in selector.select():
+                    chunk = key.fileobj.read1(FLUX_CHUNK)
+                    if not chunk:
+                        selector.unregister(key.fileobj)
+                    it, isout = key.data
+                    for line in it.feed(chunk):
+                        yield (line, "") if isout else ("", line)
+        finally:
+            selector.close()
+
+    @staticmethod
+    def __threads(outit:FluxIterator, errit:FluxIterator):
+        lines = queue.Queue(maxsize = MergedFluxIterator.QUEUE_SIZE)
+        stop = threading.Event()
+
+        def put(item) -> None:
+            # Gives up once the consumer stopped iterating
+            while not stop.is_set():
+                try:
+                    lines.put(item, timeout = 0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def reader(it:FluxIterator, isout:bool) -> None:
+            try:
+                for line in it:
+                    put((isout, line, None))
+                put((isout, None, None))
+            except BaseException as err:
+                put((isout, None, err))
+
+        threads = [
+            threading.Thread(target = reader, args = (it, isout), daemon = True, name = "pyrc-flux")
+            for it, isout in ((outit, True), (errit, False))
+        ]
+        [t.start() for t in threads]
+        try:
+            running = len(threads)
+            while running > 0:
+                isout, line, err = lines.get()
+                if err is not None:
+                    raise err
+                if line is None:
+                    running -= 1
+                else:
+                    yield (line, "") if isout else ("", line)
+        finally:
+            stop.set()
+            # Nothing may read the fluxes once the iteration is over
+            [t.join() for t in threads]
+
+    def close(self) -> None:
+        self._pairs.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._pairs)
 
 class Event(object):
     @property
@@ -74,17 +264,21 @@ class EventFlux(Event):
         self._stdinflux = None
         self._stdoutflux = None
         self._stderrflux = None
+        self._stdoutit = FluxIterator(None)
+        self._stderrit = FluxIterator(None)
 
     def begin(self, cmd, cwd, stdin, stdout, stderr):
         self._stdinflux = stdin
         self._stdoutflux = stdout
         self._stderrflux = stderr
+        self._stdoutit = FluxIterator(stdout)
+        self._stderrit = FluxIterator(stderr)
 
     def next_stdout(self) -> str:
-        return FluxIterator.next(self._stdoutflux)
+        return next(self._stdoutit, None)
 
     def next_stderr(self) -> str:
-        return FluxIterator.next(self._stderrflux)
+        return next(self._stderrit, None)
 
     def status(self):
         # Only check status when using paramiko channels
@@ -92,6 +286,9 @@ class EventFlux(Event):
         # This does not occurs with other librarys
         if type(self._stdoutflux) == 'ChannelFile':
             return self._stdoutflux.channel.recv_exit_status()
+        elif getattr(self._stdoutflux, "exit_status", None) is not None:
+            # Fluxes framing commands on a shared channel (PersistentShell) carry their own status
+            return self._stdoutflux.exit_status
         else: # defulat status is 'ok' status
             return 0
 
@@ -131,18 +328,110 @@ class CommandStorer(EventFlux):
         return self.__stdout, self.__stderr, self.status()
 
 class CommandScrapper(Event):
+    """
+    Base Event reading the stdout and stderr lines of a command as they arrive (see MergedFluxIterator)
+    and handing each of them to progress(stdoutline, stderrline), the other line being "".
+    Both outputs are read by begin(), until the command closes them.
+    """
     def __init__(self, caller, *args, **kwargs):
         Event.__init__(self, caller)
-        self._errit = None
 
     def begin(self, cmd, cwd, stdin, stdout, stderr):
-        self._errit = FluxIterator(stderr)
-        for out in FluxIterator(stdout):
-            self.progress(stdoutline = out, stderrline = "")
+        pairs = MergedFluxIterator(stdout, stderr)
+        try:
+            for out, err in pairs:
+                self.progress(stdoutline = out, stderrline = err)
+        finally:
+            # Even if progress() raised, the fluxes are not read anymore once begin() returns
+            pairs.close()
+
+    def end(self):
+        return None
+
+
+class CommandCallbackEvent(EventFlux, CommandScrapper):
+    """
+    Event handing every stdout line to 'callback(line)' as soon as it is read instead of storing it.
+    Memory stays constant no matter how much the command prints.
+    end() returns an empty stdout, the captured stderr lines and status.
+    """
+    def __init__(self, caller, callback, *args, **kwargs):
+        EventFlux.__init__(self, caller)
+        CommandScrapper.__init__(self, caller)
+        self.__callback = callback
+        self.__stderr:'list[str]' = []
+
+    def begin(self, cmd, cwd, stdin, stdout, stderr):
+        EventFlux.begin(self, cmd, cwd, stdin, stdout, stderr)
+        CommandScrapper.begin(self, cmd, cwd, stdin, stdout, stderr)
+
+    def progress(self, stdoutline:str, stderrline:str):
+        if stdoutline != "":
+            self.__callback(stdoutline)
+
+        if stderrline != "":
+            self.__stderr.append(stderrline)
 
     def end(self):
-        for out in self._errit:
-            self.progress(stdoutline = out, stderrline = "")
+        return [], self.__stderr, self.status()
+
+
+class CommandRawEvent(EventFlux, CommandScrapper):
+    """
+    Event keeping stdout exactly as the command wrote it, for outputs that are not line based (e.g. 'env -0').
+    end() returns stdout as a single string (newlines included), the captured stderr lines and status.
+    """
+    def __init__(self, caller, *args, **kwargs):
+        EventFlux.__init__(self, caller)
+        CommandScrapper.__init__(self, caller)
+        self.__stdout:'list[str]' = []
+        self.__stderr:'list[str]' = []
+
+    def begin(self, cmd, cwd, stdin, stdout, stderr):
+        EventFlux.begin(self, cmd, cwd, stdin, stdout, stderr)
+        pairs = MergedFluxIterator(stdout, stderr, split_stdout = False)
+        try:
+            for out, err in pairs:
+                self.progress(stdoutline = out, stderrline = err)
+        finally:
+            pairs.close()
+
+    def progress(self, stdoutline:str, stderrline:str):
+        if stdoutline != "":
+            self.__stdout.append(stdoutline)
+
+        if stderrline != "":
+            self.__stderr.append(stderrline)
+
+    def end(self):
+        return "".join(self.__stdout), self.__stderr, self.status()
+
+
+class CommandStreamEvent(EventFlux):
+    """
+    Event reading stdout lazily: end() returns a generator of stdout lines in place of the stdout list.
+    Lines are only read from the flux as the generator is consumed, so nothing is buffered
+    and the channel's flow control holds the command back while the consumer is busy.
+    Stderr and status are only known once the command is done, end() returns them as None.
+    Closing the generator early closes the flux.
+    """
+    def __init__(self, caller, *args, **kwargs):
+        EventFlux.__init__(self, caller)
+
+    def __lines(self):
+        flux = self._stdoutflux
+        try:
+            for line in FluxIterator(flux):
+                if line != "":
+                    yield line
+        finally:
+            if isinstance(flux, Generator):
+                flux.close()
+            elif getattr(flux, "channel", None) is not None:
+                flux.channel.close()
+
+    def end(self):
+        return self.__lines(), None, None
 
 
 class CommandStoreEvent(CommandStorer, CommandScrapper):
@@ -226,19 +515,13 @@ class CommandPrettyPrintEvent(CommandStoreEvent):
     def progress(self, stdoutline:str, stderrline:str):
         CommandStoreEvent.progress(self, stdoutline, stderrline)
         
-        if stdoutline != "":
+        # Like the stored output, stderr lines are printed along with stdout
+        line = stdoutline if stdoutline != "" else stderrline
+        if line != "":
             if self._use_rich:
-                rich.print(("\t" if self._print_input else "") + stdoutline)
+                rich.print(("\t" if self._print_input else "") + line)
             else:
-                print(("\t" if self._print_input else "") + stdoutline)
-            
-        if stderrline != "" and self._print_errors:
-            # Sometime a log of-non erros logs (warnings for example) ends up in the error flux
-            # We only print them as error if the status of the sydout channel is not 0
-            # Also we only evaluate the status here as stdout is printed in real-time
-            # But errors are printed when the command as terminated
-            if self.status() != 0:
-                print(bcolors.FAIL + ("\t" if self._print_input else "") + "[ERROR]", stderrline + bcolors.ENDC)
+                print(("\t" if self._print_input else "") + line)
         
     def end(self):
         out, err, status = CommandStoreEvent.end(self)
@@ -262,4 +545,24 @@ class RichRemoteFileTransferEvent(FileTransferEvent):
         return self.__progress.stop()
 
     def progress(self, *args, **kwargs):
-        self.__progress.file_progress(filename = args[0], size = args[1], sent = args[2])
\ No newline at end of file
+        self.__progress.file_progress(filename = args[0], size = args[1], sent = args[2])
+
+class RichAggregateTransferEvent(FileTransferEvent):
+    """
+    One progress bar for all the files of a transfer (see AggregateFileTransfer),
+    progress(nbytes, nfiles) gives the bytes and files done so far
+    """
+    def __init__(self, caller, *args, **kwargs):
+        super().__init__(caller)
+        self.__progress = None
+
+    def begin(self, *args, **kwargs):
+        self.__progress = AggregateFileTransfer(**kwargs)
+        return self.__progress.start()
+
+    def end(self, *args, **kwargs):
+        return self.__progress.stop()
+
+    def progress(self, *args, **kwargs):
+        self.__progress.progress(nbytes = args[0], nfiles = args[1])
+
@@ -161,3 +161,47 @@ class DirectoryTransferProgress():
 	def file_progress(self, filename:str, size:float, sent:float):
 		return self.__filesprogress.file_progress_callback(filename, size, sent)
 """	
+
+class AggregateFileTransfer():
+	"""
+	Single progress bar for a whole set of files (bytes and files done over their totals)
+	"""
+	@staticmethod
+	def getLayout():
+		return Progress(
+					SpinnerColumn(),
+					TextColumn("[bold blue]{task.fields[files]}/{task.fields[nfiles]} files", justify="left"),
+					BarColumn(bar_width=None),
+					"[progress.percentage]{task.percentage:>3.1f}%",
+					"•",
+					DownloadColumn(),
+					"•",
+					TransferSpeedColumn(),
+					"•",
+					TimeRemainingColumn(),
+					"•",
+					TextColumn("[bold green]{task.fields[fromprettyname]}"),
+					"→",
+					TextColumn("[bold green]{task.fields[toprettyname]}")
+				)
+
+	def __init__(self, nfiles:int, nbytes:int, from_fs:'FileSystem', to_fs:'FileSystem'):
+		self.__layout = AggregateFileTransfer.getLayout()
+		self.__taskid = self.__layout.add_task(
+			description = "[red]Copying...",
+			total = nbytes,
+			files = 0,
+			nfiles = nfiles,
+			fromprettyname = from_fs.name(),
+			toprettyname = to_fs.name()
+		)
+
+	def start(self):
+		self.__layout.start()
+
+	def stop(self):
+		self.__layout.stop()
+
+	def progress(self, nbytes:int, nfiles:int):
+		self.__layout.update(self.__taskid, completed = nbytes, files = nfiles)
+
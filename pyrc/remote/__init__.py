@@ -1,3 +1,9 @@
 from .sshconnector import RemoteSSHFileSystem, _CMDEXEC_REMOTE_ENABLED_
+from .hostfacts import HostFactsCache
+from .sftpfile import SFTPStream
+from .sync import SyncPlan
+from .packing import PackPlan
+from .planner import TransferPlan, CostModel, plan_transfer
+from .resumable import TransferJournal
 from .remote import *
 from .transfer import transfer
\ No newline at end of file
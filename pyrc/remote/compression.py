@@ -0,0 +1,211 @@
+import zlib
+
+try:
+	import zstandard
+	_ZSTD_ENABLED_ = True
+except BaseException as err:
+	_ZSTD_ENABLED_ = False
+
+try:
+	import lz4.frame
+	_LZ4_ENABLED_ = True
+except BaseException as err:
+	_LZ4_ENABLED_ = False
+
+# Optional python package of each codec
+PACKAGES = {"zstd" : "zstandard", "lz4" : "lz4"}
+
+def _missing_package(compression:str) -> RuntimeError:
+	return RuntimeError(f"Compression {compression} needs the python package '{PACKAGES[compression]}'")
+
+# ------------------ Codec
+class Codec(object):
+	"""
+	Stream compression format available both in python (to compress or decompress local streams)
+	and as a command line tool (to compress or decompress remote streams inside a pipe).
+	"""
+	def __init__(self, name:str, tool:str, level:int = None) -> None:
+		self.name = name
+		# Remote command line tool
+		self.tool = tool
+		# Compression level, None for the codec's default
+		self.level = level
+
+	def compress_cmd(self) -> str:
+		"""
+		Shell command compressing its stdin to its stdout
+		"""
+		level = "" if self.level is None else f" -{self.level}"
+		return f"{self.tool} -c -q{level}"
+
+	def decompress_cmd(self) -> str:
+		"""
+		Shell command decompressing its stdin to its stdout
+		"""
+		return f"{self.tool} -d -c -q"
+
+	def compressor(self):
+		"""
+		Object with compress(data) and flush() methods (like zlib.compressobj)
+		"""
+		raise RuntimeError(f"Compression {self.name} cannot compress local streams")
+
+	def decompressor(self):
+		"""
+		Object with a decompress(data) method (like zlib.decompressobj)
+		"""
+		raise RuntimeError(f"Compression {self.name} cannot decompress local streams")
+
+class GzipCodec(Codec):
+	def __init__(self, level:int = None) -> None:
+		super().__init__("gzip", "gzip", level)
+
+	#@overrides
+	def compressor(self):
+		# wbits = 31 writes gzip headers, so that the gzip tool reads the stream
+		return zlib.compressobj(6 if self.level is None else self.level, zlib.DEFLATED, 31)
+
+	#@overrides
+	def decompressor(self):
+		return zlib.decompressobj(31)
+
+class ZstdCodec(Codec):
+	def __init__(self, level:int = None) -> None:
+		if not _ZSTD_ENABLED_:
+			raise _missing_package("zstd")
+		super().__init__("zstd", "zstd", level)
+
+	#@overrides
+	def compressor(self):
+		return zstandard.ZstdCompressor(level = 3 if self.level is None else self.level).compressobj()
+
+	#@overrides
+	def decompressor(self):
+		return zstandard.ZstdDecompressor().decompressobj()
+
+class Lz4Codec(Codec):
+	def __init__(self, level:int = None) -> None:
+		if not _LZ4_ENABLED_:
+			raise _missing_package("lz4")
+		super().__init__("lz4", "lz4", level)
+
+	#@overrides
+	def compressor(self):
+		compressor = lz4.frame.LZ4FrameCompressor(compression_level = 0 if self.level is None else self.level)
+		# The frame header is returned by begin() and must lead the stream
+		header = [compressor.begin()]
+		class FrameCompressor(object):
+			def compress(self, data:bytes) -> bytes:
+				return (header.pop() if len(header) > 0 else b"") + compressor.compress(data)
+			def flush(self) -> bytes:
+				return (header.pop() if len(header) > 0 else b"") + compressor.flush()
+		return FrameCompressor()
+
+	#@overrides
+	def decompressor(self):
+		return lz4.frame.LZ4FrameDecompressor()
+
+# Codecs by preference order for "auto" (best ratio for the speed first)
+CODECS = {
+	"zstd" : (ZstdCodec, lambda: _ZSTD_ENABLED_),
+	"lz4" : (Lz4Codec, lambda: _LZ4_ENABLED_),
+	"gzip" : (GzipCodec, lambda: True)
+}
+
+def local_codecs() -> 'list[str]':
+	"""
+	Names of the codecs usable locally (zstd and lz4 need the optional 'zstandard' and 'lz4' packages)
+	"""
+	return [name for name, (codec, enabled) in CODECS.items() if enabled()]
+
+def is_compressible(sample:bytes, threshold:float = 0.9) -> bool:
+	"""
+	Tells wether or not compressing data like 'sample' is worth it:
+	a fast zlib pass must shrink the sample under 'threshold' times its size.
+	Already compressed data (archives, media, ...) does not shrink and would only cost CPU time.
+	"""
+	if len(sample) == 0:
+		return False
+	return len(zlib.compress(sample, 1)) < threshold * len(sample)
+
+def get_codec(compression:str, level:int = None, remote_tools:'list[str]' = None, sample:bytes = None) -> Codec:
+	"""
+	Codec named 'compression' ("gzip", "zstd" or "lz4"), or chosen automatically if 'compression' is "auto":
+	None if 'sample' is not compressible (see is_compressible), otherwise the first codec
+	of CODECS usable locally and whose tool is in 'remote_tools' (all tools are assumed available if None).
+	Raises:
+		RuntimeError: if the codec is unknown or not usable locally
+	"""
+	if compression is None:
+		return None
+	if compression == "auto":
+		if sample is not None and not is_compressible(sample):
+			return None
+		for name in local_codecs():
+			if remote_tools is None or name in remote_tools:
+				return CODECS[name][0](level)
+		return None
+	if compression not in CODECS:
+		raise RuntimeError(f"Unknown compression {compression}")
+	codec, enabled = CODECS[compression]
+	if not enabled():
+		raise _missing_package(compression)
+	return codec(level)
+
+# ------------------ CompressWriter
+class CompressWriter(object):
+	"""
+	Write-only file-like object compressing what is written into the file-like object 'raw'
+	"""
+	def __init__(self, raw, codec:Codec) -> None:
+		self.__raw = raw
+		self.__compressor = codec.compressor()
+
+	def write(self, data) -> int:
+		out = self.__compressor.compress(bytes(data))
+		if len(out) > 0:
+			self.__raw.write(out)
+		return len(data)
+
+	def flush(self) -> None:
+		self.__raw.flush()
+
+	def close(self) -> None:
+		"""
+		Write the end of the compressed stream (raw is left open)
+		"""
+		if self.__compressor is not None:
+			self.__raw.write(self.__compressor.flush())
+			self.__raw.flush()
+			self.__compressor = None
+
+# ------------------ DecompressReader
+class DecompressReader(object):
+	"""
+	Read-only file-like object decompressing what is read from the file-like object 'raw'
+	"""
+	def __init__(self, raw, codec:Codec, chunk:int = 1 << 16) -> None:
+		self.__raw = raw
+		self.__decompressor = codec.decompressor()
+		self.__chunk = chunk
+		# Decompressed data not read yet starts at self.__pos
+		self.__buffer = b""
+		self.__pos = 0
+		self.__eof = False
+
+	def read(self, size:int = -1) -> bytes:
+		while not self.__eof and (size < 0 or len(self.__buffer) - self.__pos < size):
+			data = self.__raw.read(self.__chunk)
+			if len(data) == 0:
+				self.__eof = True
+			else:
+				self.__buffer = self.__buffer[self.__pos:] + self.__decompressor.decompress(data)
+				self.__pos = 0
+		if size < 0:
+			size = len(self.__buffer) - self.__pos
+		out = self.__buffer[self.__pos:self.__pos + size]
+		self.__pos += len(out)
+		return out
+
+	def close(self) -> None:
+		pass
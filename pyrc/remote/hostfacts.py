@@ -0,0 +1,99 @@
+import os, json, time, hashlib
+
+# Tools whose availability is probed
+TOOLS = ["bash", "python3", "find", "tar", "ssh", "gzip", "zstd", "lz4", "zip", "unzip", "sha256sum", "md5sum", "rsync"]
+
+# Facts of hosts none of the probes could read
+UNKNOWN_FACTS = { "system" : "unknown", "release" : "", "shell" : "", "tools" : [] }
+
+def probe_command() -> str:
+	"""
+	Single cheap command printing system, release, login shell and the available TOOLS as 'key=value' lines
+	"""
+	tools = " ".join(TOOLS)
+	return (
+		"echo system=$(uname -s 2>/dev/null); echo release=$(uname -r 2>/dev/null); echo shell=$SHELL; "
+		f"for t in {tools}; do command -v $t >/dev/null && echo tool=$t; done; true"
+	)
+
+def parse_probe(lines:'list[str]') -> 'dict':
+	"""
+	Host facts from the output of probe_command, None if the output is not the probe's
+	(e.g. hosts without uname or a POSIX shell, like Windows OpenSSH).
+	'system' and 'release' match what python's platform.system() and platform.release() return.
+	"""
+	facts = { "system" : "", "release" : "", "shell" : "", "tools" : [] }
+	for line in lines:
+		key, sep, value = line.strip().partition("=")
+		if sep == "":
+			continue
+		if key == "tool" and value in TOOLS:
+			facts["tools"].append(value)
+		elif key in ("system", "release", "shell"):
+			facts[key] = value
+	if facts["system"] == "" or facts["release"] == "":
+		return None
+	return facts
+
+def python_probe_command() -> str:
+	"""
+	Fallback probe of system and release through the remote python3
+	"""
+	return "python3 -c \"import platform; print(platform.system()); print(platform.release())\""
+
+def parse_python_probe(lines:'list[str]') -> 'dict':
+	"""
+	Host facts from the output of python_probe_command, None if the output is not the probe's
+	"""
+	lines = [l.strip() for l in lines if l.strip() != ""]
+	if len(lines) != 2:
+		return None
+	return { "system" : lines[0], "release" : lines[1], "shell" : "", "tools" : [] }
+
+def hostfacts_key(user:str, hostname:str, port:int, hostkey) -> str:
+	"""
+	Cache key of a host, a new host key means new facts
+	"""
+	hostkey = "" if hostkey is None else f"{hostkey.get_name()} {hostkey.get_base64()}"
+	return hashlib.sha256(f"{user}@{hostname}:{port} {hostkey}".encode("utf-8")).hexdigest()
+
+# ------------------ HostFactsCache
+class HostFactsCache(object):
+	"""
+	Host facts persisted on the local disk as a JSON file, entries older than 'ttl' seconds are ignored
+	"""
+	@staticmethod
+	def default_path() -> str:
+		return os.path.join(os.path.expanduser("~"), ".cache", "pyrc", "hostfacts.json")
+
+	def __init__(self, path:str = None, ttl:float = 24 * 3600) -> None:
+		self.path = HostFactsCache.default_path() if path is None else path
+		self.ttl = ttl
+
+	def __read(self) -> dict:
+		try:
+			with open(self.path, "r") as f:
+				return json.load(f)
+		except (OSError, ValueError):
+			return {}
+
+	def load(self, key:str) -> dict:
+		"""
+		Returns the facts stored for 'key' or None if missing or expired
+		"""
+		entry = self.__read().get(key)
+		if entry is None or time.time() - entry["time"] > self.ttl:
+			return None
+		return entry["facts"]
+
+	def save(self, key:str, facts:dict) -> None:
+		entries = self.__read()
+		entries[key] = {"time" : time.time(), "facts" : facts}
+		os.makedirs(os.path.dirname(self.path), exist_ok = True)
+		# Write then rename so that concurrent readers never see a partial file
+		tmp = f"{self.path}.{os.getpid()}.tmp"
+		with open(tmp, "w") as f:
+			json.dump(entries, f)
+		os.replace(tmp, self.path)
+
+# ------------------ HostFactsCache
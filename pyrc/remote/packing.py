@@ -0,0 +1,154 @@
+import queue, threading
+from concurrent.futures import ThreadPoolExecutor
+import pyrc.event.event as pyevent
+from pyrc.system.filesystem import FileSystem
+from pyrc.remote.sync import manifest, _batched
+from pyrc.remote.tarstream import upload_members, download_members
+
+try:
+	from scp import SCPClient
+	_CMDEXEC_REMOTE_ENABLED_ = True
+except BaseException as err:
+	_CMDEXEC_REMOTE_ENABLED_ = False
+
+# Most files of a bundle
+BUNDLE_FILES = 4096
+
+# ------------------ PackPlan
+class PackPlan(object):
+	"""
+	How a directory mixing many small files with a few large ones is sent.
+	Files under 'threshold' bytes are packed into bundles of at most 'bundle_size' bytes (and 'bundle_files' files),
+	each bundle being sent as a single tar stream, while larger files are sent one by one with scp.
+	Bundles and large files are then scheduled together, largest first, over 'workers' channels (see run).
+		plan = PackPlan("/data/src", "/remote/dst/src", LocalFileSystem(), remote, threshold = 256 << 10)
+		print(plan)
+		plan.run(workers = 8)
+	"""
+	def __init__(self,
+			from_dirpath:str,
+			to_dirpath:str,
+			from_fs:FileSystem,
+			to_fs:FileSystem,
+			threshold:int = 1 << 20,
+			bundle_size:int = 32 << 20,
+			bundle_files:int = BUNDLE_FILES
+		) -> None:
+		self.from_dirpath = from_dirpath
+		self.to_dirpath = to_dirpath
+		self.from_fs = from_fs
+		self.to_fs = to_fs
+
+		files, dirs = manifest(from_fs, from_dirpath)
+		# Relative paths of the directories to create
+		self.dirs:'list[str]' = sorted(dirs)
+		# Relative paths of the files sent one by one and their sizes
+		self.large:'dict[str,int]' = {}
+		# Relative paths of the files of each bundle, and the bundles sizes
+		self.bundles:'list[list[str]]' = []
+		self.bundle_sizes:'list[int]' = []
+
+		# Files of the same directory go in the same bundle as far as possible
+		for rel in sorted(files):
+			size = files[rel][0]
+			if size >= threshold:
+				self.large[rel] = size
+				continue
+			if len(self.bundles) == 0 or self.bundle_sizes[-1] + size > bundle_size or len(self.bundles[-1]) >= bundle_files:
+				self.bundles.append([])
+				self.bundle_sizes.append(0)
+			self.bundles[-1].append(rel)
+			self.bundle_sizes[-1] += size
+
+	def __from(self, rel:str) -> str:
+		return self.from_fs.join(self.from_dirpath, *rel.split("/"))
+
+	def __to(self, rel:str) -> str:
+		return self.to_fs.join(self.to_dirpath, *rel.split("/"))
+
+	@property
+	def nbytes(self) -> int:
+		"""
+		Number of bytes to send
+		"""
+		return sum(self.large.values()) + sum(self.bundle_sizes)
+
+	def __str__(self) -> str:
+		return (
+			f"{self.from_fs.name()}:{self.from_dirpath} -> {self.to_fs.name()}:{self.to_dirpath} : "
+			f"{sum([len(b) for b in self.bundles])} small files in {len(self.bundles)} bundles ({sum(self.bundle_sizes)} bytes), "
+			f"{len(self.large)} large files ({sum(self.large.values())} bytes)"
+		)
+
+	def run(self, workers:int = 1) -> None:
+		"""
+		Replace the destination directory by the source one: create the whole tree first,
+		then send bundles and large files over 'workers' channels.
+		Jobs are queued largest first and taken by the first idle worker (see _parallel_scp).
+		"""
+		upload = type(self.from_fs).__name__ == 'LocalFileSystem' and type(self.to_fs).__name__ == 'RemoteSSHFileSystem'
+		download = type(self.from_fs).__name__ == 'RemoteSSHFileSystem' and type(self.to_fs).__name__ == 'LocalFileSystem'
+		if not (upload or download) or not _CMDEXEC_REMOTE_ENABLED_:
+			raise RuntimeError(f"Packed transfer between {type(self.from_fs).__name__} and {type(self.to_fs).__name__} is not supported.")
+		remote = self.to_fs if upload else self.from_fs
+
+		if self.to_fs.isdir(self.to_dirpath):
+			self.to_fs.rmdir(self.to_dirpath, recur = True)
+		with _batched(self.to_fs):
+			self.to_fs.mkdir(self.to_dirpath, parents = True, exist_ok = True)
+			[self.to_fs.mkdir(self.__to(rel), parents = True, exist_ok = True) for rel in self.dirs]
+
+		jobs = queue.Queue()
+		sized = [(size, "file", rel) for rel, size in self.large.items()] \
+			+ [(size, "bundle", members) for size, members in zip(self.bundle_sizes, self.bundles)]
+		for size, kind, job in sorted(sized, key = lambda j: j[0], reverse = True):
+			jobs.put((kind, job))
+		failed = threading.Event()
+
+		transferevent = pyevent.RichRemoteFileTransferEvent(caller = None)
+		transferevent.begin(
+			files = [self.__from(rel) for rel in self.large],
+			from_fs = self.from_fs,
+			to_fs = self.to_fs
+		)
+
+		def worker():
+			# Opened on the first large file of this worker
+			scp = None
+			try:
+				while not failed.is_set():
+					try:
+						kind, job = jobs.get_nowait()
+					except queue.Empty:
+						return
+					if kind == "bundle" and upload:
+						upload_members(self.from_dirpath, job, self.to_dirpath, self.from_fs, self.to_fs)
+					elif kind == "bundle":
+						download_members(self.from_dirpath, job, self.to_dirpath, self.from_fs, self.to_fs)
+					else:
+						scp = SCPClient(remote.sshcon.get_transport(), progress = transferevent.progress) if scp is None else scp
+						to_dir = self.to_fs.dirname(self.__to(job))
+						if upload:
+							scp.put(files = [self.__from(job)], recursive = False, remote_path = to_dir)
+						else:
+							scp.get(remote_path = self.__from(job), recursive = False, local_path = to_dir)
+			except BaseException:
+				# Stop the other workers
+				failed.set()
+				raise
+			finally:
+				if scp is not None:
+					scp.close()
+
+		try:
+			with ThreadPoolExecutor(max_workers = max(1, workers), thread_name_prefix = "pyrc-pack") as executor:
+				futures = [executor.submit(worker) for _ in range(max(1, min(workers, jobs.qsize())))]
+			# Raises the first worker error
+			[f.result() for f in futures]
+		finally:
+			transferevent.end()
+			# Files were written behind the destination connector's back
+			if upload:
+				self.to_fs.invalidate_stat_cache(self.to_dirpath)
+
+# ------------------ PackPlan
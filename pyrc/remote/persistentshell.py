@@ -0,0 +1,101 @@
+import uuid, threading
+
+# ------------------ ShellFlux
+class ShellFlux(object):
+	"""
+	File-like view of one command's output on a PersistentShell channel.
+	readline() returns b"" once the command's sentinel is read, like a pipe reaching EOF.
+	The stdout sentinel also carries the command exit status (the shell's own status if it died before).
+	"""
+	def __init__(self, file, sentinel:bytes) -> None:
+		self.__file = file
+		self.__sentinel = sentinel
+		self.__done = False
+		self.exit_status:int = None
+
+	def readline(self) -> bytes:
+		if self.__done:
+			return b""
+		line = self.__file.readline()
+		if line == b"":
+			# Channel closed: the shell died before the sentinel, its status is the command's
+			self.__done = True
+			channel = getattr(self.__file, "channel", None)
+			if channel is not None and channel.exit_status_ready():
+				self.exit_status = channel.recv_exit_status()
+			return b""
+		i = line.find(self.__sentinel)
+		if i < 0:
+			return line
+		self.__done = True
+		status = line[i + len(self.__sentinel):].strip()
+		if status != b"":
+			self.exit_status = int(status)
+		# Output that did not end with a newline is glued to the sentinel
+		return line[:i]
+
+	def drain(self) -> None:
+		while self.readline() != b"":
+			pass
+
+# ------------------ PersistentShell
+class PersistentShell(object):
+	"""
+	One long-lived bash on a single SSH channel.
+	Each command runs in a subshell (so 'cd', 'export' or 'exit' do not leak to the next one)
+	with stdin redirected from /dev/null, followed by unique sentinels on stdout (with the exit status) and stderr.
+	Commands are serialized: submit() locks the shell until release() has drained the command's outputs.
+	"""
+	def __init__(self, transport) -> None:
+		self.__transport = transport
+		self.__channel = None
+		self.__lock = threading.Lock()
+		self.__stdout:ShellFlux = None
+		self.__stderr:ShellFlux = None
+
+	def is_open(self) -> bool:
+		return self.__channel is not None and not self.__channel.closed and not self.__channel.exit_status_ready()
+
+	def open(self) -> None:
+		self.__channel = self.__transport.open_session()
+		self.__channel.exec_command("exec bash -s")
+		self.__stdin = self.__channel.makefile_stdin("wb")
+		self.__stdoutfile = self.__channel.makefile("rb")
+		self.__stderrfile = self.__channel.makefile_stderr("rb")
+
+	def close(self) -> None:
+		if self.__channel is not None:
+			self.__channel.close()
+			self.__channel = None
+
+	def submit(self, cmd:str) -> 'tuple[None, ShellFlux, ShellFlux]':
+		"""
+		Send a command to the shell.
+		Returns (stdin, stdout, stderr) fluxes of the command, release() must be called once they have been read.
+		"""
+		self.__lock.acquire()
+		try:
+			# The shell died (or was never started), start a new one
+			if not self.is_open():
+				self.open()
+			sentinel = f"__pyrc_{uuid.uuid4().hex}__"
+			self.__stdin.write(
+				f"(\n{cmd}\n) </dev/null; printf '%s %d\\n' {sentinel} $?; printf '%s\\n' {sentinel} >&2\n".encode("utf-8")
+			)
+			self.__stdin.flush()
+		except BaseException:
+			self.__lock.release()
+			raise
+		self.__stdout = ShellFlux(self.__stdoutfile, sentinel.encode("utf-8"))
+		self.__stderr = ShellFlux(self.__stderrfile, sentinel.encode("utf-8"))
+		return None, self.__stdout, self.__stderr
+
+	def release(self) -> None:
+		"""
+		Drain what the last command's reader left and unlock the shell
+		"""
+		try:
+			self.__stdout.drain()
+			self.__stderr.drain()
+		finally:
+			self.__lock.release()
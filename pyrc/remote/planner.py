@@ -0,0 +1,244 @@
+import zlib
+from pyrc.system.filesystem import FileSystem
+from pyrc.remote.sync import manifest
+from pyrc.remote.packing import BUNDLE_FILES
+from pyrc.remote.compression import Codec, get_codec
+
+# Most channels an automatic plan opens when the caller does not bound it
+PLAN_WORKERS = 8
+
+# ------------------ CostModel
+class CostModel(object):
+	"""
+	Predicted duration (in seconds) of each way of sending a file or a tree, from its statistics
+	(see TransferPlan.stats) and the measures of the link (see RemoteSSHFileSystem.link).
+	Constants are class attributes, subclass it (or set them on an instance) to calibrate them for a setup.
+	All channels of a connection share its TCP connection: parallel channels hide latencies, not bandwidth.
+	"""
+	# Round trips of a scp (channel open, exec, protocol acknowledgements) and its other per file costs (command start up)
+	scp_round_trips = 3
+	scp_file = 5e-3
+	# Round trips to start a streamed command (channel open, exec)
+	stream_round_trips = 2
+	# Cost of a file inside a tar stream (header, open and close on both sides)
+	tar_file = 2e-4
+	# Bytes added to a tar stream per file (header)
+	tar_header = 512
+	# Cost of a file copied locally (see LocalCopy)
+	copy_file = 5e-5
+	# Bytes per second of a local copy
+	copy_rate = 1 << 30
+	# Bytes of input compressed per second by each codec
+	codec_rates = { "zstd" : 300 << 20, "lz4" : 600 << 20, "gzip" : 60 << 20 }
+
+	def __init__(self, rtt:float, bandwidth:float) -> None:
+		"""
+		Args:
+			rtt (float): Round trip time of the link (seconds)
+			bandwidth (float): Bytes per second of the link in the transfer direction
+		"""
+		self.rtt = rtt
+		self.bandwidth = bandwidth
+
+	def send(self, nbytes:int) -> float:
+		return nbytes / self.bandwidth
+
+	def scp(self, stats:dict, workers:int = 1) -> float:
+		"""
+		One scp per file on 'workers' channels, plus one command per directory
+		"""
+		per_file = self.scp_round_trips * self.rtt + self.scp_file
+		per_dir = self.stream_round_trips * self.rtt
+		latency = (stats["files"] * per_file) / max(1, workers) + stats["dirs"] * per_dir
+		# The largest file is sent by a single channel
+		return max(latency + self.send(stats["bytes"]), per_file + self.send(stats["largest"]))
+
+	def stream(self, stats:dict, codec:Codec = None, ratio:float = 1.0) -> float:
+		"""
+		A single stream (the file, or a tar stream of the tree), compressed with 'codec' to 'ratio' times its size
+		"""
+		nbytes = stats["bytes"] + (stats["files"] * self.tar_header if stats["dirs"] > 0 else 0)
+		setup = self.stream_round_trips * self.rtt + stats["files"] * self.tar_file
+		if codec is None:
+			return setup + self.send(nbytes)
+		# Compression and sending overlap, the slowest of both sets the pace
+		return setup + max(self.send(nbytes * ratio), nbytes / self.codec_rates.get(codec.name, 100 << 20))
+
+	def pack(self, stats:dict, workers:int = 1) -> float:
+		"""
+		Small files in tar bundles and large files with scp, on 'workers' channels (see PackPlan)
+		"""
+		bundles = stats["bundles"]
+		large = stats["files"] - stats["small"]
+		per_large = self.scp_round_trips * self.rtt + self.scp_file
+		per_bundle = self.stream_round_trips * self.rtt + stats["small"] / bundles * self.tar_file if bundles > 0 else 0
+		# Bundles and large files are jobs spread over the workers, the longest job is taken by a single one
+		latency = max(
+			(bundles * per_bundle + large * per_large) / max(1, workers),
+			max(per_bundle, per_large if large > 0 else 0)
+		)
+		# The tree is created in a single batch of commands
+		return self.stream_round_trips * self.rtt + latency + self.send(stats["bytes"] + stats["small"] * self.tar_header)
+
+	def copy(self, stats:dict, workers:int = 1) -> float:
+		"""
+		Local copy on 'workers' threads (see LocalCopy)
+		"""
+		return stats["files"] * self.copy_file / max(1, workers) + stats["bytes"] / self.copy_rate
+
+# ------------------ CostModel
+
+# ------------------ TransferPlan
+class TransferPlan(object):
+	"""
+	How transfer(strategy = "auto") sends 'from_path': the chosen 'strategy' ("scp", "tar" or "pack" for directories,
+	"scp" or "stream" for files, "relay" between two remote hosts, "copy" between local paths),
+	its 'workers' and 'codec', the predicted duration of every candidate (see CostModel) and what they were computed from.
+	"""
+	def __init__(self,
+			from_path:str,
+			from_fs:FileSystem,
+			to_fs:FileSystem,
+			stats:dict,
+			link:dict,
+			candidates:'dict[str, tuple[str, int, Codec, float]]'
+		) -> None:
+		self.from_path = from_path
+		self.from_fs = from_fs
+		self.to_fs = to_fs
+		# files, dirs, bytes, largest, small (files under the pack threshold), bundles and ratio (compressed / raw size of a sample)
+		self.stats = stats
+		# rtt and bandwidth of the link, None between local paths
+		self.link = link
+		# Predicted seconds by candidate name
+		self.candidates = { name : candidate[3] for name, candidate in candidates.items() }
+		name = min(candidates, key = lambda n: candidates[n][3])
+		self.choice = name
+		self.strategy, self.workers, self.codec, self.predicted = candidates[name]
+
+	def as_dict(self) -> dict:
+		return {
+			"strategy" : self.strategy,
+			"workers" : self.workers,
+			"codec" : None if self.codec is None else self.codec.name,
+			"predicted" : self.predicted,
+			"candidates" : dict(self.candidates),
+			"stats" : dict(self.stats),
+			"link" : None if self.link is None else dict(self.link)
+		}
+
+	def __str__(self) -> str:
+		others = ", ".join([f"{name} {seconds:.2f}s" for name, seconds in sorted(self.candidates.items(), key = lambda c: c[1]) if name != self.choice])
+		return (
+			f"{self.from_fs.name()}:{self.from_path} -> {self.to_fs.name()} : {self.choice}, predicted {self.predicted:.2f}s "
+			f"for {self.stats['files']} files ({self.stats['bytes']} bytes)" + (f" (rejected: {others})" if others != "" else "")
+		)
+
+# ------------------ TransferPlan
+
+def _remote(fs:FileSystem) -> bool:
+	return type(fs).__name__ == 'RemoteSSHFileSystem'
+
+def _stats(from_path:str, from_fs:FileSystem, pack_threshold:int, pack_bundle_size:int) -> dict:
+	from pyrc.remote.transfer import _file_sizes
+	if from_fs.isfile(from_path):
+		size = _file_sizes(from_fs, [from_path])[0]
+		return { "files" : 1, "dirs" : 0, "bytes" : size, "largest" : size, "small" : 0, "bundles" : 0, "ratio" : 1.0 }
+
+	files, dirs = manifest(from_fs, from_path)
+	sizes = [size for size, mtime in files.values()]
+	small = [size for size in sizes if size < pack_threshold]
+	return {
+		"files" : len(sizes),
+		# The root directory is created too
+		"dirs" : len(dirs) + 1,
+		"bytes" : sum(sizes),
+		"largest" : max(sizes, default = 0),
+		"small" : len(small),
+		"bundles" : max(-(-sum(small) // pack_bundle_size), -(-len(small) // BUNDLE_FILES)),
+		"ratio" : 1.0
+	}
+
+def plan_transfer(
+	from_path:str,
+	from_fs:FileSystem,
+	to_fs:FileSystem,
+	workers:int = PLAN_WORKERS,
+	compression:str = "auto",
+	compression_level:int = None,
+	pack_threshold:int = 1 << 20,
+	pack_bundle_size:int = 32 << 20,
+	model:type = CostModel) -> TransferPlan:
+	"""
+	Choose how to send 'from_path' of 'from_fs' to 'to_fs' (see transfer) by predicting the duration of every strategy:
+	the source is inspected (number and sizes of files, compressibility of a sample, see pyrc.remote.compression)
+	and so is the link to the remote host (see RemoteSSHFileSystem.link, measured once per connection).
+	Args:
+		workers (int, optional): Most channels (or threads for local copies) the plan may use. Defaults to PLAN_WORKERS.
+		compression (str, optional): Codec of the compressed candidates, "auto" for the best one available on both sides
+			(none if the sample does not compress), None to leave compression out. Defaults to "auto".
+		compression_level (int, optional): Level of the compression codec. Defaults to the codec's default.
+		pack_threshold (int, optional): Size under which files are bundled by the "pack" candidate. Defaults to 1MB.
+		pack_bundle_size (int, optional): Size of the bundles of the "pack" candidate. Defaults to 32MB.
+		model (type, optional): CostModel class to predict durations with. Defaults to CostModel.
+	Returns:
+		TransferPlan: the fastest predicted candidate
+	"""
+	from pyrc.remote.transfer import _sample, _remote_tools
+
+	stats = _stats(from_path, from_fs, pack_threshold, pack_bundle_size)
+	isdir = stats["dirs"] > 0
+	counts = sorted(set([1] + [w for w in (4, workers) if 1 < w <= workers]))
+	candidates = {}
+
+	if not _remote(from_fs) and not _remote(to_fs):
+		cost = model(0.0, model.copy_rate)
+		link = None
+		if isdir:
+			candidates["copy"] = ("copy", workers, None, cost.copy(stats, workers))
+		else:
+			candidates["copy"] = ("copy", 1, None, cost.copy(stats))
+		return TransferPlan(from_path, from_fs, to_fs, stats, link, candidates)
+
+	codec = None
+	if compression is not None and stats["bytes"] > 0:
+		codec = get_codec(compression, compression_level, _remote_tools(from_fs, to_fs))
+	sample = _sample(from_fs, from_path) if codec is not None else b""
+	if len(sample) > 0:
+		stats["ratio"] = len(zlib.compress(sample, 1)) / len(sample)
+	if compression == "auto" and stats["ratio"] >= 0.9:
+		# Not worth the CPU time (see is_compressible)
+		codec = None
+
+	if _remote(from_fs) and _remote(to_fs):
+		up, down = to_fs.link(), from_fs.link()
+		link = { "rtt" : up["rtt"] + down["rtt"], "bandwidth" : min(up["upload"], down["download"]) }
+	elif _remote(to_fs):
+		up = to_fs.link()
+		link = { "rtt" : up["rtt"], "bandwidth" : up["upload"] }
+	else:
+		down = from_fs.link()
+		link = { "rtt" : down["rtt"], "bandwidth" : down["download"] }
+	cost = model(link["rtt"], link["bandwidth"])
+
+	if _remote(from_fs) and _remote(to_fs):
+		candidates["relay"] = ("relay", 1, None, cost.stream(stats))
+		if codec is not None:
+			candidates[f"relay+{codec.name}"] = ("relay", 1, codec, cost.stream(stats, codec, stats["ratio"]))
+		return TransferPlan(from_path, from_fs, to_fs, stats, link, candidates)
+
+	if not isdir:
+		candidates["scp"] = ("scp", 1, None, cost.scp(stats))
+		if codec is not None:
+			candidates[f"stream+{codec.name}"] = ("stream", 1, codec, cost.stream(stats, codec, stats["ratio"]))
+		return TransferPlan(from_path, from_fs, to_fs, stats, link, candidates)
+
+	for w in counts:
+		candidates[f"scp x{w}"] = ("scp", w, None, cost.scp(stats, w))
+	candidates["tar"] = ("tar", 1, None, cost.stream(stats))
+	if codec is not None:
+		candidates[f"tar+{codec.name}"] = ("tar", 1, codec, cost.stream(stats, codec, stats["ratio"]))
+	if stats["small"] > 0:
+		for w in counts:
+			candidates[f"pack x{w}"] = ("pack", w, None, cost.pack(stats, w))
+	return TransferPlan(from_path, from_fs, to_fs, stats, link, candidates)
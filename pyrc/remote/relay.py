@@ -0,0 +1,167 @@
+import queue, threading
+from pyrc.remote.compression import Codec
+from pyrc.remote.tarstream import _pipe, _close_channel
+
+# Size of the blocks read from the source channel
+RELAY_CHUNK = 1 << 20
+# Blocks buffered between the two hosts, bounds the memory used by a relay
+RELAY_DEPTH = 16
+
+def _relay(from_channel, to_channel, chunk:int = RELAY_CHUNK, depth:int = RELAY_DEPTH) -> None:
+	"""
+	Copy the stdout of 'from_channel' into the stdin of 'to_channel' through a bounded queue:
+	a thread receives from the source host while the calling thread sends to the destination host,
+	so both links are busy at the same time. The queue being bounded, a slow destination
+	stops the reads from the source (and the SSH flow control then pauses the source command).
+	"""
+	blocks = queue.Queue(maxsize = depth)
+	stop = threading.Event()
+
+	def receive():
+		try:
+			while not stop.is_set():
+				data = from_channel.recv(chunk)
+				blocks.put(data)
+				if len(data) == 0:
+					return
+		except BaseException as err:
+			blocks.put(err)
+
+	receiver = threading.Thread(target = receive, name = "pyrc-relay", daemon = True)
+	receiver.start()
+	try:
+		while True:
+			data = blocks.get()
+			if isinstance(data, BaseException):
+				raise data
+			if len(data) == 0:
+				break
+			to_channel.sendall(data)
+		to_channel.shutdown_write()
+	except BaseException:
+		stop.set()
+		from_channel.close()
+		# Unblock the receiver if it waits for room in the queue
+		while receiver.is_alive():
+			try:
+				blocks.get(timeout = 0.1)
+			except queue.Empty:
+				pass
+		raise
+
+def _run_relay(from_cmd:str, to_cmd:str, from_fs:'RemoteSSHFileSystem', to_fs:'RemoteSSHFileSystem') -> None:
+	from_channel = from_fs.exec_channel(from_cmd)
+	to_channel = to_fs.exec_channel(to_cmd)
+	try:
+		_relay(from_channel, to_channel)
+	except BaseException:
+		from_channel.close()
+		# The destination command stopped first, its error explains the failure
+		if to_channel.exit_status_ready():
+			_close_channel(to_channel, to_cmd)
+		to_channel.close()
+		raise
+	_close_channel(from_channel, from_cmd)
+	_close_channel(to_channel, to_cmd)
+
+def relay_tar(from_dirpath:str, to_dirpath:str, from_fs:'RemoteSSHFileSystem', to_fs:'RemoteSSHFileSystem', codec:Codec = None) -> str:
+	"""
+	Copy the directory 'from_dirpath' of a remote host into the directory 'to_dirpath' of another one:
+	the tar stream of 'tar -c' on the source host is relayed in memory to 'tar -x' on the destination host (see _relay),
+	nothing is written on the local disk. With a codec, the stream is compressed on the source host
+	and decompressed on the destination host. Symbolic links are followed, as in transfer_dir.
+	Returns:
+		The new directory path in 'to_fs'
+	"""
+	from_cmd = _pipe(f"tar -c -h -f - -C {from_fs.dirname(from_dirpath)} {from_fs.basename(from_dirpath)}", None if codec is None else codec.compress_cmd(), False)
+	to_cmd = f"mkdir -p {to_dirpath} && " + _pipe(f"tar -x -f - -C {to_dirpath}", None if codec is None else codec.decompress_cmd(), True)
+	received = to_fs.join(to_dirpath, from_fs.basename(from_dirpath))
+	try:
+		_run_relay(from_cmd, to_cmd, from_fs, to_fs)
+	finally:
+		# Files were written behind the destination connector's back
+		to_fs.invalidate_stat_cache(received)
+	return received
+
+def relay_file(from_path:str, to_dirpath:str, from_fs:'RemoteSSHFileSystem', to_fs:'RemoteSSHFileSystem', codec:Codec = None) -> str:
+	"""
+	Copy the file 'from_path' of a remote host into the directory 'to_dirpath' of another one:
+	the stdout of a 'cat' on the source host is relayed in memory to the stdin of a 'cat' on the destination host (see _relay)
+	Returns:
+		The new file path in 'to_fs'
+	"""
+	received = to_fs.join(to_dirpath, from_fs.basename(from_path))
+	from_cmd = f"cat {from_path}" if codec is None else f"{codec.compress_cmd()} < {from_path}"
+	to_cmd = _pipe(f"cat > {received}", None if codec is None else codec.decompress_cmd(), True)
+	try:
+		_run_relay(from_cmd, to_cmd, from_fs, to_fs)
+	finally:
+		to_fs.invalidate_stat_cache(received)
+	return received
+
+def push(from_path:str, to_dirpath:str, from_fs:'RemoteSSHFileSystem', to_fs:'RemoteSSHFileSystem', codec:Codec = None) -> str:
+	"""
+	Copy the file or directory 'from_path' of a remote host into the directory 'to_dirpath' of another one
+	by having the source host connect to the destination host itself ('ssh' from the source host, in batch mode),
+	so the data does not go through this machine at all.
+	The source host must reach the destination host as 'to_fs.hostname' and be allowed to log in without a password
+	(a key of its own or a forwarded agent).
+	Returns:
+		The new path in 'to_fs'
+	"""
+	received = to_fs.join(to_dirpath, from_fs.basename(from_path))
+	ssh = f"ssh -o BatchMode=yes -p {to_fs.port} {to_fs.user}@{to_fs.hostname}"
+	compress = "" if codec is None else f" | {codec.compress_cmd()}"
+	decompress = "" if codec is None else f"{codec.decompress_cmd()} | "
+	if from_fs.isdir(from_path):
+		cmd = f"set -o pipefail 2>/dev/null; tar -c -h -f - -C {from_fs.dirname(from_path)} {from_fs.basename(from_path)}{compress}" \
+			+ f" | {ssh} 'mkdir -p {to_dirpath} && {decompress}tar -x -f - -C {to_dirpath}'"
+	else:
+		cmd = f"set -o pipefail 2>/dev/null; cat {from_path}{compress} | {ssh} '{decompress}cat > {received}'"
+	channel = from_fs.exec_channel(cmd)
+	try:
+		channel.shutdown_write()
+		_close_channel(channel, cmd)
+	finally:
+		to_fs.invalidate_stat_cache(received)
+	return received
+
+def can_push(from_fs:'RemoteSSHFileSystem', to_fs:'RemoteSSHFileSystem', timeout:int = 5) -> bool:
+	"""
+	True if the host of 'from_fs' can log into the host of 'to_fs' without a password (see push)
+	"""
+	if not from_fs.has_tool("ssh"):
+		return False
+	channel = from_fs.exec_channel(f"ssh -o BatchMode=yes -o ConnectTimeout={timeout} -p {to_fs.port} {to_fs.user}@{to_fs.hostname} true")
+	channel.shutdown_write()
+	status = channel.recv_exit_status()
+	channel.close()
+	return status == 0
+
+def transfer_remote(from_path:str, to_dirpath:str, from_fs:'RemoteSSHFileSystem', to_fs:'RemoteSSHFileSystem', codec:Codec = None, mode:str = "relay") -> str:
+	"""
+	Transfert a file or directory between two RemoteSSHFileSystem. Like transfer_dir, an existing destination directory is replaced.
+	Args:
+		codec (Codec, optional): Compress the stream on the source host (see pyrc.remote.compression). Defaults to None.
+		mode (str, optional): "relay" (bytes go through this machine's memory, see relay_tar and relay_file),
+			"push" (the source host sends to the destination host itself, see push)
+			or "auto" (push if the source host can log into the destination host, see can_push). Defaults to "relay".
+	Returns:
+		The new path in 'to_fs'
+	"""
+	from_path = from_fs.abspath(from_path)
+	to_dirpath = to_fs.abspath(to_dirpath)
+	if mode not in ("relay", "push", "auto"):
+		raise RuntimeError(f"Unknown remote transfer mode {mode}")
+
+	isdir = from_fs.isdir(from_path)
+	if isdir:
+		todir = to_fs.join(to_dirpath, from_fs.basename(from_path))
+		if to_fs.isdir(todir):
+			to_fs.rmdir(todir, recur = True)
+
+	if mode == "push" or (mode == "auto" and can_push(from_fs, to_fs)):
+		return push(from_path, to_dirpath, from_fs, to_fs, codec)
+	if isdir:
+		return relay_tar(from_path, to_dirpath, from_fs, to_fs, codec)
+	return relay_file(from_path, to_dirpath, from_fs, to_fs, codec)
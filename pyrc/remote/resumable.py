@@ -0,0 +1,234 @@
+import os, json, hashlib
+from pyrc.system.filesystem import FileSystem
+
+# Size of the checkpointed chunks
+CHUNK_SIZE = 64 << 20
+# Suffix of files being received, renamed once complete
+PART_SUFFIX = ".pyrc-part"
+
+# ------------------ TransferJournal
+class TransferJournal(object):
+	"""
+	Local record of the confirmed chunks of one file transfer:
+	a JSON header (source size, mtime and chunk size) followed by one sha256 digest line per confirmed chunk.
+	Lines are only appended (and synced to disk) so checkpointing a chunk costs the same however large the file is.
+	"""
+	@staticmethod
+	def default_dir() -> str:
+		return os.path.join(os.path.expanduser("~"), ".cache", "pyrc", "transfers")
+
+	@staticmethod
+	def for_transfer(from_fs:FileSystem, from_path:str, to_fs:FileSystem, to_path:str, journal_dir:str = None) -> 'TransferJournal':
+		"""
+		Journal of the transfer of 'from_path' to 'to_path', the same transfer always gets the same journal
+		"""
+		key = hashlib.sha256(f"{from_fs.name()}:{from_path}|{to_fs.name()}:{to_path}".encode("utf-8")).hexdigest()
+		return TransferJournal(os.path.join(TransferJournal.default_dir() if journal_dir is None else journal_dir, f"{key}.journal"))
+
+	def __init__(self, path:str) -> None:
+		self.path = path
+
+	def load(self, header:dict) -> 'list[str]':
+		"""
+		Digests of the confirmed chunks, empty if there is no journal or if it was written for another 'header'
+		(the source file changed)
+		"""
+		try:
+			with open(self.path, "r") as f:
+				lines = f.read().split("\n")
+			if json.loads(lines[0]) != header:
+				return []
+			# The last line may have been cut by a crash
+			return [l for l in lines[1:] if len(l) == 64]
+		except (OSError, ValueError):
+			return []
+
+	def start(self, header:dict, digests:'list[str]') -> None:
+		"""
+		(Re)write the journal with the given confirmed chunks
+		"""
+		os.makedirs(os.path.dirname(self.path), exist_ok = True)
+		with open(self.path, "w") as f:
+			f.write(json.dumps(header) + "\n" + "".join([d + "\n" for d in digests]))
+			f.flush()
+			os.fsync(f.fileno())
+
+	def confirm(self, digest:str) -> None:
+		with open(self.path, "a") as f:
+			f.write(digest + "\n")
+			f.flush()
+			os.fsync(f.fileno())
+
+	def exists(self) -> bool:
+		return os.path.isfile(self.path)
+
+	def remove(self) -> None:
+		if os.path.isfile(self.path):
+			os.remove(self.path)
+
+# ------------------ TransferJournal
+
+def _local_digest(path:str, index:int, chunk_size:int) -> str:
+	h = hashlib.sha256()
+	with open(path, "rb") as f:
+		f.seek(index * chunk_size)
+		h.update(f.read(chunk_size))
+	return h.hexdigest()
+
+def _remote_digest(fs:'RemoteSSHFileSystem', path:str, index:int, chunk_size:int) -> str:
+	out = fs.evaluate(f"dd if={path} bs={chunk_size} skip={index} count=1 2>/dev/null | sha256sum")
+	return out[-1].split(" ")[0] if len(out) > 0 else ""
+
+def _verified(digests:'list[str]', size:int, chunk_size:int, local_digest, remote_digest) -> 'list[str]':
+	"""
+	Confirmed chunks that can be trusted: the partial file must hold them,
+	and the last one must hash to its journal digest on both sides (older ones are dropped until one does)
+	"""
+	digests = digests[:size // chunk_size]
+	while len(digests) > 0:
+		i = len(digests) - 1
+		if local_digest(i) == digests[i] and remote_digest(i) == digests[i]:
+			break
+		digests.pop()
+	return digests
+
+def resumable_upload(from_path:str, to_dirpath:str, from_fs:FileSystem, to_fs:'RemoteSSHFileSystem',
+		chunk_size:int = CHUNK_SIZE, journal_dir:str = None, progress = None) -> str:
+	"""
+	Upload the local file 'from_path' into the remote directory 'to_dirpath' over SFTP, chunk by chunk.
+	Each chunk is confirmed by the server (closing the remote file answers once its writes are done, and its size is checked)
+	before its digest is appended to the local journal (see TransferJournal).
+	If the transfer is interrupted, the next call resumes after the last chunk whose digest matches on both sides.
+	The file is written as '<name>.pyrc-part' and renamed once complete.
+	Args:
+		progress (optional): scp-like callback(filename, size, sent). Defaults to None.
+	Returns:
+		The new file path in 'to_fs'
+	"""
+	received = to_fs.join(to_dirpath, from_fs.basename(from_path))
+	part = received + PART_SUFFIX
+	st = os.stat(from_path)
+	header = { "size" : st.st_size, "mtime" : st.st_mtime, "chunk_size" : chunk_size }
+	journal = TransferJournal.for_transfer(from_fs, from_path, to_fs, received, journal_dir)
+	sftp = to_fs.sftp()
+
+	digests = journal.load(header)
+	if len(digests) > 0:
+		try:
+			part_size = sftp.stat(part).st_size
+		except FileNotFoundError:
+			part_size = 0
+		digests = _verified(
+			digests, part_size, chunk_size,
+			lambda i: _local_digest(from_path, i, chunk_size),
+			lambda i: _remote_digest(to_fs, part, i, chunk_size)
+		)
+	journal.start(header, digests)
+
+	offset = len(digests) * chunk_size
+	if len(digests) == 0:
+		# Create (or empty) the partial file
+		sftp.open(part, "w").close()
+	else:
+		# Drop what was written after the last confirmed chunk
+		sftp.truncate(part, offset)
+
+	with open(from_path, "rb") as src:
+		src.seek(offset)
+		while offset < st.st_size:
+			data = src.read(chunk_size)
+			with sftp.open(part, "r+") as dst:
+				dst.set_pipelined(True)
+				dst.seek(offset)
+				dst.write(data)
+			offset += len(data)
+			if sftp.stat(part).st_size != offset:
+				raise RuntimeError(f"Upload of {from_path} failed: {part} was not fully written at offset {offset}")
+			journal.confirm(hashlib.sha256(data).hexdigest())
+			if progress is not None:
+				progress(from_path, st.st_size, offset)
+
+	sftp.posix_rename(part, received)
+	to_fs.invalidate_stat_cache(received, part)
+	journal.remove()
+	return received
+
+def resumable_download(from_path:str, to_dirpath:str, from_fs:'RemoteSSHFileSystem', to_fs:FileSystem,
+		chunk_size:int = CHUNK_SIZE, journal_dir:str = None, progress = None) -> str:
+	"""
+	Download the remote file 'from_path' into the local directory 'to_dirpath' over SFTP, chunk by chunk.
+	Each chunk is synced to the local disk before its digest is appended to the local journal (see TransferJournal).
+	If the transfer is interrupted, the next call resumes after the last chunk whose digest matches on both sides.
+	The file is written as '<name>.pyrc-part' and renamed once complete.
+	Args:
+		progress (optional): scp-like callback(filename, size, sent). Defaults to None.
+	Returns:
+		The new file path in 'to_fs'
+	"""
+	received = to_fs.join(to_dirpath, from_fs.basename(from_path))
+	part = received + PART_SUFFIX
+	sftp = from_fs.sftp()
+	st = sftp.stat(from_path)
+	header = { "size" : st.st_size, "mtime" : st.st_mtime, "chunk_size" : chunk_size }
+	journal = TransferJournal.for_transfer(from_fs, from_path, to_fs, received, journal_dir)
+
+	digests = journal.load(header)
+	if len(digests) > 0:
+		digests = _verified(
+			digests, os.path.getsize(part) if os.path.isfile(part) else 0, chunk_size,
+			lambda i: _local_digest(part, i, chunk_size),
+			lambda i: _remote_digest(from_fs, from_path, i, chunk_size)
+		)
+	journal.start(header, digests)
+
+	offset = len(digests) * chunk_size
+	with open(part, "r+b" if len(digests) > 0 else "wb") as dst, sftp.open(from_path, "r") as src:
+		# Drop what was written after the last confirmed chunk
+		dst.truncate(offset)
+		dst.seek(offset)
+		while offset < st.st_size:
+			length = min(chunk_size, st.st_size - offset)
+			# Pipelined reads of the whole chunk
+			data = b"".join(src.readv([(o, min(src.MAX_REQUEST_SIZE, offset + length - o)) for o in range(offset, offset + length, src.MAX_REQUEST_SIZE)]))
+			dst.write(data)
+			dst.flush()
+			os.fsync(dst.fileno())
+			offset += len(data)
+			journal.confirm(hashlib.sha256(data).hexdigest())
+			if progress is not None:
+				progress(from_path, st.st_size, offset)
+
+	os.replace(part, received)
+	journal.remove()
+	return received
+
+def _supported(from_fs:FileSystem, to_fs:FileSystem) -> bool:
+	return (type(from_fs).__name__, type(to_fs).__name__) in [
+		('LocalFileSystem', 'RemoteSSHFileSystem'),
+		('RemoteSSHFileSystem', 'LocalFileSystem')
+	]
+
+def resumable_pending(from_path:str, to_dirpath:str, from_fs:FileSystem, to_fs:FileSystem, journal_dir:str = None) -> bool:
+	"""
+	True if a resumable transfer of the file 'from_path' to the directory 'to_dirpath' was interrupted (its journal is still there)
+	"""
+	if not _supported(from_fs, to_fs):
+		return False
+	received = to_fs.join(to_fs.abspath(to_dirpath), from_fs.basename(from_path))
+	return TransferJournal.for_transfer(from_fs, from_fs.abspath(from_path), to_fs, received, journal_dir).exists()
+
+def resumable_transfer(from_path:str, to_dirpath:str, from_fs:FileSystem, to_fs:FileSystem,
+		chunk_size:int = CHUNK_SIZE, journal_dir:str = None, progress = None) -> str:
+	"""
+	Transfert a FILE from one filesystem to a directory in another one, resuming an interrupted transfer
+	of the same file if any (see resumable_upload and resumable_download)
+	Returns:
+		The new file path in 'to_fs'
+	"""
+	from_path = from_fs.abspath(from_path)
+	to_dirpath = to_fs.abspath(to_dirpath)
+	if not _supported(from_fs, to_fs):
+		raise RuntimeError(f"Resumable transfer between {type(from_fs).__name__} and {type(to_fs).__name__} is not supported.")
+	if type(to_fs).__name__ == 'RemoteSSHFileSystem':
+		return resumable_upload(from_path, to_dirpath, from_fs, to_fs, chunk_size, journal_dir, progress)
+	return resumable_download(from_path, to_dirpath, from_fs, to_fs, chunk_size, journal_dir, progress)
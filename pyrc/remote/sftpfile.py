@@ -0,0 +1,129 @@
+import io
+
+# ------------------ SFTPStream
+class SFTPStream(io.RawIOBase):
+	"""
+	Binary file-like object over a paramiko SFTPFile.
+	Reads are pipelined: the file is fetched by windows of 'window' bytes, each window being requested
+	as many concurrent SFTP reads (SFTPFile.readv) while the previous one is consumed,
+	so at most two windows are held in memory no matter the size of the file.
+	Read-ahead only happens on sequential reads, random accesses fetch the window they need.
+	Writes are pipelined (the server acknowledgements are not waited for).
+	Wrap it in io.BufferedReader/io.BufferedWriter for small reads or writes.
+	"""
+	def __init__(self, sftpfile, mode:str, window:int = 8 << 20) -> None:
+		super().__init__()
+		self.__file = sftpfile
+		self.__mode = mode
+		self.__window = window
+		self.__pos = 0
+		# Window being read: its offset and content
+		self.__offset = 0
+		self.__data = b""
+		# Offset of the window requested ahead, and the reads delivering it
+		self.__next:tuple = None
+		# Known size of the file: reads past the end are never requested (SFTP would fail the whole read)
+		self.__size = 0 if "w" in mode else self.__file.stat().st_size
+		if self.writable():
+			self.__file.set_pipelined(True)
+		if "a" in mode:
+			self.__pos = self.__size
+
+	@property
+	def mode(self) -> str:
+		return self.__mode
+
+	def readable(self) -> bool:
+		return "r" in self.__mode or "+" in self.__mode
+
+	def writable(self) -> bool:
+		return "w" in self.__mode or "a" in self.__mode or "+" in self.__mode
+
+	def seekable(self) -> bool:
+		return True
+
+	def tell(self) -> int:
+		return self.__pos
+
+	def seek(self, offset:int, whence:int = io.SEEK_SET) -> int:
+		if whence == io.SEEK_CUR:
+			offset += self.__pos
+		elif whence == io.SEEK_END:
+			offset += self.__size
+		if offset < 0:
+			raise ValueError(f"Negative seek position {offset}")
+		self.__pos = offset
+		return self.__pos
+
+	def __drop_next(self) -> None:
+		# Read the window requested ahead, it would otherwise stay in SFTPFile's prefetch buffers
+		if self.__next is not None:
+			for _ in self.__next[1]:
+				pass
+			self.__next = None
+
+	def __load(self) -> None:
+		"""
+		Make the window holding the current position the current window
+		"""
+		# Windows start at multiples of the window size, so an offset is always requested as the same chunk:
+		# readv only checks the offset of the chunks it already holds, a chunk of another window layout
+		# covering part of a request would leave the read waiting for data never requested
+		start = self.__pos - self.__pos % self.__window
+		sequential = self.__next is not None and self.__next[0] == start
+		if not sequential:
+			self.__drop_next()
+		# Current and next windows, as requests of at most MAX_REQUEST_SIZE bytes
+		# (chunks already requested are not requested again by readv)
+		chunk = self.__file.MAX_REQUEST_SIZE
+		def requests(start:int) -> 'list[tuple[int,int]]':
+			end = min(start + self.__window, self.__size)
+			return [(o, min(chunk, end - o)) for o in range(start, end, chunk)]
+		current = requests(start)
+		ahead = requests(start + self.__window)
+		self.__offset, self.__data = start, b""
+		if len(current) > 0:
+			reads = self.__file.readv(current + ahead)
+			self.__data = b"".join(next(reads) for _ in current)
+			self.__next = (start + self.__window, reads) if len(ahead) > 0 else None
+
+	def readinto(self, buffer) -> int:
+		if not self.readable():
+			raise io.UnsupportedOperation("File not open for reading")
+		start = self.__pos - self.__offset
+		if not (0 <= start < len(self.__data)):
+			self.__load()
+			start = self.__pos - self.__offset
+		# Past the end of the file, the window may end before the position
+		n = max(0, min(len(buffer), len(self.__data) - start))
+		memoryview(buffer).cast("B")[:n] = self.__data[start:start + n]
+		self.__pos += n
+		return n
+
+	def write(self, data) -> int:
+		if not self.writable():
+			raise io.UnsupportedOperation("File not open for writing")
+		# Drop read windows that may now be stale
+		self.__drop_next()
+		self.__data = b""
+		self.__file.seek(self.__pos)
+		self.__file.write(data)
+		n = len(memoryview(data).cast("B"))
+		self.__pos += n
+		self.__size = max(self.__size, self.__pos)
+		return n
+
+	def flush(self) -> None:
+		if not self.closed and self.writable():
+			self.__file.flush()
+
+	def close(self) -> None:
+		if self.closed:
+			return
+		try:
+			super().close()
+		finally:
+			# Waits for the pipelined writes acknowledgements (and raises their errors)
+			self.__file.close()
+
+# ------------------ SFTPStream
@@ -1,6 +1,9 @@
-import getpass
+import getpass, time, socket, threading
 import pyrc.event.event as pyevent
 from pyrc.remote.transfer import transfer
+from pyrc.remote.persistentshell import PersistentShell
+from pyrc.remote.hostfacts import HostFactsCache, hostfacts_key, probe_command, parse_probe, python_probe_command, parse_python_probe, UNKNOWN_FACTS
+from pyrc.remote.sftpfile import SFTPStream
 from pyrc.system.command import FileSystemCommand
 from pyrc.system.local import LocalFileSystem
 
@@ -32,7 +35,7 @@ class RemoteSSHFileSystem(FileSystemCommand):
 
 	@property
 	def port(self) -> int:
-		return self._kwargs["port"]
+		return self._kwargs.get("port", 22)
 
 	@property
 	def askpwd(self) -> bool:
@@ -81,8 +84,26 @@ class RemoteSSHFileSystem(FileSystemCommand):
 
 		Raises:	
 		socket.error – if a socket error occurred while connecting
+
+		pyrc parameters:
+		askpwd (bool) – prompt for the password when opening the connection
+		proxycommand (str) – command whose stdin/stdout are used as the connection socket
+		persistent_shell (bool) – run every command in one long-lived bash on a single channel
+			instead of opening a channel (and spawning a shell) per command. Defaults to False.
+		hostfacts_cache (bool or str) – also persist host facts (see hostfacts) on the local disk,
+			in HostFactsCache.default_path() if True or in the given file. Defaults to False.
+		hostfacts_ttl (float) – seconds host facts stay valid. Defaults to 24h.
 		"""
 		self._kwargs:dict = dict(kwargs)
+		# PersistentShell when the 'persistent_shell' mode is on (created by open)
+		self._shell:PersistentShell = None
+		# Host facts cache (key, time, facts) (see hostfacts)
+		self._hostfacts:tuple = None
+		# Link measures cache (see link)
+		self._link:dict = None
+		# SFTP session shared by openfile, read_bytes and write_bytes (opened on first use)
+		self._sftp = None
+		self._sftp_lock = threading.Lock()
 
 		# Creating remote connection
 		self._sshcon = paramiko.SSHClient()  # will create the object
@@ -117,8 +138,21 @@ class RemoteSSHFileSystem(FileSystemCommand):
 			args["sock"] = paramiko.ProxyCommand(args["proxycommand"])
 			# Remove non paramiko params
 			del args["proxycommand"]
+
+		persistent_shell = args.pop("persistent_shell", False)
+		args.pop("hostfacts_cache", None)
+		args.pop("hostfacts_ttl", None)
 		
 		self._sshcon.connect(**args)
+		sock = self._sshcon.get_transport().sock
+		if isinstance(sock, socket.socket):
+			# Commands are small request/response exchanges: without this, Nagle's algorithm and delayed acks
+			# add up to 40ms to every round trip
+			sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		self._link = None
+
+		if persistent_shell:
+			self._shell = PersistentShell(self._sshcon.get_transport())
 
 		# Deduce os from new connection
 		FileSystemCommand.__init__(self)
@@ -127,18 +161,26 @@ class RemoteSSHFileSystem(FileSystemCommand):
 		"""
 			Close remote connection.
 		"""
+		if self._shell is not None:
+			self._shell.close()
+			self._shell = None
+		if self._sftp is not None:
+			self._sftp.close()
+			self._sftp = None
 		if self._sshcon:
 			self._sshcon.close()
 
-	def __exec_command(self, cmd:str, cwd:str = "", environment:dict = None):
+	def __command(self, cmd:str, cwd:str = "", environment:dict = None) -> str:
 		env_vars = ""
 		if environment is not None and len(environment) > 0:
 			if self.is_unix():
 				env_vars = ';'.join([f"export {var}={environment[var]}" for var in environment.keys()]) + ";"
 			else:
 				raise NotImplemented("Cannot set environment variables for Windows remote systems")
+		return env_vars + "cd " + cwd + ";" + cmd
 
-		stdin, stdout, stderr = self._sshcon.exec_command(env_vars + "cd " + cwd + ";" + cmd, environment = environment, get_pty=False)
+	def __exec_command(self, cmd:str, cwd:str = "", environment:dict = None):
+		stdin, stdout, stderr = self._sshcon.exec_command(self.__command(cmd, cwd, environment), environment = environment, get_pty=False)
 		return stdin, stdout, stderr
 
 	# ------------------------
@@ -152,10 +194,20 @@ class RemoteSSHFileSystem(FileSystemCommand):
 	#@overrides
 	def exec_command(self, cmd:str, cwd:str = "", environment:dict = None, event:pyevent.Event = None):
 		environment = {} if environment is None else self.environ
-		stdin, stdout, stderr = self.__exec_command(cmd, cwd, environment)
 		# Blocking event
 		# TODO: Unify default event for all connectors ?
 		event = pyevent.CommandPrettyPrintEvent(self, print_input=True, print_errors=True) if event is None else event
+
+		# Streamed outputs outlive this call, they get their own channel instead of holding the shell
+		if self._shell is not None and not isinstance(event, pyevent.CommandStreamEvent):
+			stdin, stdout, stderr = self._shell.submit(self.__command(cmd, cwd, environment))
+			try:
+				event.begin(cmd, cwd, stdin, stdout, stderr)
+				return event.end()
+			finally:
+				self._shell.release()
+
+		stdin, stdout, stderr = self.__exec_command(cmd, cwd, environment)
 		event.begin(cmd, cwd, stdin, stdout, stderr)
 		return event.end()
 
@@ -170,18 +222,180 @@ class RemoteSSHFileSystem(FileSystemCommand):
 	#@overrides
 	def platform(self) -> 'dict[str:str]':
 		"""
-		Uses python packages 'platform' on remote host to retrieve system informations
+		Remote system informations from the host facts (see hostfacts), probed once and cached.
 		The information exactly what 'platform.system()' and 'platform.release()' returns
 		Raises:
 			RuntimeError
 		Returns:
 			[dict[str:str]]: A dict of remote system informations. Keys are 'system' and 'release'
 		"""
-		output = self.evaluate("python3 -c \"import platform; print(platform.system()); print(platform.release())\"")
-		return { "system" : output[0], "release" : output[1] }
+		facts = self.hostfacts()
+		return { "system" : facts["system"], "release" : facts["release"] }
+
+	def __hostfacts_disk_cache(self) -> HostFactsCache:
+		cache = self._kwargs.get("hostfacts_cache", False)
+		if cache is False or cache is None:
+			return None
+		return HostFactsCache(
+			path = None if cache is True else cache,
+			ttl = self.__hostfacts_ttl()
+		)
+
+	def __hostfacts_ttl(self) -> float:
+		return self._kwargs.get("hostfacts_ttl", 24 * 3600)
+
+	def hostfacts(self, refresh:bool = False) -> dict:
+		"""
+		Facts about the remote host probed in a single cheap command:
+		'system' and 'release' (as platform.system() and platform.release() would return them),
+		'shell' (login shell) and 'tools' (available commands among pyrc.remote.hostfacts.TOOLS).
+		Hosts the probe cannot run on (no uname or no POSIX shell, e.g. Windows OpenSSH) are asked their system
+		and release through python3, facts of hosts where both fail are UNKNOWN_FACTS.
+		Facts are cached in memory by the connector and, if 'hostfacts_cache' is set, on the local disk.
+		Both caches are keyed by host and host key and expire after 'hostfacts_ttl' seconds, unknown facts are not saved to disk.
+		Args:
+			refresh (bool, optional): Probe the host again. Defaults to False.
+		"""
+		key = hostfacts_key(self.user, self.hostname, self._kwargs.get("port", 22), self._sshcon.get_transport().get_remote_server_key())
+		if not refresh and self._hostfacts is not None:
+			cached_key, cached_time, facts = self._hostfacts
+			if cached_key == key and time.time() - cached_time <= self.__hostfacts_ttl():
+				return facts
+
+		disk = self.__hostfacts_disk_cache()
+		facts = None if (refresh or disk is None) else disk.load(key)
+		if facts is None:
+			facts, probed = self.__probe()
+			if disk is not None and probed:
+				disk.save(key, facts)
+		self._hostfacts = (key, time.time(), facts)
+		return facts
+
+	def __probe(self) -> 'tuple[dict,bool]':
+		"""
+		Returns the facts and wether a probe could read them
+		"""
+		for command, parse in ((probe_command(), parse_probe), (python_probe_command(), parse_python_probe)):
+			# Failures only mean the next probe has to be tried
+			out, err, status = self.exec_command(command, event = pyevent.CommandStoreEvent(self))
+			facts = parse(out)
+			if facts is not None:
+				return facts, True
+		return dict(UNKNOWN_FACTS, tools = []), False
+
+	def has_tool(self, tool:str) -> bool:
+		"""
+		Tells wether or not the command 'tool' is available on the remote host (see hostfacts)
+		"""
+		return tool in self.hostfacts()["tools"]
+
+	def link(self, refresh:bool = False) -> dict:
+		"""
+		Measures of the connection, taken once and cached by the connector:
+		'rtt' (seconds, the fastest of 5 SFTP round trips),
+		'download' and 'upload' (bytes per second, 4MB streamed through a channel each way).
+		Args:
+			refresh (bool, optional): Measure again. Defaults to False.
+		"""
+		if self._link is not None and not refresh:
+			return self._link
+
+		sftp = self.sftp()
+		rtts = []
+		for _ in range(5):
+			start = time.perf_counter()
+			sftp.stat(".")
+			rtts.append(time.perf_counter() - start)
+		rtt = min(rtts)
+
+		nbytes = 4 << 20
+		channel = self.exec_channel(f"head -c {nbytes} /dev/zero")
+		received, start = 0, None
+		while True:
+			data = channel.recv(1 << 20)
+			if len(data) == 0:
+				break
+			# Timed from the first byte so that the command start up is not counted
+			start = time.perf_counter() if start is None else start
+			received += len(data)
+		download = received / max(time.perf_counter() - start, 1e-6) if start is not None else None
+		channel.recv_exit_status()
+		channel.close()
+
+		channel = self.exec_channel("cat > /dev/null")
+		start = time.perf_counter()
+		channel.sendall(bytes(nbytes))
+		channel.shutdown_write()
+		channel.recv_exit_status()
+		upload = nbytes / max(time.perf_counter() - start - rtt, 1e-6)
+		channel.close()
+
+		self._link = { "rtt" : rtt, "download" : download, "upload" : upload }
+		return self._link
+
+	# SSH window of streaming channels (SFTP, exec_channel), large enough to keep data flowing on high latency links
+	STREAM_WINDOW_SIZE = 64 << 20
+
+	def exec_channel(self, cmd:str, cwd:str = "", environment:dict = None) -> 'paramiko.Channel':
+		"""
+		Start 'cmd' on its own channel and return the raw channel, for commands whose stdin or stdout
+		carry binary streams (see pyrc.remote.tarstream). The caller reads, writes and closes the channel.
+		"""
+		environment = {} if environment is None else self.environ
+		channel = self._sshcon.get_transport().open_session(window_size = RemoteSSHFileSystem.STREAM_WINDOW_SIZE)
+		channel.exec_command(self.__command(cmd, cwd, environment))
+		return channel
+
+	def sftp(self) -> 'paramiko.SFTPClient':
+		"""
+		SFTP session of this connection, opened on first use and closed with the connection
+		"""
+		with self._sftp_lock:
+			if self._sftp is None or self._sftp.get_channel().closed:
+				self._sftp = paramiko.SFTPClient.from_transport(
+					self._sshcon.get_transport(),
+					window_size = RemoteSSHFileSystem.STREAM_WINDOW_SIZE
+				)
+			return self._sftp
+
+	def openfile(self, path:str, mode:str = "rb", window:int = 8 << 20) -> SFTPStream:
+		"""
+		Open a remote file as a binary file-like object streamed over SFTP (see SFTPStream).
+		Reads are pipelined by windows of 'window' bytes, so large files can be processed
+		chunk by chunk (read, readinto, seek) without being downloaded first.
+			with fs.openfile("/data/big.bin") as f:
+				while (n := f.readinto(buffer)) > 0:
+					...
+		Args:
+			path (str): remote file
+			mode (str, optional): "rb", "wb", "ab", "r+b" or "w+b". Defaults to "rb".
+			window (int, optional): read-ahead size (in bytes). Defaults to 8MB.
+		"""
+		if "b" not in mode:
+			raise ValueError(f"Remote files are only opened in binary mode, not '{mode}'")
+		if "r" not in mode:
+			self.invalidate_stat_cache(path)
+		return SFTPStream(self.sftp().open(path, mode.replace("b", "")), mode, window)
+
+	def read_bytes(self, path:str) -> bytes:
+		"""
+		Content of a remote file, fetched with pipelined SFTP reads
+		"""
+		with self.sftp().open(path, "r") as f:
+			f.prefetch()
+			return f.read()
+
+	def write_bytes(self, path:str, data:bytes) -> None:
+		"""
+		Replace the content of a remote file (created if needed) with pipelined SFTP writes
+		"""
+		self.invalidate_stat_cache(path)
+		with self.sftp().open(path, "w") as f:
+			f.set_pipelined(True)
+			f.write(data)
 
 	# --------------------------------------------------
-	def upload(self, from_path:str, to_path:str, compress_before:bool = False, uncompress_after:bool = False):
+	def upload(self, from_path:str, to_path:str, compress_before:bool = False, uncompress_after:bool = False, workers:int = 1, strategy:str = "scp", resumable:bool = False):
 		"""
 		Upload a file or directory from local filesystem to the remote filesystem through SSH
 		Args:
@@ -189,6 +403,10 @@ class RemoteSSHFileSystem(FileSystemCommand):
 			to_dirpath (str): Path to a directory in the remote filesystem
 			compress_before (bool, optional): Compress the file or folder locally before transfert. Defaults to False.
 			uncompress_after (bool, optional): Uncompress the file or folder in remote machine after transfer. Defaults to False.
+			workers (int, optional): Number of files uploaded concurrently, each on its own SSH channel. Defaults to 1.
+			strategy (str, optional): "scp" (one scp per file), "tar" (directories as a single tar stream)
+				or "pack" (small files bundled in tar streams, large files with scp). Defaults to "scp".
+			resumable (bool, optional): Send a file in checkpointed chunks that an interrupted transfer resumes from. Defaults to False.
 		"""
 		transfer(
 			from_path = from_path,
@@ -196,11 +414,14 @@ class RemoteSSHFileSystem(FileSystemCommand):
 			from_fs = LocalFileSystem(),
 			to_fs = self,
 			compress_before = compress_before,
-			uncompress_after = uncompress_after
+			uncompress_after = uncompress_after,
+			workers = workers,
+			strategy = strategy,
+			resumable = resumable
 		)
 
 			
-	def download(self, from_path:str, to_path:str, compress_before:bool = False, uncompress_after:bool = False):
+	def download(self, from_path:str, to_path:str, compress_before:bool = False, uncompress_after:bool = False, workers:int = 1, strategy:str = "scp", resumable:bool = False):
 		"""
 		Download a file or directory from remote filesystem through SSH to the local filesystem
 		Args:
@@ -208,6 +429,10 @@ class RemoteSSHFileSystem(FileSystemCommand):
 			to_dirpath (str): Path to a local directory 
 			compress_before (bool, optional): Compress the file or folder remotly before transfert. Defaults to False.
 			uncompress_after (bool, optional): Uncompress the file or folder locally after transfer. Defaults to False.
+			workers (int, optional): Number of files downloaded concurrently, each on its own SSH channel. Defaults to 1.
+			strategy (str, optional): "scp" (one scp per file), "tar" (directories as a single tar stream)
+				or "pack" (small files bundled in tar streams, large files with scp). Defaults to "scp".
+			resumable (bool, optional): Send a file in checkpointed chunks that an interrupted transfer resumes from. Defaults to False.
 		"""
 		transfer(
 			from_path = from_path,
@@ -215,7 +440,10 @@ class RemoteSSHFileSystem(FileSystemCommand):
 			from_fs = self,
 			to_fs = LocalFileSystem(),
 			compress_before = compress_before,
-			uncompress_after = uncompress_after
+			uncompress_after = uncompress_after,
+			workers = workers,
+			strategy = strategy,
+			resumable = resumable
 		)
 
 
@@ -0,0 +1,154 @@
+import contextlib
+from pyrc.system.filesystem import FileSystem
+from pyrc.system.filesystemtree import FileSystemTree
+from pyrc.system.command import FileSystemCommand
+
+def manifest(fs:FileSystem, dirpath:str) -> 'tuple[dict[str,tuple[int,float]], set[str]]':
+	"""
+	Files and directories under dirpath, hidden ones included, from a single lsdir.
+	Both sides of a transfer must be listed by the same rule, an entry listed on one side only would be sent
+	or deleted at every sync.
+	Returns:
+		tuple[dict[str,tuple[int,float]], set[str]]: (size, mtime) of every file and the set of directories,
+		by '/' separated path relative to dirpath. Both are empty if dirpath does not exist.
+	"""
+	files, dirs = {}, set()
+	if not fs.isdir(dirpath):
+		return files, dirs
+
+	tree:FileSystemTree = fs.lsdir(dirpath, hidden = True)
+	# Relative paths are built from names as directories symbolic links are resolved in trees
+	stack = [(tree, "")]
+	while len(stack) > 0:
+		node, rel = stack.pop()
+		for name in node.files:
+			stats = node.stats.get(name)
+			files[rel + name] = stats if stats is not None else (node.filesize(name), None)
+		for name, child in node.dirs.items():
+			dirs.add(rel + name)
+			stack.append((child, rel + name + "/"))
+	return files, dirs
+
+def _batched(fs:FileSystem):
+	# Fold the commands of a FileSystemCommand into one exec (see FileSystemCommand.batch)
+	return fs.batch() if isinstance(fs, FileSystemCommand) else contextlib.nullcontext()
+
+# ------------------ SyncPlan
+class SyncPlan(object):
+	"""
+	What an incremental transfer of the directory 'from_dirpath' into the directory 'to_dirpath' has to do.
+	A file is sent when it is missing from the destination, or when sizes differ,
+	or when modification times differ by a second or more (scp keeps whole seconds).
+	With 'checksum', files of equal sizes are compared by content (see FileSystem.checksum) instead of modification times.
+	With 'delete', destination files and directories missing from the source are removed.
+		plan = SyncPlan("/data/run", "/backup/run", LocalFileSystem(), remote)
+		print(plan)
+		plan.run(workers = 4)
+	"""
+	def __init__(self,
+			from_dirpath:str,
+			to_dirpath:str,
+			from_fs:FileSystem,
+			to_fs:FileSystem,
+			checksum:bool = False,
+			delete:bool = False
+		) -> None:
+		self.from_dirpath = from_dirpath
+		self.to_dirpath = to_dirpath
+		self.from_fs = from_fs
+		self.to_fs = to_fs
+
+		from_files, from_dirs = manifest(from_fs, from_dirpath)
+		to_files, to_dirs = manifest(to_fs, to_dirpath)
+
+		# Relative paths of the files to send and their sizes
+		self.files:'dict[str,int]' = {}
+		# Relative paths of directories to create
+		self.mkdirs:'list[str]' = sorted(from_dirs - to_dirs)
+		# Relative paths of files and directories to remove from the destination
+		self.unlinks:'list[str]' = []
+		self.rmdirs:'list[str]' = []
+		# Number of files already up to date
+		self.unchanged:int = 0
+
+		same_size = []
+		for rel, (size, mtime) in from_files.items():
+			if rel in to_dirs:
+				# A directory stands where the file goes
+				self.rmdirs.append(rel)
+				self.files[rel] = size
+			elif rel not in to_files or to_files[rel][0] != size:
+				self.files[rel] = size
+			elif checksum:
+				same_size.append(rel)
+			elif mtime is None or to_files[rel][1] is None or abs(mtime - to_files[rel][1]) >= 1:
+				self.files[rel] = size
+			else:
+				self.unchanged += 1
+
+		if len(same_size) > 0:
+			from_sums = from_fs.checksum([self.__from(rel) for rel in same_size])
+			to_sums = to_fs.checksum([self.__to(rel) for rel in same_size])
+			for rel in same_size:
+				if from_sums[self.__from(rel)] != to_sums[self.__to(rel)]:
+					self.files[rel] = from_files[rel][0]
+				else:
+					self.unchanged += 1
+
+		# A file stands where a directory goes
+		self.unlinks.extend([rel for rel in to_files if rel in from_dirs])
+		if delete:
+			self.unlinks.extend([rel for rel in to_files if rel not in from_files and rel not in from_dirs])
+			self.rmdirs.extend([rel for rel in to_dirs if rel not in from_dirs and rel not in from_files])
+		# Only remove the upmost directories, their content goes with them
+		removed = set(self.rmdirs)
+		self.rmdirs = sorted([rel for rel in removed if not any(rel.startswith(r + "/") for r in removed)])
+		self.unlinks = sorted([rel for rel in self.unlinks if not any(rel.startswith(r + "/") for r in self.rmdirs)])
+
+	def __from(self, rel:str) -> str:
+		return self.from_fs.join(self.from_dirpath, *rel.split("/"))
+
+	def __to(self, rel:str) -> str:
+		return self.to_fs.join(self.to_dirpath, *rel.split("/"))
+
+	@property
+	def nbytes(self) -> int:
+		"""
+		Number of bytes to send
+		"""
+		return sum(self.files.values())
+
+	@property
+	def nfiles(self) -> int:
+		"""
+		Number of files to send
+		"""
+		return len(self.files)
+
+	def __str__(self) -> str:
+		return (
+			f"{self.from_fs.name()}:{self.from_dirpath} -> {self.to_fs.name()}:{self.to_dirpath} : "
+			f"{self.nfiles} files ({self.nbytes} bytes) to send, {self.unchanged} unchanged, "
+			f"{len(self.mkdirs)} directories to create, {len(self.unlinks)} files and {len(self.rmdirs)} directories to delete"
+		)
+
+	def run(self, workers:int = 1) -> None:
+		"""
+		Apply the plan: remove and create destination entries, then send the new and changed files.
+		Sent files keep their modification times so that the next plan finds them unchanged.
+		Args:
+			workers (int, optional): Number of files transfered concurrently (see transfer_files). Defaults to 1.
+		"""
+		from pyrc.remote.transfer import _transfer_pairs
+
+		with _batched(self.to_fs):
+			[self.to_fs.rmdir(self.__to(rel), recur = True) for rel in self.rmdirs]
+			[self.to_fs.unlink(self.__to(rel), missing_ok = True) for rel in self.unlinks]
+			self.to_fs.mkdir(self.to_dirpath, parents = True, exist_ok = True)
+			[self.to_fs.mkdir(self.__to(rel), parents = True, exist_ok = True) for rel in self.mkdirs]
+
+		if self.nfiles > 0:
+			pairs = [(self.__from(rel), self.to_fs.dirname(self.__to(rel))) for rel in self.files]
+			_transfer_pairs(pairs, self.from_fs, self.to_fs, workers, preserve_times = True, sizes = list(self.files.values()))
+
+# ------------------ SyncPlan
@@ -0,0 +1,205 @@
+import os, tarfile, shutil
+from pyrc.system.filesystem import FileSystem
+from pyrc.remote.compression import Codec, CompressWriter, DecompressReader
+
+# Size of the reads and writes of tar streams: channels buffer up to their (large) window,
+# and paramiko moves the remaining buffered data on every read, so small reads are very slow
+STREAM_BUFFER = 1 << 20
+
+def _extract_args() -> dict:
+	# Python versions with extraction filters refuse members escaping the destination
+	return { "filter" : "tar" } if hasattr(tarfile, "tar_filter") else {}
+
+def _pipe(cmd:str, codec_cmd:str, before:bool) -> str:
+	"""
+	'cmd' piped into (before = False) or fed by (before = True) 'codec_cmd' if any.
+	pipefail (ignored by shells without it) makes the pipe fail when 'cmd' does.
+	"""
+	if codec_cmd is None:
+		return cmd
+	return f"set -o pipefail 2>/dev/null; {codec_cmd} | {cmd}" if before else f"set -o pipefail 2>/dev/null; {cmd} | {codec_cmd}"
+
+def _close_channel(channel, cmd:str) -> None:
+	"""
+	Wait for the remote command of 'channel' and raise its errors
+	"""
+	stderr = channel.makefile_stderr("rb").read().decode("utf-8", errors = "replace")
+	status = channel.recv_exit_status()
+	channel.close()
+	if status != 0:
+		raise RuntimeError(f"'{cmd}' failed ({status}): {stderr.strip()}")
+
+def upload_tar(from_dirpath:str, to_dirpath:str, from_fs:FileSystem, to_fs:'RemoteSSHFileSystem', codec:Codec = None) -> str:
+	"""
+	Copy the local directory 'from_dirpath' into the remote directory 'to_dirpath' as a single tar stream:
+	the archive is written by python's tarfile straight into the stdin of 'tar -x' on the remote side,
+	so no archive ever touches a disk and the SSH channel flow control paces the reading of local files.
+	With a codec, the stream is compressed while it is written and decompressed by the codec's tool on the remote side.
+	Symbolic links are followed, as in transfer_dir.
+	Returns:
+		The new directory path in 'to_fs'
+	"""
+	received = to_fs.join(to_dirpath, from_fs.basename(from_dirpath))
+	cmd = f"mkdir -p {to_dirpath} && " + _pipe(f"tar -x -f - -C {to_dirpath}", None if codec is None else codec.decompress_cmd(), True)
+	channel = to_fs.exec_channel(cmd)
+	try:
+		with channel.makefile_stdin("wb") as stdin:
+			out = stdin if codec is None else CompressWriter(stdin, codec)
+			with tarfile.open(fileobj = out, mode = "w|", dereference = True, format = tarfile.GNU_FORMAT, bufsize = STREAM_BUFFER) as archive:
+				archive.add(from_dirpath, arcname = from_fs.basename(from_dirpath))
+			out.close()
+			channel.shutdown_write()
+	except BaseException:
+		channel.close()
+		raise
+	finally:
+		# Files were written behind the destination connector's back
+		to_fs.invalidate_stat_cache(received)
+	_close_channel(channel, cmd)
+	return received
+
+def download_tar(from_dirpath:str, to_dirpath:str, from_fs:'RemoteSSHFileSystem', to_fs:FileSystem, codec:Codec = None) -> str:
+	"""
+	Copy the remote directory 'from_dirpath' into the local directory 'to_dirpath' as a single tar stream:
+	'tar -c' writes the archive on the remote stdout and python's tarfile extracts members as they arrive.
+	With a codec, the stream is compressed by the codec's tool on the remote side and decompressed while it is read.
+	Symbolic links are followed, as in transfer_dir.
+	Returns:
+		The new directory path in 'to_fs'
+	"""
+	cmd = _pipe(f"tar -c -h -f - -C {from_fs.dirname(from_dirpath)} {from_fs.basename(from_dirpath)}", None if codec is None else codec.compress_cmd(), False)
+	channel = from_fs.exec_channel(cmd)
+	try:
+		with channel.makefile("rb") as stdout:
+			src = stdout if codec is None else DecompressReader(stdout, codec, STREAM_BUFFER)
+			with tarfile.open(fileobj = src, mode = "r|", bufsize = STREAM_BUFFER) as archive:
+				archive.extractall(to_dirpath, **_extract_args())
+	except BaseException:
+		channel.close()
+		raise
+	_close_channel(channel, cmd)
+	return to_fs.join(to_dirpath, from_fs.basename(from_dirpath))
+
+def upload_members(from_dirpath:str, members:'list[str]', to_dirpath:str, from_fs:FileSystem, to_fs:'RemoteSSHFileSystem') -> None:
+	"""
+	Copy the files 'members' ('/' separated paths relative to the local directory 'from_dirpath')
+	into the remote directory 'to_dirpath' as a single tar stream, at the same relative paths.
+	Their directories are expected to exist in 'to_dirpath'.
+	"""
+	cmd = f"tar -x -f - -C {to_dirpath}"
+	channel = to_fs.exec_channel(cmd)
+	try:
+		with channel.makefile_stdin("wb") as stdin:
+			with tarfile.open(fileobj = stdin, mode = "w|", dereference = True, format = tarfile.GNU_FORMAT, bufsize = STREAM_BUFFER) as archive:
+				for rel in members:
+					archive.add(os.path.join(from_dirpath, *rel.split("/")), arcname = rel, recursive = False)
+			channel.shutdown_write()
+	except BaseException:
+		channel.close()
+		raise
+	_close_channel(channel, cmd)
+
+def download_members(from_dirpath:str, members:'list[str]', to_dirpath:str, from_fs:'RemoteSSHFileSystem', to_fs:FileSystem) -> None:
+	"""
+	Copy the files 'members' ('/' separated paths relative to the remote directory 'from_dirpath')
+	into the local directory 'to_dirpath' as a single tar stream, at the same relative paths.
+	The list of members is given to 'tar -c' on its stdin.
+	"""
+	cmd = f"tar -c -h -f - -C {from_dirpath} -T -"
+	channel = from_fs.exec_channel(cmd)
+	try:
+		with channel.makefile_stdin("wb") as stdin:
+			# './' so that names starting with '-' are not taken as options
+			stdin.write("".join([f"./{rel}\n" for rel in members]).encode("utf-8"))
+			channel.shutdown_write()
+		with channel.makefile("rb") as stdout:
+			with tarfile.open(fileobj = stdout, mode = "r|", bufsize = STREAM_BUFFER) as archive:
+				archive.extractall(to_dirpath, **_extract_args())
+	except BaseException:
+		channel.close()
+		raise
+	_close_channel(channel, cmd)
+
+def upload_file_stream(from_path:str, to_dirpath:str, from_fs:FileSystem, to_fs:'RemoteSSHFileSystem', codec:Codec = None) -> str:
+	"""
+	Copy the local file 'from_path' into the remote directory 'to_dirpath' through the stdin of a remote 'cat'
+	(or of the codec's tool, the file being compressed while it is read)
+	Returns:
+		The new file path in 'to_fs'
+	"""
+	received = to_fs.join(to_dirpath, from_fs.basename(from_path))
+	cmd = _pipe(f"cat > {received}", None if codec is None else codec.decompress_cmd(), True)
+	channel = to_fs.exec_channel(cmd)
+	try:
+		with channel.makefile_stdin("wb") as stdin, open(from_path, "rb") as src:
+			out = stdin if codec is None else CompressWriter(stdin, codec)
+			shutil.copyfileobj(src, out, 1 << 20)
+			out.close()
+			channel.shutdown_write()
+	except BaseException:
+		channel.close()
+		raise
+	finally:
+		to_fs.invalidate_stat_cache(received)
+	_close_channel(channel, cmd)
+	return received
+
+def download_file_stream(from_path:str, to_dirpath:str, from_fs:'RemoteSSHFileSystem', to_fs:FileSystem, codec:Codec = None) -> str:
+	"""
+	Copy the remote file 'from_path' into the local directory 'to_dirpath' from the stdout of a remote 'cat'
+	(or of the codec's tool, the file being decompressed while it is received)
+	Returns:
+		The new file path in 'to_fs'
+	"""
+	received = to_fs.join(to_dirpath, from_fs.basename(from_path))
+	cmd = f"cat {from_path}" if codec is None else f"{codec.compress_cmd()} < {from_path}"
+	channel = from_fs.exec_channel(cmd)
+	try:
+		with channel.makefile("rb") as stdout, open(received, "wb") as dst:
+			src = stdout if codec is None else DecompressReader(stdout, codec, STREAM_BUFFER)
+			shutil.copyfileobj(src, dst, 1 << 20)
+	except BaseException:
+		channel.close()
+		raise
+	_close_channel(channel, cmd)
+	return received
+
+def transfer_file_stream(from_path:str, to_dirpath:str, from_fs:FileSystem, to_fs:FileSystem, codec:Codec = None) -> str:
+	"""
+	Transfert a FILE from one filesystem to a directory in another one through a single channel
+	(see upload_file_stream and download_file_stream).
+	Returns:
+		The new file path in 'to_fs'
+	"""
+	from_path = from_fs.abspath(from_path)
+	to_dirpath = to_fs.abspath(to_dirpath)
+	if type(from_fs).__name__ == 'LocalFileSystem' and type(to_fs).__name__ == 'RemoteSSHFileSystem':
+		return upload_file_stream(from_path, to_dirpath, from_fs, to_fs, codec)
+	elif type(from_fs).__name__ == 'RemoteSSHFileSystem' and type(to_fs).__name__ == 'LocalFileSystem':
+		return download_file_stream(from_path, to_dirpath, from_fs, to_fs, codec)
+	raise RuntimeError(f"Stream transfer between {type(from_fs).__name__} and {type(to_fs).__name__} is not supported.")
+
+def transfer_tar(from_dirpath:str, to_dirpath:str, from_fs:FileSystem, to_fs:FileSystem, codec:Codec = None) -> str:
+	"""
+	Transfert a DIRECTORY from one filesystem to a directory in another one through a single tar stream
+	(see upload_tar and download_tar). Like transfer_dir, an existing destination directory is replaced.
+	Args:
+		from_dirpath (str): Directory path in 'from_fs' filesystem
+		to_dirpath (str): Directory path in 'to_fs' filesystem
+		from_fs (FileSystem): Filesystem to transfert from
+		to_fs (FileSystem): Filesystem to transfert to
+		codec (Codec, optional): Compress the stream on the fly (see pyrc.remote.compression). Defaults to None.
+	Returns:
+		The new directory path in 'to_fs'
+	"""
+	from_dirpath = from_fs.abspath(from_dirpath)
+	to_dirpath = to_fs.abspath(to_dirpath)
+	todir = to_fs.join(to_dirpath, from_fs.basename(from_dirpath))
+	if to_fs.isdir(todir):
+		to_fs.rmdir(todir, recur = True)
+
+	if type(from_fs).__name__ == 'LocalFileSystem' and type(to_fs).__name__ == 'RemoteSSHFileSystem':
+		return upload_tar(from_dirpath, to_dirpath, from_fs, to_fs, codec)
+	elif type(from_fs).__name__ == 'RemoteSSHFileSystem' and type(to_fs).__name__ == 'LocalFileSystem':
+		return download_tar(from_dirpath, to_dirpath, from_fs, to_fs, codec)
+	raise RuntimeError(f"Tar transfer between {type(from_fs).__name__} and {type(to_fs).__name__} is not supported.")
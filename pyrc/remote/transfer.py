@@ -1,7 +1,19 @@
+import os, queue, threading
+from concurrent.futures import ThreadPoolExecutor
 import pyrc.event.event as pyevent
 from pyrc.system.filesystemtree import FileSystemTree
 from pyrc.system.filesystem import OSTYPE, FileSystem
+from pyrc.system.command import FileSystemCommand
 from pyrc.system.local import LocalFileSystem
+from pyrc.system.localcopy import LocalCopy, COPY_WORKERS
+from pyrc.remote.sync import SyncPlan, _batched
+from pyrc.remote.tarstream import transfer_tar, transfer_file_stream
+from pyrc.remote.compression import Codec, get_codec
+from pyrc.remote.resumable import resumable_transfer, resumable_pending
+from pyrc.remote.relay import transfer_remote
+from pyrc.remote.packing import PackPlan
+from pyrc.remote.planner import plan_transfer, PLAN_WORKERS
+import rich
 
 try:
 	from scp import SCPClient
@@ -9,28 +21,100 @@ try:
 except BaseException as err:
 	_CMDEXEC_REMOTE_ENABLED_ = False
 
-def transfer_files(from_paths:'list[str]', to_path:str, from_fs:FileSystem, to_fs:FileSystem) -> str:
+def _file_sizes(fs:FileSystem, paths:'list[str]') -> 'list[int]':
 	"""
-	Transfert FILES from one filesystem to a directory in another one
-	Args:
-		from_paths (list[str]): List of files to be transfered from 
-		'from_fs' filesystem to 'to_fs' filesystem.
-		Le list must represent files that exists in filesystel 'from_fs'
-		to_path (str): Path to a directory in filesystem 'to_fs'
-		from_fs (FileSystem): Filesystem to transfert from
-		to_fs (FileSystem): Filesystem to transfert to
-	Returns:
-		The new paths on 'to_fs' created by the transfer.
+	Sizes of the files 'paths' of 'fs', for command connectors in as few 'stat' commands as checksum uses.
+	Raises:
+		FileNotFoundError: if a size cannot be read
+	"""
+	if isinstance(fs, LocalFileSystem):
+		return [os.path.getsize(p) for p in paths]
+	if not isinstance(fs, FileSystemCommand) or not fs.is_unix():
+		return [fs.getsize(p) for p in paths]
+
+	sizes = {}
+	def record(line:str):
+		# '<size>\t<path>', anything else is an error message
+		size, sep, path = line.partition("\t")
+		if sep != "" and size.isdigit():
+			sizes[path] = int(size)
+	fs._xargs("stat -L --printf '%s\\t%n\\n' --", paths, record)
+
+	missing = [p for p in paths if p not in sizes]
+	if len(missing) > 0:
+		raise FileNotFoundError(f"Cannot read the size of {', '.join(missing)}")
+	return [sizes[p] for p in paths]
+
+def _parallel_scp(pairs:'list[tuple[str, str]]', sizes:'list[int]', workers:int, transport, download:bool, progress, preserve_times:bool = False) -> None:
 	"""
+	Copy (source file, destination directory) pairs with 'workers' SCPClients, each on its own channel of 'transport'.
+	Files are queued largest first and taken by the first idle worker, so big files start early
+	and small ones fill the gaps (longest processing time first scheduling).
+	"""
+	jobs = queue.Queue()
+	for size, pair in sorted(zip(sizes, pairs), key = lambda j: j[0], reverse = True):
+		jobs.put(pair)
+	failed = threading.Event()
+
+	def worker():
+		scp = SCPClient(transport, progress = progress)
+		try:
+			while not failed.is_set():
+				try:
+					file, to_dir = jobs.get_nowait()
+				except queue.Empty:
+					return
+				if download:
+					scp.get(remote_path = file, recursive = False, local_path = to_dir, preserve_times = preserve_times)
+				else:
+					scp.put(files = [file], recursive = False, remote_path = to_dir, preserve_times = preserve_times)
+		except BaseException:
+			# Stop the other workers
+			failed.set()
+			raise
+		finally:
+			scp.close()
+
+	with ThreadPoolExecutor(max_workers = workers, thread_name_prefix = "pyrc-scp") as executor:
+		futures = [executor.submit(worker) for _ in range(min(workers, len(pairs)))]
+	# Raises the first worker error
+	[f.result() for f in futures]
+
+def _local_copy(copy:LocalCopy, from_fs:FileSystem, to_fs:FileSystem) -> None:
+	"""
+	Run 'copy' with a single progress bar for all its files
+	"""
+	transferevent = pyevent.RichAggregateTransferEvent(caller = None)
+	transferevent.begin(
+		nfiles = copy.nfiles,
+		nbytes = copy.nbytes,
+		from_fs = from_fs,
+		to_fs = to_fs
+	)
+	copy.progress = transferevent.progress
+	try:
+		copy.run()
+	finally:
+		transferevent.end()
 
+def _transfer_pairs(pairs:'list[tuple[str, str]]', from_fs:FileSystem, to_fs:FileSystem, workers:int = 1, preserve_times:bool = False, sizes:'list[int]' = None) -> None:
+	"""
+	Transfer (source file, destination directory) pairs, paths being absolute in their filesystems.
+	With 'preserve_times', scp gives the copies the modification times of their sources.
+	Parallel transfers are scheduled by the 'sizes' of the files, read from 'from_fs' if they are not given (e.g. from a listing).
+	"""
 	def uncompatibility(from_fs:FileSystem, to_fs:FileSystem):
 		return RuntimeError(f"Transfer between {type(from_fs).__name__} and {type(to_fs).__name__} is not supported.")
 
-	# Format path according to their filesystems
-	from_paths = [from_fs.abspath(from_path) for from_path in from_paths]
-	to_path = to_fs.abspath(to_path)
-	# Decudes new paths on destination filesystem 'to_fs'
-	to_paths = [to_fs.join(to_path, from_fs.basename(from_path)) for from_path in from_paths]
+	from_paths = [file for file, to_dir in pairs]
+	to_paths = [to_fs.join(to_dir, from_fs.basename(file)) for file, to_dir in pairs]
+
+	# Special case where both sides are the local filesystem: parallel copy (see LocalCopy)
+	if isinstance(from_fs, LocalFileSystem) and from_fs == to_fs:
+		copy = LocalCopy(workers = workers if workers > 1 else COPY_WORKERS)
+		[copy.add_file(file, to_dir) for file, to_dir in pairs]
+		_local_copy(copy, from_fs, to_fs)
+		return
 
 	transferevent = pyevent.RichRemoteFileTransferEvent(caller = None)
 	transferevent.begin(
@@ -42,9 +126,9 @@ def transfer_files(from_paths:'list[str]', to_path:str, from_fs:FileSystem, to_f
 	# Special case where the two filesystems are identical
 	# In that case just call copy
 	if from_fs == to_fs:
-		[from_fs.copy(from_path, to_path) for from_path in from_paths]
+		[from_fs.copy(file, to_dir) for file, to_dir in pairs]
 		transferevent.end()
-		return to_paths
+		return
 
 	# Special case if one of the two filesystems are a RemoteSSHFileSystem
 	# if type(to_fs) == SSH and type(from_fs) == local -> scp.put ; type(from_fs) == SSH and type(to_fs) == local -> scp.get
@@ -52,28 +136,61 @@ def transfer_files(from_paths:'list[str]', to_path:str, from_fs:FileSystem, to_f
 	if (type(from_fs).__name__ ==  'RemoteSSHFileSystem' or type(to_fs).__name__ ==  'RemoteSSHFileSystem') and _CMDEXEC_REMOTE_ENABLED_:
 		scp = None
 		if type(from_fs).__name__ ==  'RemoteSSHFileSystem' and type(to_fs).__name__ ==  'LocalFileSystem':
-			scp = SCPClient(from_fs.sshcon.get_transport(), progress = transferevent.progress)
-			for file in from_paths:
-				# Download file, for some reason scp.get only works with a single file contrary to scp.put
-				scp.get(remote_path = file, recursive = False, local_path = to_path)
+			if workers > 1:
+				_parallel_scp(pairs, _file_sizes(from_fs, from_paths) if sizes is None else sizes, workers, from_fs.sshcon.get_transport(), True, transferevent.progress, preserve_times)
+			else:
+				scp = SCPClient(from_fs.sshcon.get_transport(), progress = transferevent.progress)
+				for file, to_dir in pairs:
+					# Download file, for some reason scp.get only works with a single file contrary to scp.put
+					scp.get(remote_path = file, recursive = False, local_path = to_dir, preserve_times = preserve_times)
 
 		elif type(from_fs).__name__ ==  'LocalFileSystem' and type(to_fs).__name__ ==  'RemoteSSHFileSystem':
-			scp = SCPClient(to_fs.sshcon.get_transport(), progress = transferevent.progress)
-			# Upload files
-			scp.put(files = from_paths, recursive = False, remote_path = to_path)
+			if workers > 1:
+				_parallel_scp(pairs, _file_sizes(from_fs, from_paths) if sizes is None else sizes, workers, to_fs.sshcon.get_transport(), False, transferevent.progress, preserve_times)
+			else:
+				scp = SCPClient(to_fs.sshcon.get_transport(), progress = transferevent.progress)
+				# Upload files, grouped by destination directory
+				for to_dir in dict.fromkeys(to_dir for file, to_dir in pairs):
+					scp.put(files = [file for file, d in pairs if d == to_dir], recursive = False, remote_path = to_dir, preserve_times = preserve_times)
 		else:
 			raise uncompatibility(from_fs, to_fs)
 
 		if scp is not None:
 			scp.close()
+		# Files were written behind the destination connector's back
+		if isinstance(to_fs, FileSystemCommand):
+			to_fs.invalidate_stat_cache(*to_paths)
 		transferevent.end()
-		return to_paths
+		return
 
 	# Default case : uncompatibility
 	raise uncompatibility(from_fs, to_fs)
 
+def transfer_files(from_paths:'list[str]', to_path:str, from_fs:FileSystem, to_fs:FileSystem, workers:int = 1) -> str:
+	"""
+	Transfert FILES from one filesystem to a directory in another one
+	Args:
+		from_paths (list[str]): List of files to be transfered from 
+		'from_fs' filesystem to 'to_fs' filesystem.
+		Le list must represent files that exists in filesystel 'from_fs'
+		to_path (str): Path to a directory in filesystem 'to_fs'
+		from_fs (FileSystem): Filesystem to transfert from
+		to_fs (FileSystem): Filesystem to transfert to
+		workers (int, optional): Number of files transfered concurrently, each on its own SSH channel. Defaults to 1.
+	Returns:
+		The new paths on 'to_fs' created by the transfer.
+	"""
+	# Format path according to their filesystems
+	from_paths = [from_fs.abspath(from_path) for from_path in from_paths]
+	to_path = to_fs.abspath(to_path)
+	# Decudes new paths on destination filesystem 'to_fs'
+	to_paths = [to_fs.join(to_path, from_fs.basename(from_path)) for from_path in from_paths]
+
+	_transfer_pairs([(from_path, to_path) for from_path in from_paths], from_fs, to_fs, workers)
+	return to_paths
 
-def transfer_dir(from_dirpath:str, to_dirpath:str, from_fs:FileSystem, to_fs:FileSystem):
+
+def transfer_dir(from_dirpath:str, to_dirpath:str, from_fs:FileSystem, to_fs:FileSystem, workers:int = 1):
 	"""
 	Transfert a DIRECTORY from one filesystem to a directory in another one
 	Args:
@@ -81,6 +198,8 @@ def transfer_dir(from_dirpath:str, to_dirpath:str, from_fs:FileSystem, to_fs:Fil
 		to_dirpath (str): Directory path in 'to_fs' filesystem
 		from_fs (FileSystem): Filesystem to transfert from
 		to_fs (FileSystem): Filesystem to transfert to
+		workers (int, optional): Number of files transfered concurrently, each on its own SSH channel.
+			When above 1, the whole tree is created first and all its files are scheduled together. Defaults to 1.
 	"""
 
 	def transfer_node(node:FileSystemTree, to_dirpath:str, from_fs:FileSystem, to_fs:FileSystem):
@@ -111,8 +230,21 @@ def transfer_dir(from_dirpath:str, to_dirpath:str, from_fs:FileSystem, to_fs:Fil
 		to_fs.rmdir(todir, recur = True)
 	to_fs.mkdir(todir, exist_ok = True)
 
-	# Inpect directory 'from_dirpath' inside 'from_fs'
-	from_tree:FileSystemTree = from_fs.lsdir(from_dirpath)
+	# Inpect directory 'from_dirpath' inside 'from_fs', hidden entries are sent like the tar strategy does
+	from_tree:FileSystemTree = from_fs.lsdir(from_dirpath, hidden = True)
+
+	if workers > 1:
+		pairs, sizes = [], []
+		# The whole tree is created in a single exec
+		with _batched(to_fs):
+			for node in from_tree.nodes():
+				node_todir = to_fs.convert(to_fs.join(todir, node.relative_to_root()))
+				to_fs.mkdir(node_todir, exist_ok = True)
+				pairs.extend([(file, node_todir) for file in node.realfiles()])
+				sizes.extend([node.filesize(f) for f in node.files])
+		_transfer_pairs(pairs, from_fs, to_fs, workers, sizes = sizes)
+		return
+
 	for node in from_tree.nodes():
 		# Get node root dir path in destination filesystem
 		node_fromdir = to_fs.convert(to_fs.join(todir, node.relative_to_root()))
@@ -123,6 +255,59 @@ def transfer_dir(from_dirpath:str, to_dirpath:str, from_fs:FileSystem, to_fs:Fil
 			to_fs = to_fs
 		)
 
+def _sample(fs:FileSystem, path:str, size:int = 1 << 20) -> bytes:
+	"""
+	Up to 'size' bytes read from the first files of 'path' (128KB at most per file), to guess how compressible it is
+	"""
+	def head(file:str, n:int) -> bytes:
+		if type(fs).__name__ == 'RemoteSSHFileSystem':
+			with fs.openfile(file) as f:
+				return f.read(n)
+		with open(file, "rb") as f:
+			return f.read(n)
+
+	if fs.isfile(path):
+		return head(path, size)
+	sample = b""
+	files = fs.find(path, type = "f", min_size = 1)
+	try:
+		for file, t, filesize, mtime in files:
+			sample += head(file, min(128 << 10, size - len(sample)))
+			if len(sample) >= size:
+				break
+	finally:
+		files.close()
+	return sample
+
+def _remote_tools(from_fs:FileSystem, to_fs:FileSystem) -> 'list[str]':
+	"""
+	Tools available on every remote host of a transfer (see hostfacts), None if both sides are local
+	"""
+	tools = None
+	for fs in (from_fs, to_fs):
+		if type(fs).__name__ == 'RemoteSSHFileSystem':
+			tools = [t for t in fs.hostfacts()["tools"] if tools is None or t in tools]
+	return tools
+
+def _stream_codec(from_path:str, from_fs:FileSystem, to_fs:FileSystem, compression:str, level:int) -> Codec:
+	"""
+	Codec of a compressed stream transfer (see get_codec), "auto" looks at a sample of 'from_path'
+	and at the tools of the remote hosts
+	"""
+	sample = _sample(from_fs, from_path) if compression == "auto" else None
+	return get_codec(compression, level, _remote_tools(from_fs, to_fs), sample)
+
+def _transfer_resumable(from_path:str, to_path:str, from_fs:FileSystem, to_fs:FileSystem) -> str:
+	transferevent = pyevent.RichRemoteFileTransferEvent(caller = None)
+	transferevent.begin(
+		files = [from_path],
+		from_fs = from_fs,
+		to_fs = to_fs
+	)
+	received = resumable_transfer(from_path, to_path, from_fs, to_fs, progress = transferevent.progress)
+	transferevent.end()
+	return received
+
 # TODO: Better error msg when path (from and to) does not exist
 # TODO: Make compress_before work when from_path is a file
 def transfer(
@@ -132,7 +317,18 @@ def transfer(
 	to_fs:FileSystem,
 	compress_before:bool = False,
 	uncompress_after:bool = False,
-	from_path_delete:bool = False) -> 'tuple[str, str]':
+	from_path_delete:bool = False,
+	workers:int = 1,
+	sync:bool = False,
+	sync_checksum:bool = False,
+	sync_delete:bool = False,
+	strategy:str = "scp",
+	compression:str = None,
+	compression_level:int = None,
+	resumable:bool = False,
+	remote_mode:str = "relay",
+	pack_threshold:int = 1 << 20,
+	pack_bundle_size:int = 32 << 20) -> 'tuple[str, str]':
 	"""
 	Transfert a file or directory from one filesystem to a directory in another one.
 	Args:
@@ -143,6 +339,31 @@ def transfer(
 		compress_before (bool, optional): Compress the file or folder in 'from_fs' before transfer to 'to_fs'. Defaults to False.
 		uncompress_after (bool, optional): Uncompress the file or folder in 'to_fs' after transfer. Defaults to False.
 		from_path_delete (bool, optional): Delete the file or folder in 'from_fs' after transfer. Defaults to False.
+		workers (int, optional): Number of files transfered concurrently, each on its own SSH channel. Defaults to 1.
+			Copies between local paths always run on a thread pool (see LocalCopy), of 'workers' threads when above 1.
+		sync (bool, optional): Incremental directory transfer: only send files that are new or changed in the destination (see SyncPlan),
+			instead of replacing the destination directory. The plan is printed before it runs. Defaults to False.
+		sync_checksum (bool, optional): In sync mode, compare files by content rather than by modification time. Defaults to False.
+		sync_delete (bool, optional): In sync mode, remove destination entries missing from the source. Defaults to False.
+		strategy (str, optional): How directories are sent: "scp" (one scp per file, see transfer_dir),
+			"tar" (the whole tree as a single tar stream on one channel, see transfer_tar)
+			or "pack" (small files bundled in tar streams and large files sent with scp, over 'workers' channels, see PackPlan).
+			"auto" predicts the duration of every strategy, worker count and codec for this source and link, and runs the fastest
+			(see plan_transfer). 'workers' then bounds the channels it may use (PLAN_WORKERS if 1), 'compression' the codec it may use
+			(any if None). The plan is printed before it runs. Defaults to "scp".
+		compression (str, optional): Compress on the fly while sending: "gzip", "zstd", "lz4" (see pyrc.remote.compression)
+			or "auto" (the best codec available on both sides, or none if a sample of the data does not compress).
+			Compressed transfers are streamed (files through a single channel, directories as a tar stream),
+			nothing is written to disk, unlike 'compress_before'. Defaults to None.
+		compression_level (int, optional): Level of the compression codec. Defaults to the codec's default.
+		resumable (bool, optional): Send a file in checkpointed chunks over SFTP (see pyrc.remote.resumable),
+			so that running the same transfer again after an interruption continues from the last verified chunk.
+			An interrupted resumable transfer is always resumed, even without this flag. Defaults to False.
+		remote_mode (str, optional): Between two RemoteSSHFileSystem: "relay" (the data streams through this machine's memory),
+			"push" (the source host sends to the destination host over its own ssh connection)
+			or "auto" (push when the source host can log into the destination host). See pyrc.remote.relay. Defaults to "relay".
+		pack_threshold (int, optional): With strategy "pack", files under this size (in bytes) are bundled. Defaults to 1MB.
+		pack_bundle_size (int, optional): With strategy "pack", maximum size (in bytes) of a bundle. Defaults to 32MB.
 	Returns:
 		The 'sent' path (depending it as been compressed or not beforehand).
 		The 'received' path (depending it as been uncompressed or not afterwards).
@@ -151,6 +372,37 @@ def transfer(
 	if not from_fs.isfile(from_path) and not from_fs.isdir(from_path):
 		raise RuntimeError(f"Path {from_path} is not a valid path")
 
+	codec = None
+	if strategy == "auto" and not (sync and from_fs.isdir(from_path)):
+		if compress_before or uncompress_after:
+			raise RuntimeError("Strategy 'auto' cannot be combined with 'compress_before' or 'uncompress_after'")
+		plan = plan_transfer(
+			from_path, from_fs, to_fs,
+			workers = workers if workers > 1 else PLAN_WORKERS,
+			compression = "auto" if compression is None else compression,
+			compression_level = compression_level,
+			pack_threshold = pack_threshold,
+			pack_bundle_size = pack_bundle_size
+		)
+		rich.print(plan)
+		strategy, workers, codec = plan.strategy, plan.workers, plan.codec
+	elif compression is not None:
+		if compress_before or uncompress_after:
+			raise RuntimeError("'compression' streams compressed data, it cannot be combined with 'compress_before' or 'uncompress_after'")
+		codec = _stream_codec(from_path, from_fs, to_fs, compression, compression_level)
+
+	# Sync applies to directories, a single file is always sent
+	if sync and from_fs.isdir(from_path):
+		if compress_before or uncompress_after:
+			raise RuntimeError("Compression is not supported by sync transfers")
+		received = to_fs.join(to_path, from_fs.basename(from_path))
+		plan = SyncPlan(from_path, received, from_fs, to_fs, checksum = sync_checksum, delete = sync_delete)
+		rich.print(plan)
+		plan.run(workers)
+		if from_path_delete:
+			from_fs.rm(from_path, recur = True)
+		return from_path, received
+
 	sent, received = from_path, to_fs.join(to_path, from_fs.basename(from_path))
 	# Files to be remove from 'from_fs' after the transfer completion
 	from_fs_to_remove = []
@@ -175,10 +427,32 @@ def transfer(
 
 
 	# Step 2 : Transfer
-	if from_fs.isfile(from_path):
-		received = transfer_files([from_path], to_path, from_fs, to_fs)[0]
+	if type(from_fs).__name__ == 'RemoteSSHFileSystem' and type(to_fs).__name__ == 'RemoteSSHFileSystem' and from_fs != to_fs:
+		received = transfer_remote(from_path, to_path, from_fs, to_fs, codec, remote_mode)
+	elif isinstance(from_fs, LocalFileSystem) and from_fs == to_fs and from_fs.isdir(from_path):
+		# Like transfer_dir, the destination directory is replaced
+		received = to_fs.join(to_fs.abspath(to_path), from_fs.basename(from_path))
+		if to_fs.isdir(received):
+			to_fs.rmdir(received, recur = True)
+		copy = LocalCopy(workers = workers if workers > 1 else COPY_WORKERS)
+		copy.add_tree(from_fs.abspath(from_path), received)
+		_local_copy(copy, from_fs, to_fs)
+	elif from_fs.isfile(from_path):
+		if codec is not None:
+			received = transfer_file_stream(from_path, to_path, from_fs, to_fs, codec)
+		elif resumable or resumable_pending(from_path, to_path, from_fs, to_fs):
+			received = _transfer_resumable(from_path, to_path, from_fs, to_fs)
+		else:
+			received = transfer_files([from_path], to_path, from_fs, to_fs)[0]
 	elif from_fs.isdir(from_path):
-		transfer_dir(from_path, to_path, from_fs, to_fs)
+		if strategy == "tar" or codec is not None:
+			transfer_tar(from_path, to_path, from_fs, to_fs, codec)
+		elif strategy == "scp":
+			transfer_dir(from_path, to_path, from_fs, to_fs, workers)
+		elif strategy == "pack":
+			PackPlan(from_fs.abspath(from_path), to_fs.join(to_fs.abspath(to_path), from_fs.basename(from_path)), from_fs, to_fs, pack_threshold, pack_bundle_size).run(workers)
+		else:
+			raise RuntimeError(f"Unknown transfer strategy {strategy}")
 
 	# Step 3 : Uncompression (if requested)
 	if uncompress_after:
@@ -196,45 +470,3 @@ def transfer(
 	[to_fs.rm(p, recur = True) for p in to_fs_to_remove]
 
 	return sent, received
-
-
-
-
-#If neither from_fs or to_fs is 'LocalFileSystem', this perform a buffered transfer.
-#The workflow will be the following from_fs -> LocalFileSystem -> to_fs
-def __buffered_transfer(
-	from_path:str, 
-	to_path:str,
-	local_buffer_path:str,
-	from_fs:FileSystem, 
-	to_fs:FileSystem,
-	compress_before:bool = False,
-	uncompress_after:bool = False,
-	from_path_delete:bool = False):
-
-	# Buffer must be a valid directory
-	assert LocalFileSystem().isdir(local_buffer_path)
-
-	# Transfer from 'from_ts' to local buffer
-	sent, received = transfer(
-		from_path = from_path,
-		to_path = local_buffer_path,
-		from_fs = from_fs,
-		to_fs = LocalFileSystem(),
-		compress_before = compress_before,
-		uncompress_after = False,
-		from_path_delete = from_path_delete
-	)
-
-	# Transfer from local buffer to 'to_fs'
-	# Get 'from_path' equivalent in the buffered path
-	# And remove local buffer content
-	transfer(
-		from_path = received,
-		to_path = to_path,
-		from_fs = LocalFileSystem(),
-		to_fs = to_fs,
-		compress_before = False,
-		uncompress_after = uncompress_after,
-		from_path_delete = True
-	)
@@ -1,5 +1,9 @@
 from .filesystem import FileSystem, OSTYPE
+from .statcache import StatCache
+from .batch import CommandBatch, CommandStep
 from .command import FileSystemCommand
 from .scriptgenerator import ScriptGenerator, BashScriptGenerator
 from .local import LocalFileSystem
-from .filesystemtree import FileSystemTree
\ No newline at end of file
+from .localcopy import LocalCopy
+from .filesystemtree import FileSystemTree
+from .asyncfs import AsyncFileSystem
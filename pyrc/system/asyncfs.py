@@ -0,0 +1,118 @@
+import asyncio, functools
+from concurrent.futures import ThreadPoolExecutor
+from pyrc.system.filesystem import FileSystem
+
+# ------------------ AsyncFileSystem
+class AsyncFileSystem(object):
+	"""
+	asyncio facade over any FileSystem connector (LocalFileSystem, RemoteSSHFileSystem, DockerContainer, ...).
+	Every blocking method of the connector (exec_command, isfile, ls, lsdir, mkdir, upload, ...) is exposed as a coroutine
+	running on a thread pool owned by this facade, whose size bounds the number of concurrent calls on the connector.
+	Pure path helpers (join, basename, ...) stay synchronous.
+		hosts = [AsyncFileSystem(c, max_concurrency = 4) for c in connectors]
+		results = await asyncio.gather(*[h.isfile(p) for h in hosts for p in paths])
+	"""
+	# Methods that do not reach the connected system
+	SYNCHRONOUS = {
+		"join", "dirname", "basename", "ext", "convert", "relative_to",
+		"name", "is_unix", "is_remote", "os_to_str"
+	}
+
+	@property
+	def connector(self) -> FileSystem:
+		return self.__connector
+
+	def __init__(self, connector:FileSystem, max_concurrency:int = 8) -> None:
+		self.__connector = connector
+		self.max_concurrency = max_concurrency
+		self.__executor = ThreadPoolExecutor(max_workers = max_concurrency, thread_name_prefix = "pyrc-async")
+
+	def __getattr__(self, name):
+		# Only called for attributes that are not defined by AsyncFileSystem
+		if name.startswith("_"):
+			raise AttributeError(name)
+		attr = getattr(self.__connector, name)
+		if not callable(attr) or name in AsyncFileSystem.SYNCHRONOUS:
+			return attr
+		async def call(*args, **kwargs):
+			return await self.run(attr, *args, **kwargs)
+		call.__name__ = name
+		call.__doc__ = attr.__doc__
+		return call
+
+	async def run(self, fct, *args, **kwargs):
+		"""
+		Run the blocking callable 'fct' on this connector's thread pool
+		"""
+		loop = asyncio.get_running_loop()
+		return await loop.run_in_executor(self.__executor, functools.partial(fct, *args, **kwargs))
+
+	def batch(self):
+		"""
+		Not available: a batch only queues the commands of the thread that opened it (see FileSystemCommand.batch)
+		and coroutines run their calls on any thread of the pool. Batch inside a single blocking call instead:
+			def create(fs, dirs):
+				with fs.batch():
+					for d in dirs:
+						fs.mkdir(d)
+			await afs.run(create, afs.connector, dirs)
+		"""
+		raise RuntimeError("AsyncFileSystem does not support batches, open them inside AsyncFileSystem.run.")
+
+	async def iterls(self, path:str):
+		"""
+		Asynchronous generator over the connector's iterls, each entry is read on the thread pool
+		"""
+		async for entry in self.__iterate(self.__connector.iterls(path)):
+			yield entry
+
+	async def find(self, root:str, **filters):
+		"""
+		Asynchronous generator over the connector's find, each entry is read on the thread pool
+		"""
+		async for entry in self.__iterate(self.__connector.find(root, **filters)):
+			yield entry
+
+	async def __iterate(self, entries):
+		try:
+			while True:
+				entry = await self.run(next, entries, None)
+				if entry is None:
+					return
+				yield entry
+		finally:
+			entries.close()
+
+	async def transfer(self, from_path:str, to_path:str, to_fs:FileSystem, **kwargs):
+		"""
+		Asynchronous pyrc.remote.transfer from this connector to 'to_fs' (a FileSystem or an AsyncFileSystem).
+		See pyrc.remote.transfer for the other arguments.
+		"""
+		from pyrc.remote.transfer import transfer
+		to_fs = to_fs.connector if isinstance(to_fs, AsyncFileSystem) else to_fs
+		return await self.run(
+			transfer,
+			from_path = from_path,
+			to_path = to_path,
+			from_fs = self.__connector,
+			to_fs = to_fs,
+			**kwargs
+		)
+
+	def close(self) -> None:
+		"""
+		Shut the thread pool down (the connector is left open)
+		"""
+		self.__executor.shutdown(wait = True)
+
+	#--------------------------
+	# Context Manager pattern
+	#--------------------------
+	async def __aenter__(self):
+		return self
+
+	async def __aexit__(self, exception_type, exception_value, traceback):
+		# Waiting for the running calls would block the event loop, wait for them on its default executor
+		await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+# ------------------ AsyncFileSystem
@@ -0,0 +1,151 @@
+import re, uuid, threading
+import pyrc.event.event as pyevent
+
+# ------------------ CommandStep
+class CommandStep(object):
+	"""
+	A command produced by a FileSystemCommand method, with what is needed to run it on its own
+	or inside a CommandBatch and to raise the same errors in both cases.
+	"""
+	def __init__(self,
+			cmd:str,
+			event:pyevent.Event = None,
+			cwd:str = "",
+			guard:'tuple[list[tuple[str,str]],Exception]' = None,
+			check = None,
+			touched:'list[str]' = None
+		) -> None:
+		self.cmd = cmd
+		# Event the command outputs go through
+		self.event = event
+		# Working directory of the command
+		self.cwd = cwd
+		# ([(flag, path), ...], exception), the command only runs if one of the '[[ -<flag> <path> ]]' tests is true.
+		# 'exception' is raised otherwise
+		self.guard = guard
+		# check(out, err, status) raises method specific exceptions
+		self.check = check
+		# Paths modified by the command
+		self.touched = [] if touched is None else list(touched)
+
+	def guard_cmd(self) -> str:
+		return " || ".join([f"[[ -{flag} {path} ]]" for flag, path in self.guard[0]])
+
+# ------------------ CommandStep
+
+# ------------------ CommandBatch
+class CommandBatch(object):
+	"""
+	Context manager (see FileSystemCommand.batch) queuing the commands of FileSystemCommand methods
+	and shipping them as a single shell invocation when the outermost 'with' block exits.
+	Every step runs in a subshell followed by a delimiter carrying its index and exit status
+	on both stdout and stderr, so outputs are split back per step and replayed through each step's event.
+	Execution stops at the first failing step, whose error is raised with the type the method would raise on its own.
+	If the 'with' block raises, queued steps are discarded.
+	A batch only queues the commands of the thread that opened it (see FileSystemCommand.batch).
+	Predicates (isfile, isdir, ...) and direct exec_command calls are not queued and run immediately.
+	"""
+	def __init__(self, connector:'FileSystemCommand') -> None:
+		self.__connector = connector
+		self.__steps:'list[CommandStep]' = []
+		self.__depth = 0
+		# Thread that opened the batch
+		self.__owner:int = None
+		# Unique delimiter of this batch's steps
+		self.__token = f"__pyrc_batch_{uuid.uuid4().hex}__"
+
+	def __len__(self):
+		return len(self.__steps)
+
+	def append(self, step:CommandStep) -> None:
+		self.__steps.append(step)
+
+	#--------------------------
+	# Context Manager pattern
+	#--------------------------
+	def __enter__(self):
+		if self.__depth == 0:
+			self.__owner = threading.get_ident()
+		elif self.__owner != threading.get_ident():
+			raise RuntimeError("A batch can only be used by the thread that opened it.")
+		self.__depth += 1
+		self.__connector._batch = self
+		return self
+
+	def __exit__(self, exception_type, exception_value, traceback):
+		self.__depth -= 1
+		if self.__depth > 0:
+			return
+		self.__connector._batch = None
+		steps, self.__steps = self.__steps, []
+		if exception_type is None and len(steps) > 0:
+			self.run(steps)
+
+	#--------------------------
+	# Execution
+	#--------------------------
+	def script(self, steps:'list[CommandStep]') -> str:
+		lines = []
+		for i, step in enumerate(steps):
+			cmd = step.cmd
+			if step.guard is not None:
+				cmd = f"if {step.guard_cmd()}; then {cmd}; else echo {self.__token} guard; exit 1; fi"
+			if step.cwd != "":
+				cmd = f"cd {step.cwd} && {cmd}"
+			lines.append(
+				f"( {cmd} ) </dev/null; s=$?; "
+				f"echo; echo {self.__token} {i} $s; echo >&2; echo {self.__token} {i} $s >&2; "
+				"[ $s -eq 0 ] || exit $s"
+			)
+		return "\n".join(lines)
+
+	def split(self, lines:'list[str]') -> 'dict[int,tuple[list[str],int]]':
+		"""
+		Split the batch outputs into {step index : (lines, status)}
+		"""
+		delimiter = re.compile(f"^{self.__token} ([0-9]+) ([0-9]+)$")
+		steps, current = {}, []
+		for line in lines:
+			m = delimiter.match(line)
+			if m is None:
+				current.append(line)
+			else:
+				# Connectors merging stderr into stdout (DockerContainer) show each delimiter twice
+				i = int(m.group(1))
+				steps[i] = (steps[i][0] + current if i in steps else current, int(m.group(2)))
+				current = []
+		return steps
+
+	def run(self, steps:'list[CommandStep]') -> None:
+		stdout:'list[str]' = []
+		try:
+			out, stderr, status = self.__connector.exec_command(
+				cmd = self.script(steps),
+				event = pyevent.CommandCallbackEvent(self.__connector, stdout.append)
+			)
+		finally:
+			self.__connector.invalidate_stat_cache(*[p for step in steps for p in step.touched])
+
+		outs, errs = self.split(stdout), self.split(stderr)
+		for i, step in enumerate(steps):
+			# Steps after a failure did not run
+			if i not in outs:
+				break
+			out, status = outs[i]
+			err = errs[i][0] if i in errs else []
+			if step.guard is not None and f"{self.__token} guard" in out:
+				raise step.guard[1]
+
+			if step.event is not None:
+				# Generator fluxes are read as chunks of output (see FluxIterator)
+				step.event.begin(step.cmd, step.cwd, None, (l + "\n" for l in out), (l + "\n" for l in err))
+				step.event.end()
+			if step.check is not None:
+				step.check(out, err, status)
+			if status != 0:
+				raise RuntimeError("\n".join(err) if len(err) > 0 else f"Command '{step.cmd}' failed with status {status}")
+
+		if len(outs) < len(steps):
+			raise RuntimeError("\n".join(stderr) if len(stderr) > 0 else "Batch was interrupted")
+
+# ------------------ CommandBatch
@@ -1,7 +1,30 @@
+import threading
 from pyrc.system.filesystem import FileSystem
 from pyrc.system.filesystemtree import FileSystemTree
+from pyrc.system.statcache import StatCache
+from pyrc.system.batch import CommandStep, CommandBatch
 import pyrc.event.event as pyevent
 
+def _lines(out:'list[str]') -> 'list[str]':
+	"""
+	Normalize captured stdout into one entry per line.
+	Some connectors (DockerContainer) stream chunks holding several lines.
+	"""
+	return [l for l in "\n".join(out).split("\n") if l != ""]
+
+def _prune(hidden:bool) -> str:
+	"""
+	'find' expression skipping hidden entries (and what is under hidden directories) unless 'hidden'
+	"""
+	return "" if hidden else "-name '.*' -prune -o "
+
+def _mkdir_errors(out:'list[str]', err:'list[str]', status:int) -> None:
+	if len(err) > 0:
+		if "File exists" in "".join(err):
+			raise FileExistsError('\n'.join(err))
+		else:
+			raise RuntimeError('\n'.join(err))
+
 # ------------------ FileSystemCommad
 class FileSystemCommand(FileSystem):
 	"""
@@ -10,8 +33,116 @@ class FileSystemCommand(FileSystem):
 	This is the exact opposite of LocalFileSystem which would call os.mkdir(...).
 	"""
 	def __init__(self) -> None:
+		# Opt-in path predicates cache (see enable_stat_cache)
+		# It survives re-initialisation (RemoteSSHFileSystem.open) but is emptied
+		if getattr(self, "_statcache", None) is None:
+			self._statcache:StatCache = None
+		else:
+			self._statcache.clear()
+		# Open CommandBatch of each thread (see batch): commands run by other threads are never queued in it
+		self._batches = threading.local()
+		# Environment snapshot (see environment)
+		self._environment:'dict[str,str]' = None
 		FileSystem.__init__(self)
 
+	# ------------------------
+	#		Stat cache
+	# ------------------------
+
+	@property
+	def stat_cache(self) -> StatCache:
+		"""
+		The path predicates cache, None if disabled
+		"""
+		return self._statcache
+
+	def enable_stat_cache(self, ttl:float = 5.0, maxsize:int = 4096) -> StatCache:
+		"""
+		Cache the results of isfile, isdir, islink and isexe.
+		A cache miss fetches all predicates of the path in a single command.
+		Mutating methods (mkdir, rmdir, unlink, touch, copy, zip, unzip) invalidate the paths they touch and their parents.
+		Args:
+			ttl (float, optional): Seconds an entry stays valid. Defaults to 5.0.
+			maxsize (int, optional): Maximum number of cached paths. Defaults to 4096.
+		Returns:
+			StatCache: the cache, see StatCache.info() for hit/miss counters
+		"""
+		self._statcache = StatCache(ttl = ttl, maxsize = maxsize)
+		return self._statcache
+
+	def disable_stat_cache(self) -> None:
+		self._statcache = None
+
+	def invalidate_stat_cache(self, *paths:str) -> None:
+		"""
+		Forget cached predicates of the given paths (and of their parents and children).
+		To be called after modifying the filesystem without using this connector's methods.
+		"""
+		if self._statcache is not None:
+			for path in paths:
+				self._statcache.invalidate(path)
+
+	def __test(self, flag:str, path:str) -> bool:
+		"""
+		Evaluate '[[ -<flag> <path> ]]'
+		"""
+		if self._statcache is None:
+			out, err, status = self.exec_command(cmd = f"[[ -{flag} {path} ]] && echo \"ok\"", event=pyevent.ErrorRaiseEvent())
+			if len(out) == 0: return False
+			else : return "ok" in out[0]
+
+		flags = self._statcache.get(path)
+		if flags is None:
+			out = self.evaluate(
+				f"[[ -f {path} ]] && echo f; [[ -d {path} ]] && echo d; [[ -L {path} ]] && echo L; [[ -x {path} ]] && echo x; true"
+			)
+			flags = frozenset(_lines(out))
+			self._statcache.set(path, flags)
+		return flag in flags
+
+	# ------------------------
+	#		Batching
+	# ------------------------
+
+	@property
+	def _batch(self) -> CommandBatch:
+		return getattr(self._batches, "batch", None)
+
+	@_batch.setter
+	def _batch(self, batch:CommandBatch) -> None:
+		self._batches.batch = batch
+
+	def batch(self) -> CommandBatch:
+		"""
+		Context manager folding the commands of mkdir, rmdir, unlink, touch and copy into a single exec:
+			with fs.batch():
+				for d in dirs:
+					fs.mkdir(d)
+		Commands are shipped when the outermost 'with' block exits,
+		errors are raised for the step that failed with the same exception types as outside a batch.
+		A batch belongs to the thread that opened it: calls made by other threads meanwhile run immediately.
+		See CommandBatch.
+		"""
+		return self._batch if self._batch is not None else CommandBatch(self)
+
+	def _submit(self, step:CommandStep):
+		"""
+		Run the command of a FileSystemCommand method, or queue it if a batch is open
+		"""
+		if self._batch is not None:
+			self._batch.append(step)
+			return None
+
+		if step.guard is not None:
+			tests, error = step.guard
+			if not any(self.__test(flag, path) for flag, path in tests):
+				raise error
+		self.invalidate_stat_cache(*step.touched)
+		out, err, status = self.exec_command(cmd = step.cmd, cwd = step.cwd, event = step.event)
+		if step.check is not None:
+			step.check(out, err, status)
+		return out, err, status
+
 	# ------------------------
 	#		To Override
 	# ------------------------
@@ -35,42 +166,46 @@ class FileSystemCommand(FileSystem):
 	
 	#@overrides
 	def mkdir(self, path:str, mode=0o777, parents=False, exist_ok=False):
-		event = pyevent.CommandStoreEvent()
-		out, err = [], []
 		if self.is_unix():
 			flag = " -p " if parents or exist_ok else ""
 			"""TODO make mode work on remote machine"""
 			#flag = " ".join([flag, "-m " + str(mode)])
-			out, err, status = self.exec_command(cmd = f"mkdir {flag} {path}", event = event)
+			cmd = f"mkdir {flag} {path}"
 		else: # No need for -p flag in Windows
-			out, err, status = self.exec_command(cmd = f"mkdir {path}", event = event)
+			cmd = f"mkdir {path}"
 
-		if len(err) > 0:
-			if "File exists" in "".join(err):
-				raise FileExistsError('\n'.join(err))
-			else:
-				raise RuntimeError('\n'.join(err))
+		self._submit(CommandStep(
+			cmd = cmd,
+			event = pyevent.CommandStoreEvent(),
+			check = _mkdir_errors,
+			touched = [path]
+		))
 
 	#@overrides
 	def rmdir(self, path:str, recur:bool = False):
 		if self.is_unix():
 			cmd_ = "rm -rf" if recur else "rmdir"
-			out, err, status = self.exec_command(
+			self._submit(CommandStep(
 				cmd = f"{cmd_} {path}",
-				event = pyevent.ErrorRaiseEvent()
-			)
+				event = pyevent.ErrorRaiseEvent(),
+				touched = [path]
+			))
 		else:
 			raise RuntimeError("rmdir is only available on unix remote systems.")
 
 	#@overrides
 	def unlink(self, path:str, missing_ok:bool=False) -> None:
-		if not missing_ok and not (self.isfile(path) or self.islink(path)):
-			raise FileNotFoundError(f"Remote file {path} does not exist.")
 		if self.is_unix():
-			out, err, status = self.exec_command(
+			self._submit(CommandStep(
 				cmd = f"rm -f {path}",
-				event = pyevent.ErrorRaiseEvent()
-			)
+				event = pyevent.ErrorRaiseEvent(),
+				# Path must be a file or a link
+				guard = None if missing_ok else (
+					[("f", path), ("L", path)],
+					FileNotFoundError(f"Remote file {path} does not exist.")
+				),
+				touched = [path]
+			))
 		else:
 			raise RuntimeError("unlink is only available on unix remote systems.")
 
@@ -98,29 +233,134 @@ class FileSystemCommand(FileSystem):
 			out, err, status = self.exec_command(cmd = f"dir {path}", event=pyevent.ErrorRaiseEvent())
 			return out
 
+	#@overrides
+	def iterls(self, path:str):
+		"""
+		Same entries as 'ls', streamed from a single 'find' reading one '<type>\\t<size>\\t<name>' record at a time.
+		The command starts when the first entry is requested.
+		"""
+		if not self.is_unix():
+			raise RuntimeError("iterls is only available on unix remote systems.")
+
+		lines, _, _ = self.exec_command(
+			cmd = f"cd {path} && pwd -P && find -L . -mindepth 1 -maxdepth 1 ! -name '.*' -printf '%y\\t%s\\t%f\\n' 2>/dev/null",
+			event = pyevent.CommandStreamEvent(self)
+		)
+		try:
+			root = next(lines, None)
+			if root is None or not root.startswith("/"):
+				raise FileNotFoundError(f"Cannot list {path}. Path is not a valid directory")
+			for line in lines:
+				fields = line.split("\t", 2)
+				if len(fields) == 3:
+					type, size, name = fields
+					yield name, type, int(size) if type == "f" else None
+		finally:
+			lines.close()
+
 	#@overrides
 	def walk0(self, path:str) -> tuple:
-		root = self.abspath(path)
+		"""
+		Resolve 'path' and classify its entries (same entries as 'ls') in a single command.
+		Outputs the resolved root, then one 'f/<name>' or 'd/<name>' line per file or directory.
+		The script holds no double quotes as DockerContainer wraps commands inside bash -c "...",
+		so IFS is emptied and globbing disabled to keep names intact through unquoted expansions.
+		"""
+		if not self.is_unix():
+			raise RuntimeError("walk0 is only available on unix remote systems.")
+
+		lines = _lines(self.evaluate(
+			f"cd {path} && pwd -P && IFS= && for e in *; do set -f; "
+			"if [[ -f $e ]]; then echo f/$e; elif [[ -d $e ]]; then echo d/$e; fi; done"
+		))
+		if len(lines) == 0 or not lines[0].startswith("/"):
+			raise FileNotFoundError(f"Cannot walk {path}. Path is not a valid directory")
+
+		root = lines[0]
 		files = []
 		dirs = []
-		files_and_dirs = self.ls(root)
-		for fad in files_and_dirs:
-			if self.isfile(self.join(root, fad)):
-				files.append(fad)
-			elif self.isdir(self.join(root, fad)):
-				dirs.append(fad)
+		for line in lines[1:]:
+			if line.startswith("f/"):
+				files.append(line[2:])
+			elif line.startswith("d/"):
+				dirs.append(line[2:])
 		return root, dirs, files
 
 	#@overrides
-	def lsdir(self, path:str):
-		return FileSystemTree.get_tree(self, path)
+	def lsdir(self, path:str, hidden:bool = False):
+		"""
+		Build the whole tree from a single 'find' traversal instead of one walk0 per directory.
+		Outputs the resolved root, then one '<type>\\t<size>\\t<mtime>\\t<relpath>' record per entry.
+		Records are inserted in the tree as they are read so the raw output is never held in memory.
+		Like walk0, hidden entries are skipped (unless 'hidden') and symbolic links are followed.
+		Raises RuntimeError if find reports an error, rather than returning a partial tree.
+		"""
+		if not self.is_unix():
+			return FileSystemTree.get_tree(self, path)
+
+		tree:FileSystemTree = None
+		def record(line:str):
+			nonlocal tree
+			if tree is None:
+				tree = FileSystemTree(path = self, root = line, parent = None, files = [], dirs = {})
+				return
+			fields = line.split("\t", 3)
+			if len(fields) != 4:
+				raise RuntimeError(f"Cannot list {path}. Unexpected record '{line}'")
+			type, size, mtime, relpath = fields
+			tree.insert(relpath, type, int(size), float(mtime))
+
+		out, err, status = self.exec_command(
+			cmd = f"cd {path} && pwd -P && find -L . -mindepth 1 {_prune(hidden)}-printf '%y\\t%s\\t%T@\\t%P\\n'",
+			event = pyevent.CommandCallbackEvent(self, record)
+		)
+		if tree is None or not tree.root.startswith("/"):
+			raise FileNotFoundError(f"Cannot list {path}. Path is not a valid directory")
+		# A traversal that failed on the way (unreadable directory, symbolic link loop...) would give a partial tree
+		if status != 0 or len(err) > 0:
+			raise RuntimeError(f"Cannot list {path}.\n" + "\n".join(err))
+		return tree
+
+	#@overrides
+	def find(self, root:str, pattern:str = None, min_size:int = None, newer_than:float = None, type:str = None, hidden:bool = False):
+		"""
+		Filters are evaluated by 'find' on the remote side, only matching records are streamed back.
+		The command starts when the first entry is requested.
+		"""
+		if not self.is_unix():
+			raise RuntimeError("find is only available on unix remote systems.")
+
+		filters = []
+		if pattern is not None:
+			filters.append(f"-name '{pattern}'")
+		if type is not None:
+			filters.append(f"-type {type}")
+		if min_size is not None:
+			# -size +Nc means strictly more than N bytes
+			filters.append(f"-type f -size +{min_size - 1}c" if min_size > 0 else "-type f")
+		if newer_than is not None:
+			filters.append(f"-newermt @{newer_than}")
+
+		lines, _, _ = self.exec_command(
+			cmd = f"cd {root} && pwd -P && find -L . -mindepth 1 {_prune(hidden)}{' '.join(filters)} -printf '%y\\t%s\\t%T@\\t%P\\n' 2>/dev/null",
+			event = pyevent.CommandStreamEvent(self)
+		)
+		try:
+			first = next(lines, None)
+			if first is None or not first.startswith("/"):
+				raise FileNotFoundError(f"Cannot search {root}. Path is not a valid directory")
+			for line in lines:
+				fields = line.split("\t", 3)
+				if len(fields) == 4:
+					t, size, mtime, relpath = fields
+					yield self.join(root, relpath), t, int(size), float(mtime)
+		finally:
+			lines.close()
 
 	#@overrides
 	def isfile(self, path:str) -> bool:
 		if self.is_unix():
-			out, err, status = self.exec_command(cmd = f"[[ -f {path} ]] && echo \"ok\"", event=pyevent.ErrorRaiseEvent())
-			if len(out) == 0: return False
-			else : return "ok" in out[0]
+			return self.__test("f", path)
 		else:
 			# TODO
 			raise RuntimeError("isfile not supported for Windows remote systems")
@@ -128,9 +368,7 @@ class FileSystemCommand(FileSystem):
 	#@overrides
 	def isexe(self, path:str) -> bool:
 		if self.is_unix():
-			out, err, status = self.exec_command(cmd = f"[[ -x {path} ]] && echo \"ok\"", event=pyevent.ErrorRaiseEvent())
-			if len(out) == 0: return False
-			else : return "ok" in out[0]
+			return self.__test("x", path)
 		else:
 			# TODO
 			raise RuntimeError("isexe not supported for Windows remote systems")
@@ -138,9 +376,7 @@ class FileSystemCommand(FileSystem):
 	#@overrides
 	def isdir(self, path:str) -> bool:
 		if self.is_unix():
-			out, err, status = self.exec_command(cmd = f"[[ -d {path} ]] && echo \"ok\"", event=pyevent.ErrorRaiseEvent())
-			if len(out) == 0: return False
-			else : return "ok" in out[0]
+			return self.__test("d", path)
 		else:
 			# TODO
 			raise RuntimeError("isdir not supported for Windows remote systems")
@@ -148,9 +384,7 @@ class FileSystemCommand(FileSystem):
 	#@overrides
 	def islink(self, path:str) -> bool:
 		if self.is_unix():
-			out, err, status = self.exec_command(cmd = f"[[ -L {path} ]] && echo \"ok\"", event=pyevent.ErrorRaiseEvent())
-			if len(out) == 0: return False
-			else : return "ok" in out[0]
+			return self.__test("L", path)
 		else:
 			# TODO
 			raise RuntimeError("islink not supported for Windows remote systems")
@@ -158,18 +392,23 @@ class FileSystemCommand(FileSystem):
 	#@overrides
 	def touch(self, path:str):
 		parent = self.dirname(path)
-		if not self.isdir(parent):
-			raise RuntimeError(f"Path {parent} is not a valid directory.")
-
 		if self.is_unix():
-			self.exec_command(f"touch {path}", event=pyevent.ErrorRaiseEvent())
+			self._submit(CommandStep(
+				cmd = f"touch {path}",
+				event = pyevent.ErrorRaiseEvent(),
+				guard = ([("d", parent)], RuntimeError(f"Path {parent} is not a valid directory.")),
+				touched = [path]
+			))
 		else:
+			if not self.isdir(parent):
+				raise RuntimeError(f"Path {parent} is not a valid directory.")
 			self.exec_command(f"call > {path}", event=pyevent.ErrorRaiseEvent())
 
 	#@overrides
 	def zip(self, path:str, archive_path:str = None, flag:str = "") -> str:
 		archive_path = FileSystem.zip(self, path, archive_path)
 		if self.is_unix():
+			self.invalidate_stat_cache(archive_path)
 			# Change working directory to not have full dir tree in the archive
 			# Move to folder to compress and compress all files there
 			self.exec_command(
@@ -185,6 +424,7 @@ class FileSystemCommand(FileSystem):
 	def unzip(self, archive_path:str, to_path:str = None, flag:str = "") -> None:
 		folder_path = FileSystem.unzip(self, archive_path, to_path)
 		if self.is_unix():
+			self.invalidate_stat_cache(folder_path)
 			self.exec_command(f"unzip {flag} {archive_path} -d {folder_path}", event=pyevent.ErrorRaiseEvent())
 			return folder_path
 		else:
@@ -194,7 +434,11 @@ class FileSystemCommand(FileSystem):
 	def copy(self, src:str, dst:str, follow_symlinks:bool=True):
 		# TODO : implement follow_symlinks logic
 		if self.is_unix():
-			self.exec_command(f"cp -r {src} {dst}", event=pyevent.ErrorRaiseEvent())
+			self._submit(CommandStep(
+				cmd = f"cp -r {src} {dst}",
+				event = pyevent.ErrorRaiseEvent(),
+				touched = [dst, self.join(dst, self.basename(src))]
+			))
 		else:
 			return NotImplemented
 
@@ -214,12 +458,98 @@ class FileSystemCommand(FileSystem):
 		else:
 			return self.evaluate(f"python -c \"import os; print(os.environ[\'{var}\'])\"")[0]
 
+	#@overrides
+	def environment(self, refresh:bool = False) -> 'dict[str,str]':
+		"""
+		Fetch all the environment variables in a single null-delimited 'env -0' call.
+		The output is split on NUL characters as it was printed, values keep their newlines and blank lines.
+		The snapshot is cached by the connector until refresh is requested.
+		"""
+		if self._environment is None or refresh:
+			if not self.is_unix():
+				raise RuntimeError("environment not supported for Windows remote systems")
+			out, err, status = self.exec_command("env -0", event = pyevent.CommandRawEvent(self))
+			if len(err) > 0:
+				raise RuntimeError("\n".join(err))
+			environment = {}
+			for var in out.split("\0"):
+				name, sep, value = var.partition("=")
+				if sep != "":
+					environment[name] = value
+			self._environment = environment
+		return self._environment
+
 	#@overrides
 	def getsize(self, path) -> int:
+		"""
+		Size of a file, or total size of the files under a directory, summed on the remote side in a single command.
+		Directories are traversed like lsdir (hidden entries skipped, symbolic links followed) so both agree.
+		Raises FileNotFoundError if the path does not exist, RuntimeError if find reports an error.
+		"""
 		if self.is_unix(): 
-			return int(self.evaluate(f"stat --printf=\"%s\" {path}")[0])
+			sizes = "-type f -printf '%s\\n'"
+			total = []
+			# Nothing is printed for a missing path
+			# OFMT keeps awk from printing large totals in exponent notation
+			out, err, status = self.exec_command(
+				cmd = f"[[ -e {path} ]] && {{ if [[ -d {path} ]]; then cd {path} && find -L . -mindepth 1 {_prune(False)}{sizes}; "
+				f"else find -L {path} -maxdepth 0 {sizes}; fi; }} | awk -v OFMT=%.0f '{{s+=$1}} END {{print s+0}}'",
+				event = pyevent.CommandCallbackEvent(self, total.append)
+			)
+			if status != 0 or len(err) > 0:
+				raise RuntimeError(f"Cannot get the size of {path}.\n" + "\n".join(err))
+			if len(total) == 0:
+				raise FileNotFoundError(f"Cannot get the size of {path}. Path does not exist")
+			return int(total[-1])
 		else:
 			return NotImplemented
 
+	def _xargs(self, cmd:str, paths:'list[str]', callback) -> None:
+		"""
+		Run 'cmd' on 'paths' through xargs from a here-document (paths are neither quoted nor split on spaces),
+		in as few commands as the command line length allows. Every stdout line is handed to 'callback(line)', errors are dropped:
+		a path the command fails on (e.g. a missing file) only shows by the absence of its line.
+		"""
+		# Keep each command well under the 128KB limit of a single argument (DockerContainer runs bash -c "<cmd>")
+		chunk, chunk_len = [], 0
+		for i, path in enumerate(paths):
+			chunk.append(path)
+			chunk_len += len(path) + 1
+			if chunk_len >= 65536 or i == len(paths) - 1:
+				self.exec_command(
+					cmd = f"xargs -d '\\n' {cmd} 2>/dev/null <<'__PYRC_PATHS__'\n" + "\n".join(chunk) + "\n__PYRC_PATHS__",
+					event = pyevent.CommandCallbackEvent(self, callback)
+				)
+				chunk, chunk_len = [], 0
+
+	#@overrides
+	def checksum(self, paths:'list[str]', algo:str = "sha256") -> 'dict[str,str]':
+		"""
+		Paths are fed to '<algo>sum' through xargs from a here-document, in as few commands as the
+		command line length allows (one for most lists). Digests are recorded as they are streamed back.
+		No partial result is returned: paths without a digest (missing, directories, unreadable)
+		are all reported in a single FileNotFoundError.
+		"""
+		if algo not in FileSystem.CHECKSUM_ALGORITHMS:
+			raise ValueError(f"Unsupported checksum algorithm {algo}")
+		if not self.is_unix():
+			raise RuntimeError("checksum is only available on unix remote systems.")
+
+		paths = [paths] if isinstance(paths, str) else list(paths)
+		digests = {}
+		digest_len = {"md5" : 32, "sha1" : 40, "sha224" : 56, "sha256" : 64, "sha384" : 96, "sha512" : 128}[algo]
+		def record(line:str):
+			# '<digest>  <path>' ('<digest> *<path>' in binary mode), anything else is an error message
+			digest, path = line[:digest_len], line[digest_len + 2:]
+			if line[digest_len:digest_len + 1] == " " and all(c in "0123456789abcdef" for c in digest):
+				digests[path] = digest
+
+		self._xargs(f"{algo}sum --", paths, record)
+
+		missing = [p for p in paths if p not in digests]
+		if len(missing) > 0:
+			raise FileNotFoundError(f"Cannot checksum {', '.join(missing)}")
+		return { p : digests[p] for p in paths }
+
 
 # ------------------ FileSystemCommad
\ No newline at end of file
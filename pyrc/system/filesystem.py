@@ -17,25 +17,61 @@ class FileSystem:
 		EnvironDict acts as a gateway to a FileSystem object to get and set env variable of this FileSystem
 		d[var] invoques d.filesystem.env(key)
 		d[var] = value stores the values in the dict and will be passed down to the FileSystem in the next exec_command call
+		After d.prefetch(), d[var] reads the FileSystem's environment snapshot (see FileSystem.environment) instead,
+		so reading many variables costs a single command.
 		"""
 		def __init__(self, path:'FileSystem'):
 			super().__init__()
 			self.__path = path
+			# Read variables from the environment snapshot
+			self.__bulk = False
+			# Variables read from the FileSystem (as opposed to set by the user)
+			self.__fetched = set()
 
 		def __getitem__(self, key:str) -> str:
 			if key in self:
 				return super().__getitem__(key)
 			else:
-				self.__setitem__(key, self.__path.env(key))
-				return super().__getitem__(key)
-
-		def __setitem__(self, key, value):
-			return super().__setitem__(key, value)
+				value = self.__path.environment()[key] if self.__bulk else self.__path.env(key)
+				super().__setitem__(key, value)
+				self.__fetched.add(key)
+				return value
+
+		def __setitem__(self, key:str, value:str) -> None:
+			# Set by the user from now on: kept by refresh
+			self.__fetched.discard(key)
+			super().__setitem__(key, value)
+
+		def prefetch(self, refresh:bool = False) -> None:
+			"""
+			Fetch the whole environment of the FileSystem at once and read missing variables from it from now on.
+			The snapshot is kept by the FileSystem and is not copied in the dict,
+			as every variable of the dict is passed down to the next exec_command calls.
+			Args:
+				refresh (bool, optional): Fetch a new snapshot even if the FileSystem already has one. Defaults to False.
+			"""
+			self.__bulk = True
+			self.__path.environment(refresh = refresh)
+
+		def refresh(self) -> None:
+			"""
+			Forget the variables read from the FileSystem (variables set in the dict are kept)
+			and fetch a new environment snapshot if prefetch() was called
+			"""
+			for key in self.__fetched:
+				if key in self:
+					del self[key]
+			self.__fetched.clear()
+			if self.__bulk:
+				self.__path.environment(refresh = True)
 
 	@property
 	def ostype(self) -> OSTYPE:
 		return self.__ostype
 
+	# Algorithms supported by checksum (available both in hashlib and as coreutils '<algo>sum')
+	CHECKSUM_ALGORITHMS = ("md5", "sha1", "sha224", "sha256", "sha384", "sha512")
+
 	@ostype.setter
 	def ostype(self, type:OSTYPE):
 		self.__ostype = type
@@ -268,14 +304,46 @@ class FileSystem:
 		"""
 		return NotImplemented
 
-	def lsdir(self, path:str) -> 'FileSystemTree':
+	def iterls(self, path:str) -> 'Iterator[tuple[str, str, int]]':
+		"""
+		Lazy version of ls: yields the entries of path (no recursion) as they are read,
+		without building the whole listing first.
+		Returns:
+			Iterator[tuple[str, str, int]]: (name, type, size) tuples where type is 'f' (file),
+			'd' (directory), 'l' (broken symbolic link) or another letter for other kinds of files (see find's %y),
+			symbolic links being followed,
+			and size is the size (in bytes) of files, None for other entries.
+		"""
+		return NotImplemented
+
+	def lsdir(self, path:str, hidden:bool = False) -> 'FileSystemTree':
 		"""
 			Return files and directories in path (recursilvy) as a FileSystemTree
+		Args:
+			path (str): directory to list
+			hidden (bool, optional): also list hidden entries (names starting with '.') and what is under hidden directories. Defaults to False.
 		Returns:
 			FileSystemTree: Tree reprensenting the path directory structure
 		"""
 		return NotImplemented
 
+	def find(self, root:str, pattern:str = None, min_size:int = None, newer_than:float = None, type:str = None, hidden:bool = False) -> 'Iterator[tuple[str, str, int, float]]':
+		"""
+		Search the tree under root (same entries as lsdir) and yield the matching entries as they are found.
+		Args:
+			root (str): directory to search
+			pattern (str, optional): glob the entry name must match (as find -name). Defaults to None.
+			min_size (int, optional): only keep files of at least min_size bytes. Defaults to None.
+			newer_than (float, optional): only keep entries modified after this timestamp (seconds since epoch). Defaults to None.
+			type (str, optional): only keep entries of this type ('f', 'd' or 'l', see iterls). Defaults to None.
+			hidden (bool, optional): also search hidden entries and hidden directories, as lsdir. Defaults to False.
+		Raises:
+			FileNotFoundError: if root is not a valid directory
+		Returns:
+			Iterator[tuple[str, str, int, float]]: (path, type, size, mtime) tuples, path being joined to root
+		"""
+		return NotImplemented
+
 	def isfile(self, path:str) -> bool:
 		"""
 		Args:
@@ -388,6 +456,20 @@ class FileSystem:
 		"""
 		return NotImplemented
 
+	def checksum(self, paths:'list[str]', algo:str = "sha256") -> 'dict[str,str]':
+		"""
+		Hash the content of many files at once.
+		Args:
+			paths (list[str]): files to hash (a single path is also accepted)
+			algo (str, optional): one of FileSystem.CHECKSUM_ALGORITHMS. Defaults to "sha256".
+		Raises:
+			ValueError: if algo is not supported
+			FileNotFoundError: if some paths are not readable files
+		Returns:
+			dict[str,str]: hexadecimal digest of each path
+		"""
+		return NotImplemented
+
 	def append(self, line:str, file:str) -> None:
 		"""
 		Append the given file with the given line
@@ -396,6 +478,16 @@ class FileSystem:
 
 	def env(self, var:str) -> str:
 		return NotImplemented
+
+	def environment(self, refresh:bool = False) -> 'dict[str,str]':
+		"""
+		Snapshot of all the environment variables of the connected system
+		Args:
+			refresh (bool, optional): Fetch the variables again if the connector caches them. Defaults to False.
+		Returns:
+			dict[str,str]: variables values by name
+		"""
+		return NotImplemented
 		
 
 # ------------------ FileSystem
@@ -8,7 +8,8 @@ class FileSystemTree(object):
 			root:str,
 			parent:FileSystemTree=None, 
 			files:'list[str]'=[], 
-			dirs:'dict[str,FileSystemTree]'={}
+			dirs:'dict[str,FileSystemTree]'={},
+			stats:'dict[str,tuple[int,float]]'=None
 		):
 		# Filesystem to inspect
 		self.path = path
@@ -20,6 +21,10 @@ class FileSystemTree(object):
 		self.files = files
 		# Names (basename) of directories in this node
 		self.dirs = dirs
+		# (size, mtime) of files in this node, by basename, when the listing provided them
+		self.stats = {} if stats is None else stats
+		# Total size (in bytes) of the files of this subtree, cached by getsize()
+		self.size:int = None
 
 		if parent is None:
 			self.level = 0
@@ -111,9 +116,65 @@ class FileSystemTree(object):
 
 	def getsize(self) -> int:
 		"""
-		Get size of the tree as the some of the sizes of all its files
+		Get size of the tree as the some of the sizes of all its files.
+		Sizes are read from the listing stats (see lsdir), files without stats are asked to the filesystem one by one.
+		Totals are aggregated bottom-up in a single pass and cached on every node of the tree (see size).
 		"""
-		return sum([sum([self.path.getsize(f) for f in n.files]) for n in self.nodes()])
+		if self.size is None:
+			# Deepest nodes first so that children totals are known before their parent's
+			for n in reversed(self.nodes()):
+				if n.size is not None:
+					continue
+				n.size = sum([n.filesize(f) for f in n.files]) \
+					+ sum([d.size for d in n.dirs.values() if isinstance(d, FileSystemTree)])
+		return self.size
+
+	def filesize(self, name:str) -> int:
+		"""
+		Size (in bytes) of the file 'name' of this node
+		"""
+		if name in self.stats:
+			return self.stats[name][0]
+		return self.path.getsize(self.path.join(self.realpath(), name))
+
+	def insert(self, relpath:str, type:str, size:int = None, mtime:float = None) -> None:
+		"""
+		Insert a file or directory in the tree from a listing record.
+		Missing intermediate directories are created, so records can come in any order.
+		Args:
+			relpath (str): '/' separated path relative to this node
+			type (str): 'f' for a file, 'd' for a directory, other types are ignored
+			size (int, optional): file size in bytes. Defaults to None.
+			mtime (float, optional): file modification time (seconds since epoch). Defaults to None.
+		"""
+		parts = relpath.split("/")
+		node = self
+		for part in parts[:-1]:
+			node = node.__subtree(part)
+
+		name = parts[-1]
+		if type == "d":
+			node.__subtree(name)
+		elif type == "f":
+			node.files.append(name)
+			if size is not None:
+				node.stats[name] = (size, mtime)
+
+		# Cached totals are now wrong
+		while node is not None:
+			node.size = None
+			node = node.parent
+
+	def __subtree(self, name:str) -> FileSystemTree:
+		if name not in self.dirs:
+			self.dirs[name] = FileSystemTree(
+				path = self.path,
+				root = self.path.join(self.root, name),
+				parent = self,
+				files = [],
+				dirs = {}
+			)
+		return self.dirs[name]
 
 	@staticmethod
 	def get_tree(path:FileSystem, directory:str, parent = None):
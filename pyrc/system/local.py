@@ -1,5 +1,6 @@
 from genericpath import isdir
-import os, platform, sys
+import os, platform, sys, hashlib, mmap, fnmatch
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path, PosixPath, WindowsPath
 try:
     from subprocess import *
@@ -10,10 +11,31 @@ except:
 
 from pyrc.system.filesystem import FileSystem
 from pyrc.system.filesystemtree import FileSystemTree
+from pyrc.system.localcopy import LocalCopy, copy_file
 import pyrc.event as pyevent
 
+def _hash_file(path:str, algo:str) -> str:
+	"""
+	Hexadecimal digest of the file 'path'.
+	Large files are hashed through a memory map (no copy into python buffers),
+	hashlib releases the GIL while hashing so files can be hashed in parallel threads.
+	"""
+	h = hashlib.new(algo)
+	with open(path, "rb") as f:
+		size = os.fstat(f.fileno()).st_size
+		if size >= LocalFileSystem.MMAP_THRESHOLD:
+			with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as m:
+				h.update(m)
+		else:
+			for block in iter(lambda: f.read(1 << 20), b""):
+				h.update(block)
+	return h.hexdigest()
+
 # ------------------ LocalFileSystem
 class LocalFileSystem(FileSystem):
+	# Files from this size (in bytes) on are hashed through a memory map (see checksum)
+	MMAP_THRESHOLD = 16 << 20
+
 	def __init__(self) -> None:
 		super().__init__()
 
@@ -114,12 +136,99 @@ class LocalFileSystem(FileSystem):
 
 	#@overrides
 	def ls(self, path:str)-> 'list[str]':
-		root = FileSystemTree.get_root(self, path)
-		return root.files + list(root.dirs.keys())
+		files, dirs = [], []
+		for name, type, size in self.iterls(path):
+			(dirs if type == "d" else files).append(name)
+		return files + dirs
+
+	#@overrides
+	def iterls(self, path:str):
+		with os.scandir(path) as entries:
+			for entry in entries:
+				if entry.is_dir():
+					yield entry.name, "d", None
+				elif entry.is_file():
+					yield entry.name, "f", entry.stat().st_size
+				elif entry.is_symlink():
+					yield entry.name, "l", None
+				else:
+					yield entry.name, "o", None
 	
 	#@overrides
-	def lsdir(self, path:str):
-		return FileSystemTree.get_tree(self, path)
+	def lsdir(self, path:str, hidden:bool = False):
+		"""
+		Same tree as FileSystemTree.get_tree (directories symbolic links are followed, hidden entries skipped unless 'hidden')
+		but built with os.scandir so that file sizes and mtimes come with the listing (see FileSystemTree.stats)
+		"""
+		tree = FileSystemTree(path = self, root = self.realpath(path), parent = None, files = [], dirs = {})
+		stack = [tree]
+		while len(stack) > 0:
+			node = stack.pop()
+			with os.scandir(node.root) as entries:
+				for entry in entries:
+					if not hidden and entry.name.startswith("."):
+						continue
+					if entry.is_dir():
+						child = FileSystemTree(
+							path = self,
+							root = self.realpath(entry.path) if entry.is_symlink() else entry.path,
+							parent = node,
+							files = [],
+							dirs = {}
+						)
+						node.dirs[entry.name] = child
+						stack.append(child)
+					else:
+						node.files.append(entry.name)
+						try:
+							st = entry.stat()
+							node.stats[entry.name] = (st.st_size, st.st_mtime)
+						except OSError:
+							# Broken symbolic link
+							pass
+		return tree
+
+	#@overrides
+	def find(self, root:str, pattern:str = None, min_size:int = None, newer_than:float = None, type:str = None, hidden:bool = False):
+		"""
+		Walks root with os.scandir (directories symbolic links are followed and hidden entries skipped, as in lsdir)
+		and filters entries as they are listed
+		"""
+		if not self.isdir(root):
+			raise FileNotFoundError(f"Cannot search {root}. Path is not a valid directory")
+
+		stack = [root]
+		while len(stack) > 0:
+			with os.scandir(stack.pop()) as entries:
+				for entry in entries:
+					if not hidden and entry.name.startswith("."):
+						continue
+					if entry.is_dir():
+						t = "d"
+						stack.append(entry.path)
+					elif entry.is_file():
+						t = "f"
+					elif entry.is_symlink():
+						t = "l"
+					else:
+						t = "o"
+
+					if pattern is not None and not fnmatch.fnmatchcase(entry.name, pattern):
+						continue
+					if type is not None and t != type:
+						continue
+					if min_size is not None and t != "f":
+						continue
+					try:
+						st = entry.stat()
+					except OSError:
+						# Broken symbolic link
+						st = entry.stat(follow_symlinks = False)
+					if min_size is not None and st.st_size < min_size:
+						continue
+					if newer_than is not None and st.st_mtime <= newer_than:
+						continue
+					yield entry.path, t, st.st_size, st.st_mtime
 
 	#@overrides
 	def isfile(self, path:str) -> bool:
@@ -181,20 +290,62 @@ class LocalFileSystem(FileSystem):
 
 	#@overrides
 	def copy(self, src:str, dst:str, follow_symlinks:bool=True):
-		import shutil
-		return shutil.copy(src, dst, follow_symlinks = follow_symlinks)
+		"""
+		Files are copied like shutil.copy did (into dst if it is a directory, the path of the new file is returned),
+		in the kernel where possible (see copy_file).
+		Unlike shutil.copy, a directory src is copied recursively on a thread pool (see LocalCopy), like 'cp -r' on command connectors:
+		into dst if it is an existing directory, the path of the new directory is returned.
+		"""
+		if os.path.isdir(dst):
+			dst = os.path.join(dst, os.path.basename(src))
+		if os.path.isdir(src):
+			copy = LocalCopy()
+			copy.add_tree(src, dst)
+			copy.run()
+			return dst
+		if not follow_symlinks and os.path.islink(src):
+			import shutil
+			return shutil.copy(src, dst, follow_symlinks = False)
+		return copy_file(src, dst)
 
 	#@overrides
 	def getsize(self, path) -> int:
 		if self.isfile(path):
 			return os.path.getsize(path)
 		elif self.isdir(path):
-			return FileSystemTree.get_tree(self, path).getsize()
+			return self.lsdir(path).getsize()
 		else:
 			return 0
 
+	#@overrides
+	def checksum(self, paths:'list[str]', algo:str = "sha256") -> 'dict[str,str]':
+		"""
+		Files are hashed in parallel, one thread per core.
+		Like on command connectors, paths that cannot be hashed are all reported in a single FileNotFoundError.
+		"""
+		if algo not in FileSystem.CHECKSUM_ALGORITHMS:
+			raise ValueError(f"Unsupported checksum algorithm {algo}")
+
+		def digest(path:str) -> str:
+			try:
+				return _hash_file(path, algo)
+			except OSError:
+				return None
+
+		paths = [paths] if isinstance(paths, str) else list(paths)
+		with ThreadPoolExecutor(max_workers = os.cpu_count()) as executor:
+			digests = dict(zip(paths, executor.map(digest, paths)))
+		missing = [p for p in paths if digests[p] is None]
+		if len(missing) > 0:
+			raise FileNotFoundError(f"Cannot checksum {', '.join(missing)}")
+		return digests
+
 	#@overrides
 	def env(self, var:str) -> str:
 		return os.environ[var]
 
+	#@overrides
+	def environment(self, refresh:bool = False) -> 'dict[str,str]':
+		return dict(os.environ)
+
 # ------------------ LocalFileSystem
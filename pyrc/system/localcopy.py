@@ -0,0 +1,155 @@
+import os, sys, stat, errno, shutil, threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Bytes asked to the kernel per copy_file_range / sendfile call
+COPY_CHUNK = 64 << 20
+# Threads of a copy when not given, copies wait on the disks far more than on python
+COPY_WORKERS = 8
+
+# sendfile accepts regular files as input on Linux only
+_SENDFILE_FILES = hasattr(os, "sendfile") and sys.platform.startswith("linux")
+
+# Errors meaning that a kernel-side copy is not possible for this pair of files (nothing was copied)
+_UNSUPPORTED = { errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF, errno.EPERM }
+
+def _kernel_copy(call, src:int, dst:int, advance) -> bool:
+	"""
+	Copy 'src' into 'dst' (from their current positions to the end of 'src') with 'call'
+	Returns:
+		False if 'call' is not supported for these files and nothing was copied
+	"""
+	copied = 0
+	while True:
+		try:
+			n = call(src, dst)
+		except OSError as err:
+			if copied == 0 and err.errno in _UNSUPPORTED:
+				return False
+			raise
+		if n == 0:
+			# Some special files (procfs...) read as empty through these calls
+			return copied > 0 or os.fstat(src).st_size == 0
+		copied += n
+		advance(n)
+
+def _copy_data(src:int, dst:int, advance) -> None:
+	"""
+	Copy the content of the file descriptor 'src' into 'dst', in the kernel if possible:
+	copy_file_range (Linux, no copy through user space and reflinks on copy-on-write filesystems),
+	then sendfile (Linux), then plain reads and writes
+	"""
+	if hasattr(os, "copy_file_range") and _kernel_copy(lambda i, o: os.copy_file_range(i, o, COPY_CHUNK), src, dst, advance):
+		return
+	if _SENDFILE_FILES and _kernel_copy(lambda i, o: os.sendfile(o, i, None, COPY_CHUNK), src, dst, advance):
+		return
+	while True:
+		block = os.read(src, 1 << 20)
+		if len(block) == 0:
+			return
+		view = memoryview(block)
+		while len(view) > 0:
+			view = view[os.write(dst, view):]
+		advance(len(block))
+
+def copy_file(src:str, dst:str, advance = None) -> str:
+	"""
+	Copy the file 'src' (symbolic links are followed) to the file 'dst', replacing it, and give it the mode of 'src'.
+	Args:
+		advance (optional): Called with the number of bytes of every copied block. Defaults to None.
+	Returns:
+		'dst'
+	"""
+	advance = (lambda n: None) if advance is None else advance
+	if os.path.exists(dst) and os.path.samefile(src, dst):
+		raise shutil.SameFileError(f"{src} and {dst} are the same file")
+	with open(src, "rb") as fsrc:
+		mode = stat.S_IMODE(os.fstat(fsrc.fileno()).st_mode)
+		with open(dst, "wb") as fdst:
+			_copy_data(fsrc.fileno(), fdst.fileno(), advance)
+	os.chmod(dst, mode)
+	return dst
+
+# ------------------ LocalCopy
+class LocalCopy(object):
+	"""
+	Parallel copy of files and directories between local paths (e.g. between two volumes).
+	Trees are walked with os.scandir (directories symbolic links are followed, as in LocalFileSystem.lsdir)
+	and their directories created first, then files are copied on a thread pool, largest first,
+	with kernel-side copies where available (see copy_file). Files and directories keep their modes.
+	Progress is reported for the whole copy: progress(bytes copied, files copied) against nbytes and nfiles.
+		copy = LocalCopy(workers = 16)
+		copy.add_tree("/mnt/a/dataset", "/mnt/b/dataset")
+		copy.run()
+	"""
+	def __init__(self, workers:int = COPY_WORKERS, progress = None) -> None:
+		self.workers = workers
+		self.progress = progress
+		# (source, destination, size) of the files to copy
+		self.files:'list[tuple[str, str, int]]' = []
+		# (destination, mode) of the created directories, modes are applied once their files are copied
+		self.dirs:'list[tuple[str, int]]' = []
+		self.__lock = threading.Lock()
+		self.__nbytes = 0
+		self.__nfiles = 0
+
+	@property
+	def nbytes(self) -> int:
+		return sum([size for src, dst, size in self.files])
+
+	@property
+	def nfiles(self) -> int:
+		return len(self.files)
+
+	def add_file(self, src:str, dst:str) -> None:
+		"""
+		Copy the file 'src' to 'dst' (a file path, or an existing directory to copy into)
+		"""
+		if os.path.isdir(dst):
+			dst = os.path.join(dst, os.path.basename(src))
+		self.files.append((src, dst, os.path.getsize(src)))
+
+	def add_tree(self, src:str, dst:str) -> None:
+		"""
+		Copy the directory 'src' as the directory 'dst' (created if needed, existing files are replaced).
+		The destination tree is created right away.
+		"""
+		stack = [(src, dst)]
+		while len(stack) > 0:
+			srcdir, dstdir = stack.pop()
+			os.makedirs(dstdir, exist_ok = True)
+			self.dirs.append((dstdir, stat.S_IMODE(os.stat(srcdir).st_mode)))
+			with os.scandir(srcdir) as entries:
+				for entry in entries:
+					if entry.is_dir():
+						stack.append((entry.path, os.path.join(dstdir, entry.name)))
+					elif entry.is_file():
+						self.files.append((entry.path, os.path.join(dstdir, entry.name), entry.stat().st_size))
+
+	def __advance(self, nbytes:int, nfiles:int) -> None:
+		with self.__lock:
+			self.__nbytes += nbytes
+			self.__nfiles += nfiles
+			if self.progress is not None:
+				self.progress(self.__nbytes, self.__nfiles)
+
+	def __copy(self, job:'tuple[str, str, int]') -> None:
+		src, dst, size = job
+		copy_file(src, dst, lambda n: self.__advance(n, 0))
+		self.__advance(0, 1)
+
+	def run(self) -> 'tuple[int, int]':
+		"""
+		Copy everything that was added
+		Returns:
+			tuple[int, int]: bytes and files copied
+		"""
+		jobs = sorted(self.files, key = lambda j: j[2], reverse = True)
+		with ThreadPoolExecutor(max_workers = max(1, self.workers), thread_name_prefix = "pyrc-copy") as executor:
+			# Raises the first copy error
+			list(executor.map(self.__copy, jobs))
+		# Deepest first, in case a mode forbids writing into a directory
+		for dstdir, mode in reversed(self.dirs):
+			os.chmod(dstdir, mode)
+		return self.__nbytes, self.__nfiles
+
+# ------------------ LocalCopy
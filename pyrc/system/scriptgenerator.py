@@ -132,6 +132,10 @@ class ScriptGenerator(FileSystemCommand):
 	def env(self, var:str) -> str:
 		return self.exec_command(f"${var}")
 
+	#@overrides (no system to read from)
+	def environment(self, refresh:bool = False) -> 'dict[str,str]':
+		return {}
+
 
 # Utilitary Class for Bash scripting on linux
 class BashScriptGenerator(ScriptGenerator):
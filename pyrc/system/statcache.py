@@ -0,0 +1,83 @@
+import time, posixpath, threading
+from collections import OrderedDict
+
+# ------------------ StatCache
+class StatCache(object):
+	"""
+	Bounded, time limited cache of path predicates for FileSystemCommand connectors.
+	Each entry holds the set of '[[ ]]' test flags ('f', 'd', 'L', 'x') that are true for a path.
+	Least recently used entries are evicted once 'maxsize' is reached.
+	hits and misses count lookups so one can measure how many commands were saved.
+	"""
+	def __init__(self, ttl:float = 5.0, maxsize:int = 4096) -> None:
+		# Seconds an entry stays valid
+		self.ttl = ttl
+		# Maximum number of cached paths
+		self.maxsize = maxsize
+		self.hits = 0
+		self.misses = 0
+		# path -> (expiration time, flags)
+		self.__entries:'OrderedDict[str,tuple[float,frozenset]]' = OrderedDict()
+		self.__lock = threading.Lock()
+
+	def __len__(self):
+		return len(self.__entries)
+
+	@staticmethod
+	def key(path:str) -> str:
+		return posixpath.normpath(path)
+
+	def get(self, path:str) -> frozenset:
+		"""
+		Returns the cached flags of 'path', or None if missing or expired
+		"""
+		key = StatCache.key(path)
+		with self.__lock:
+			entry = self.__entries.get(key)
+			if entry is None or entry[0] < time.monotonic():
+				if entry is not None:
+					del self.__entries[key]
+				self.misses += 1
+				return None
+			self.__entries.move_to_end(key)
+			self.hits += 1
+			return entry[1]
+
+	def set(self, path:str, flags:frozenset) -> None:
+		key = StatCache.key(path)
+		with self.__lock:
+			self.__entries[key] = (time.monotonic() + self.ttl, frozenset(flags))
+			self.__entries.move_to_end(key)
+			while len(self.__entries) > self.maxsize:
+				self.__entries.popitem(last = False)
+
+	def invalidate(self, path:str) -> None:
+		"""
+		Drop 'path', everything below it and all its parents
+		"""
+		key = StatCache.key(path)
+		prefix = key.rstrip("/") + "/"
+		parents = set()
+		parent = posixpath.dirname(key)
+		while parent not in parents and parent != "":
+			parents.add(parent)
+			parent = posixpath.dirname(parent)
+
+		with self.__lock:
+			for k in list(self.__entries.keys()):
+				if k == key or k in parents or k.startswith(prefix):
+					del self.__entries[k]
+
+	def clear(self) -> None:
+		with self.__lock:
+			self.__entries.clear()
+
+	def info(self) -> 'dict[str,int]':
+		return {
+			"hits" : self.hits,
+			"misses" : self.misses,
+			"size" : len(self.__entries),
+			"maxsize" : self.maxsize
+		}
+
+# ------------------ StatCache
@@ -1,4 +1,5 @@
 from .testutils import *
+import time
 
 THIS_FILE = os.path.realpath(__file__)
 THIS_DIR = os.path.dirname(THIS_FILE)
@@ -62,6 +63,18 @@ def test_ls_cmd_unix(filesystem):
     assert sorted(files_and_folders_1) == sorted(files_and_folders_2)
     assert sorted(files_and_folders_2) == sorted(files_and_folders_3)
     
+@pytest.mark.depends(on=["test_ls"])
+def test_iterls(filesystem):
+    path, workspace = filesystem.path, filesystem.workspace
+
+    entries = list(path.iterls(workspace))
+    assert sorted([name for name, type, size in entries]) == sorted(path.ls(workspace))
+    for name, type, size in entries:
+        if type == "f":
+            assert path.isfile(path.join(workspace, name)) and size >= 0
+        if type == "d":
+            assert path.isdir(path.join(workspace, name)) and size is None
+
 
 @pytest.mark.depends(on=["test_ls"])
 def test_mkdir(filesystem):
@@ -216,3 +229,890 @@ def test_file_upload(filesystem):
     assert not local_path.isfile(local_filepath)
 
     
+
+
+# ------------------ Directory entries (walk0)
+
+def expected_walk0(root:str) -> tuple:
+    # What 'ls' listed and isfile / isdir classified: visible entries, symbolic links followed
+    names = [n for n in os.listdir(root) if not n.startswith(".")]
+    files = sorted(n for n in names if os.path.isfile(os.path.join(root, n)))
+    dirs = sorted(n for n in names if os.path.isdir(os.path.join(root, n)))
+    return os.path.realpath(root), dirs, files
+
+def test_walk0_entries(remote, tmp_path):
+    root = str(tmp_path)
+    os.makedirs(os.path.join(root, "d", "sub dir"))
+    os.makedirs(os.path.join(root, "d", ".hidden dir"))
+    os.makedirs(os.path.join(root, "d", "empty"))
+    os.makedirs(os.path.join(root, "target"))
+    for name in ["a file", "*", "a*b", "[x]", "?", ".dotfile", "  spaces  "]:
+        open(os.path.join(root, "d", name), "w").close()
+    os.symlink(os.path.join(root, "target"), os.path.join(root, "d", "link"))
+    os.symlink(os.path.join(root, "nowhere"), os.path.join(root, "d", "broken"))
+
+    directory = os.path.join(root, "d")
+    root_, dirs, files = remote.walk0(directory)
+    assert (root_, sorted(dirs), sorted(files)) == expected_walk0(directory)
+    assert "link" in dirs and "sub dir" in dirs and "a*b" in files
+    # The glob of an empty directory is not taken for an entry
+    assert remote.walk0(os.path.join(root, "d", "empty")) == (os.path.join(root, "d", "empty"), [], [])
+    with pytest.raises(FileNotFoundError):
+        remote.walk0(os.path.join(root, "missing"))
+
+
+# ------------------ Listings (lsdir, find)
+
+def make_hidden_tree(root:str) -> None:
+    os.makedirs(os.path.join(root, "d", ".git", "objects"))
+    os.makedirs(os.path.join(root, "d", "sub"))
+    for relpath in ["d/a", "d/.env", "d/sub/b", "d/.git/HEAD", "d/.git/objects/o"]:
+        with open(os.path.join(root, relpath), "w") as f:
+            f.write(relpath)
+
+def tree_shape(tree:pysys.FileSystemTree) -> tuple:
+    return sorted(tree.files), {name : tree_shape(sub) for name, sub in tree.dirs.items()}
+
+def test_lsdir_same_tree_as_get_tree(remote, tmp_path):
+    root = str(tmp_path)
+    make_hidden_tree(root)
+    os.makedirs(os.path.join(root, "other", "deep"))
+    open(os.path.join(root, "other", "deep", "c"), "w").close()
+    os.makedirs(os.path.join(root, "d", "empty"))
+    os.symlink(os.path.join(root, "other"), os.path.join(root, "d", "link"))
+    directory = os.path.join(root, "d")
+    tree, walked = remote.lsdir(directory), pysys.FileSystemTree.get_tree(remote, directory)
+    assert tree.root == walked.root
+    assert tree_shape(tree) == tree_shape(walked)
+
+def test_lsdir_raises_on_find_errors(remote, tmp_path):
+    root = str(tmp_path)
+    make_hidden_tree(root)
+    # find -L stops at the loop with an error instead of listing it
+    os.symlink("..", os.path.join(root, "d", "sub", "loop"))
+    with pytest.raises(RuntimeError):
+        remote.lsdir(os.path.join(root, "d"))
+    with pytest.raises(FileNotFoundError):
+        remote.lsdir(os.path.join(root, "missing"))
+
+def test_iterls_streams_entries(remote, tmp_path):
+    root = str(tmp_path)
+    os.makedirs(os.path.join(root, "d", "sub"))
+    for relpath, size in [("d/a", 10), ("d/b c", 2000)]:
+        with open(os.path.join(root, relpath), "wb") as f:
+            f.write(b"x" * size)
+    os.symlink(os.path.join(root, "d", "a"), os.path.join(root, "d", "link"))
+
+    directory = os.path.join(root, "d")
+    entries = sorted(remote.iterls(directory))
+    assert entries == [("a", "f", 10), ("b c", "f", 2000), ("link", "f", 10), ("sub", "d", None)]
+    assert sorted(pysys.LocalFileSystem().iterls(directory)) == entries
+    # Leaving the listing early releases the command
+    entries = remote.iterls(directory)
+    next(entries)
+    entries.close()
+    assert remote.isdir(directory)
+    with pytest.raises(FileNotFoundError):
+        next(remote.iterls(os.path.join(root, "missing")))
+
+def test_find_filters(remote, tmp_path):
+    root = str(tmp_path)
+    os.makedirs(os.path.join(root, "d", "sub"))
+    for relpath, size in [("d/a.txt", 10), ("d/b.bin", 2000), ("d/sub/c.txt", 300)]:
+        with open(os.path.join(root, relpath), "wb") as f:
+            f.write(b"x" * size)
+    old = time.time() - 3600
+    os.utime(os.path.join(root, "d", "a.txt"), (old, old))
+
+    directory = os.path.join(root, "d")
+    local = pysys.LocalFileSystem()
+    def names(fs, **filters) -> list:
+        return sorted(os.path.relpath(path, directory) for path, t, size, mtime in fs.find(directory, **filters))
+    for fs in [local, remote]:
+        assert names(fs) == ["a.txt", "b.bin", "sub", "sub/c.txt"]
+        assert names(fs, pattern = "*.txt") == ["a.txt", "sub/c.txt"]
+        assert names(fs, type = "d") == ["sub"]
+        assert names(fs, min_size = 300) == ["b.bin", "sub/c.txt"]
+        assert names(fs, newer_than = old + 60) == ["b.bin", "sub", "sub/c.txt"]
+        assert names(fs, pattern = "*.txt", min_size = 100) == ["sub/c.txt"]
+    entries = lambda fs: sorted((path, t, size) for path, t, size, mtime in fs.find(directory))
+    assert entries(local) == entries(remote)
+    with pytest.raises(FileNotFoundError):
+        list(remote.find(os.path.join(root, "missing")))
+
+@pytest.mark.parametrize("hidden", [False, True])
+def test_find_same_entries_local_and_remote(remote, tmp_path, hidden):
+    root = str(tmp_path)
+    make_hidden_tree(root)
+    directory = os.path.join(root, "d")
+    local = sorted((path, t, size) for path, t, size, mtime in pysys.LocalFileSystem().find(directory, hidden = hidden))
+    remote_entries = sorted((path, t, size) for path, t, size, mtime in remote.find(directory, hidden = hidden))
+    assert local == remote_entries
+    assert any("/.git/" in path for path, t, size in local) is hidden
+
+@pytest.mark.parametrize("hidden", [False, True])
+def test_lsdir_same_tree_local_and_remote(remote, tmp_path, hidden):
+    root = str(tmp_path)
+    make_hidden_tree(root)
+    directory = os.path.join(root, "d")
+    local, remote_tree = pysys.LocalFileSystem().lsdir(directory, hidden = hidden), remote.lsdir(directory, hidden = hidden)
+    assert sorted(local.realfiles()) == sorted(remote_tree.realfiles())
+    assert local.getsize() == remote_tree.getsize()
+    assert (".git" in local.dirs) is hidden
+
+
+# ------------------ Path predicates cache (FileSystemCommand.enable_stat_cache)
+
+def test_stat_cache_ttl_and_counters():
+    cache = pysys.StatCache(ttl = 0.05)
+    assert cache.get("/a") is None
+    cache.set("/a/", {"d"})
+    assert cache.get("/a") == {"d"}
+    time.sleep(0.1)
+    assert cache.get("/a") is None
+    assert cache.info() == {"hits" : 1, "misses" : 2, "size" : 0, "maxsize" : 4096}
+
+def test_stat_cache_eviction():
+    cache = pysys.StatCache(maxsize = 2)
+    cache.set("/a", {"f"})
+    cache.set("/b", {"f"})
+    # /a is now the most recently used, /b goes first
+    cache.get("/a")
+    cache.set("/c", {"f"})
+    assert len(cache) == 2
+    assert cache.get("/b") is None
+    assert cache.get("/a") == {"f"} and cache.get("/c") == {"f"}
+
+@pytest.fixture
+def cached(sshserver):
+    fs = pyrm.RemoteSSHFileSystem(**sshserver.connect_kwargs())
+    fs.open()
+    fs.enable_stat_cache(ttl = 60)
+    yield fs
+    fs.close()
+
+def test_stat_cache_saves_commands(cached, tmp_path, monkeypatch):
+    path = str(tmp_path)
+    cmds = count_execs(cached, monkeypatch)
+    # A miss fetches all the predicates of the path at once
+    assert cached.isdir(path) and not cached.isfile(path) and not cached.islink(path)
+    assert len(cmds) == 1
+    assert cached.stat_cache.info()["hits"] == 2 and cached.stat_cache.info()["misses"] == 1
+    # Modified behind the connector's back
+    os.rmdir(path)
+    assert cached.isdir(path)
+    cached.invalidate_stat_cache(path)
+    assert not cached.isdir(path)
+    assert len(cmds) == 2
+
+def test_stat_cache_invalidation(cached, tmp_path):
+    root = str(tmp_path)
+    d, f, u = cached.join(root, "d"), cached.join(root, "f"), cached.join(root, "u")
+    os.mkdir(u)
+    cases = [
+        (d, cached.isdir, lambda: cached.mkdir(d)),
+        (f, cached.isfile, lambda: cached.touch(f)),
+        (cached.join(d, "f"), cached.isfile, lambda: cached.copy(f, d)),
+        (d + ".zip", cached.isfile, lambda: cached.zip(d)),
+        (cached.join(u, "f"), cached.isfile, lambda: cached.unzip(d + ".zip", u)),
+        (f, cached.isfile, lambda: cached.unlink(f)),
+        (d, cached.isdir, lambda: cached.rmdir(d, recur = True)),
+    ]
+    for path, predicate, mutate in cases:
+        before = predicate(path)
+        assert cached.isdir(root)
+        mutate()
+        # The path and its parent are fetched again
+        assert cached.stat_cache.get(root) is None
+        assert predicate(path) is not before
+
+
+# ------------------ Batches of commands (FileSystemCommand.batch)
+
+def test_batch_single_exec(remote, tmp_path, monkeypatch):
+    root = str(tmp_path)
+    cmds = count_execs(remote, monkeypatch)
+    with remote.batch():
+        remote.mkdir(remote.join(root, "a"))
+        remote.mkdir(remote.join(root, "a", "b"))
+        remote.touch(remote.join(root, "a", "b", "f"))
+        assert len(cmds) == 0
+    assert len(cmds) == 1
+    assert os.path.isfile(os.path.join(root, "a", "b", "f"))
+
+def test_batch_error_type(remote, tmp_path):
+    root = str(tmp_path)
+    os.mkdir(os.path.join(root, "exists"))
+    with pytest.raises(FileExistsError):
+        with remote.batch():
+            remote.mkdir(remote.join(root, "exists"))
+    with pytest.raises(FileNotFoundError):
+        with remote.batch():
+            remote.unlink(remote.join(root, "missing"))
+
+def test_batch_stops_at_failing_step(remote, tmp_path):
+    root = str(tmp_path)
+    os.mkdir(os.path.join(root, "exists"))
+    with pytest.raises(FileExistsError):
+        with remote.batch():
+            remote.mkdir(remote.join(root, "before"))
+            remote.mkdir(remote.join(root, "exists"))
+            remote.mkdir(remote.join(root, "after"))
+    assert os.path.isdir(os.path.join(root, "before"))
+    assert not os.path.exists(os.path.join(root, "after"))
+
+
+# ------------------ Persistent shell (RemoteSSHFileSystem(persistent_shell = True))
+
+@pytest.fixture
+def shell(sshserver):
+    fs = pyrm.RemoteSSHFileSystem(persistent_shell = True, **sshserver.connect_kwargs())
+    fs.open()
+    yield fs
+    fs.close()
+
+def shell_run(fs, cmd:str) -> 'tuple[list[str], list[str], int]':
+    lines = []
+    out, err, status = fs.exec_command(cmd, event = pyevent.CommandCallbackEvent(fs, lines.append))
+    return lines, err, status
+
+def test_persistent_shell_sentinel_like_output(shell):
+    lines, err, status = shell_run(shell, "echo __pyrc_0123__ 5; printf '__pyrc_%s__\\n' abc >&2; printf tail")
+    assert (lines, err, status) == (["__pyrc_0123__ 5", "tail"], ["__pyrc_abc__"], 0)
+
+def test_persistent_shell_exit_status(shell):
+    assert shell_run(shell, "echo $$; cd /; export PYRC_VAR=1; exit 3")[2] == 3
+    # Nothing leaks from one command to the next
+    assert shell_run(shell, "echo x$PYRC_VAR; pwd")[0] == ["x", os.path.expanduser("~")]
+    assert shell_run(shell, "false")[2] == 1
+
+def test_persistent_shell_killed_command(shell):
+    pid = shell_run(shell, "echo $$")[0]
+    lines, err, status = shell_run(shell, "echo start; kill -9 $BASHPID; echo never")
+    assert (lines, status) == (["start"], 137)
+    # Same shell
+    assert shell_run(shell, "echo $$")[0] == pid
+    # The shell itself is killed: the next command starts a new one
+    lines, err, status = shell_run(shell, "echo start; kill -9 $$")
+    assert (lines, status) == (["start"], 137)
+    assert shell_run(shell, "echo $$")[0] != pid
+
+def test_persistent_shell_reuse(shell):
+    # Every command runs in the same bash
+    pid = shell_run(shell, "echo $$")[0]
+    for i in range(20):
+        assert shell_run(shell, f"echo {i}; echo $$") == ([str(i)] + pid, [], 0)
+
+
+# ------------------ Asynchronous facade (AsyncFileSystem)
+
+def track_concurrency(fs, name:str, monkeypatch) -> dict:
+    """
+    Record the peak number of concurrent calls of fs.<name>
+    """
+    import threading
+    counts, lock = {"running" : 0, "peak" : 0}, threading.Lock()
+    method = getattr(fs, name)
+    def tracked(*args, **kwargs):
+        with lock:
+            counts["running"] += 1
+            counts["peak"] = max(counts["peak"], counts["running"])
+        try:
+            # Long enough for the calls of the pool to overlap
+            time.sleep(0.02)
+            return method(*args, **kwargs)
+        finally:
+            with lock:
+                counts["running"] -= 1
+    monkeypatch.setattr(fs, name, tracked)
+    return counts
+
+def test_async_gather_bounds_concurrency(remote, tmp_path, monkeypatch):
+    import asyncio
+    root = str(tmp_path)
+    paths = [os.path.join(root, f"f{i}") for i in range(12)]
+    for path in paths[::2]:
+        open(path, "w").close()
+    local = pysys.LocalFileSystem()
+    counts = [track_concurrency(fs, "isfile", monkeypatch) for fs in (local, remote)]
+
+    async def main():
+        async with pysys.AsyncFileSystem(local, max_concurrency = 2) as a, pysys.AsyncFileSystem(remote, max_concurrency = 3) as r:
+            return await asyncio.gather(*[h.isfile(p) for h in (a, r) for p in paths])
+
+    assert asyncio.run(main()) == [i % 2 == 0 for i in range(len(paths))] * 2
+    assert [c["peak"] for c in counts] == [2, 3]
+
+def test_async_gather_propagates_exceptions(remote, tmp_path):
+    import asyncio
+    root = str(tmp_path)
+    open(os.path.join(root, "f"), "w").close()
+
+    async def main(return_exceptions:bool):
+        async with pysys.AsyncFileSystem(pysys.LocalFileSystem()) as a, pysys.AsyncFileSystem(remote) as r:
+            return await asyncio.gather(
+                a.isfile(os.path.join(root, "f")),
+                a.unlink(os.path.join(root, "missing")),
+                r.lsdir(os.path.join(root, "missing")),
+                return_exceptions = return_exceptions
+            )
+
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(main(False))
+    results = asyncio.run(main(True))
+    assert results[0] is True
+    assert all(isinstance(e, FileNotFoundError) for e in results[1:])
+
+
+# ------------------ Sizes (getsize)
+
+def test_getsize_matches_lsdir(remote, tmp_path):
+    root = str(tmp_path)
+    os.makedirs(os.path.join(root, "d", "sub"))
+    os.makedirs(os.path.join(root, "d", ".hidden"))
+    for relpath, size in [("d/a", 10), ("d/sub/b", 2000), ("d/.dotfile", 30), ("d/.hidden/c", 400), ("outside", 5000)]:
+        with open(os.path.join(root, relpath), "wb") as f:
+            f.write(b"x" * size)
+    os.symlink(os.path.join(root, "outside"), os.path.join(root, "d", "link"))
+
+    directory = remote.join(root, "d")
+    assert remote.getsize(directory) == remote.lsdir(directory).getsize()
+    assert remote.getsize(directory) == 10 + 2000 + 5000
+    assert remote.getsize(remote.join(root, "d", ".dotfile")) == 30
+    with pytest.raises(FileNotFoundError):
+        remote.getsize(remote.join(root, "missing"))
+    # find errors are not swallowed
+    os.symlink("..", os.path.join(root, "d", "sub", "loop"))
+    with pytest.raises(RuntimeError):
+        remote.getsize(directory)
+
+
+# ------------------ Environment (EnvironDict)
+
+def test_environ_prefetch(sshserver, monkeypatch):
+    # The in-process server starts commands with its own environment
+    monkeypatch.setenv("PYRC_VAR", "a b=c")
+    fs = pyrm.RemoteSSHFileSystem(**sshserver.connect_kwargs())
+    fs.open()
+    try:
+        cmds = count_execs(fs, monkeypatch)
+        fs.environ.prefetch()
+        assert (fs.environ["PYRC_VAR"], fs.environ["HOME"]) == ("a b=c", os.environ["HOME"])
+        assert len(cmds) == 1
+        # Values set in the dict do not change the snapshot
+        fs.environ["PYRC_VAR"] = "custom"
+        assert (fs.environ["PYRC_VAR"], fs.environment()["PYRC_VAR"]) == ("custom", "a b=c")
+        assert len(cmds) == 1
+    finally:
+        fs.close()
+
+def test_environ_refresh_keeps_user_values():
+    environ = pysys.LocalFileSystem().environ
+    assert environ["HOME"] == os.environ["HOME"]
+    environ["HOME"] = "/custom"
+    environ.refresh()
+    assert environ["HOME"] == "/custom"
+
+def test_environment_keeps_newlines(remote, monkeypatch):
+    # The in-process server starts commands with its own environment
+    monkeypatch.setenv("PYRC_MULTILINE", "a\n\n b=c\n")
+    environment = remote.environment(refresh = True)
+    assert environment["PYRC_MULTILINE"] == "a\n\n b=c\n"
+    assert environment["HOME"] == os.environ["HOME"]
+
+
+# ------------------ Host facts (RemoteSSHFileSystem.hostfacts)
+
+def test_hostfacts_cache(sshserver, tmp_path, monkeypatch):
+    import platform
+    from pyrc.remote.hostfacts import probe_command
+    kwargs = dict(sshserver.connect_kwargs(), hostfacts_cache = str(tmp_path / "hostfacts.json"))
+    first = pyrm.RemoteSSHFileSystem(**kwargs)
+    first.open()
+    try:
+        facts = first.hostfacts()
+        assert (facts["system"], facts["release"]) == (platform.system(), platform.release())
+        assert "bash" in facts["tools"] and first.has_tool("bash")
+        cmds = count_execs(first, monkeypatch)
+        assert first.hostfacts() == facts
+        assert first.platform() == { "system" : facts["system"], "release" : facts["release"] }
+        assert cmds == []
+    finally:
+        first.close()
+
+    # A new connector to the same host reads the facts saved on the disk
+    second = pyrm.RemoteSSHFileSystem(**kwargs)
+    cmds = count_execs(second, monkeypatch)
+    second.open()
+    try:
+        assert second.hostfacts() == facts
+        assert not any(probe_command() in cmd for cmd in cmds)
+    finally:
+        second.close()
+
+def test_parse_probe():
+    from pyrc.remote.hostfacts import parse_probe
+    facts = parse_probe(["system=Linux", "release=6.1.0", "shell=/bin/bash", "tool=tar", "tool=unknown-tool"])
+    assert facts == { "system" : "Linux", "release" : "6.1.0", "shell" : "/bin/bash", "tools" : ["tar"] }
+    # cmd.exe of Windows OpenSSH does not run the probe
+    assert parse_probe(["'uname' is not recognized as an internal or external command,"]) is None
+    assert parse_probe([]) is None
+
+def test_hostfacts_fallbacks(sshserver, monkeypatch):
+    import pyrc.remote.sshconnector as sshconnector
+    fs = pyrm.RemoteSSHFileSystem(**sshserver.connect_kwargs())
+    fs.open()
+    try:
+        assert fs.hostfacts()["system"] == "Linux"
+        monkeypatch.setattr(sshconnector, "probe_command", lambda: "echo uname: command not found >&2; exit 127")
+        facts = fs.hostfacts(refresh = True)
+        assert facts["system"] == "Linux" and facts["tools"] == []
+        monkeypatch.setattr(sshconnector, "python_probe_command", lambda: "exit 127")
+        assert fs.hostfacts(refresh = True)["system"] == "unknown"
+    finally:
+        fs.close()
+
+
+# ------------------ Checksums (checksum)
+
+def test_checksum_matches_hashlib(remote, tmp_path, monkeypatch):
+    import hashlib
+    root = str(tmp_path)
+    # Long names: the paths need more than 128KB, which xargs gets in several commands
+    paths = [os.path.join(root, f"file {i} " + "x" * 230) for i in range(500)]
+    for i, path in enumerate(paths):
+        with open(path, "wb") as f:
+            f.write(os.urandom(i * 7))
+    assert sum(len(p) + 1 for p in paths) > 128 << 10
+    cmds = count_execs(remote, monkeypatch)
+    for algo in ["md5", "sha256"]:
+        expected = {p : hashlib.new(algo, open(p, "rb").read()).hexdigest() for p in paths}
+        assert pysys.LocalFileSystem().checksum(paths, algo) == expected
+        assert remote.checksum(paths, algo) == expected
+    assert len(cmds) > 2
+
+def test_checksum_missing_paths(remote, tmp_path):
+    root = str(tmp_path)
+    path, missing = os.path.join(root, "a file"), os.path.join(root, "missing")
+    open(path, "w").close()
+    for fs in [pysys.LocalFileSystem(), remote]:
+        for paths in [[path, missing, root], missing]:
+            with pytest.raises(FileNotFoundError) as error:
+                fs.checksum(paths)
+            assert missing in str(error.value) and path not in str(error.value)
+
+
+# ------------------ Remote files (openfile, read_bytes, write_bytes)
+
+def test_read_write_bytes(remote, tmp_path):
+    path = os.path.join(str(tmp_path), "data file")
+    data = os.urandom(3 << 20)
+    remote.write_bytes(path, data)
+    assert open(path, "rb").read() == data
+    assert remote.read_bytes(path) == data
+    remote.write_bytes(path, b"short")
+    assert remote.read_bytes(path) == b"short"
+    remote.write_bytes(path, b"")
+    assert remote.read_bytes(path) == b""
+
+def test_openfile_reads(remote, tmp_path):
+    import io
+    path = os.path.join(str(tmp_path), "data")
+    data = os.urandom(1 << 20)
+    with open(path, "wb") as f:
+        f.write(data)
+
+    # Small windows: reads cross windows and use the ones requested ahead
+    with remote.openfile(path, window = 100 << 10) as f:
+        assert f.read(10) == data[:10]
+        # Raw reads stop at the end of the window
+        assert f.read(300 << 10) == data[10:100 << 10]
+        assert b"".join(iter(lambda: f.read(1000), b"")) == data[100 << 10:]
+        assert f.seek(500 << 10) == 500 << 10
+        assert f.read(5) == data[500 << 10:(500 << 10) + 5]
+        f.seek(-7, io.SEEK_END)
+        assert f.read() == data[-7:]
+        assert f.read(10) == b""
+        f.seek(3)
+        f.seek(4, io.SEEK_CUR)
+        buffer = bytearray(1000)
+        assert f.readinto(buffer) == 1000 and bytes(buffer) == data[7:1007]
+        assert f.tell() == 1007
+        f.seek(0)
+        assert f.read() == data
+        with pytest.raises(io.UnsupportedOperation):
+            f.write(b"x")
+    assert f.closed
+
+def test_openfile_writes(remote, tmp_path):
+    import io
+    path = os.path.join(str(tmp_path), "data")
+    chunks = [os.urandom(n) for n in [1, 70000, 12345, 1 << 20]]
+    with remote.openfile(path, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+        with pytest.raises(io.UnsupportedOperation):
+            f.read(1)
+    assert f.closed
+    # Closing waited for the pipelined writes
+    assert open(path, "rb").read() == b"".join(chunks)
+
+    with remote.openfile(path, "ab") as f:
+        f.write(b"tail")
+    with remote.openfile(path, "r+b") as f:
+        f.seek(1)
+        f.write(b"abc")
+        f.seek(0)
+        assert f.read(5) == chunks[0] + b"abc" + chunks[1][3:4]
+    assert open(path, "rb").read() == chunks[0] + b"abc" + b"".join(chunks[1:])[3:] + b"tail"
+
+
+# ------------------ Round trips of the transfer strategies
+
+def make_transfer_tree(root:str) -> str:
+    """
+    Nested directories with hidden, empty, text and binary files and an empty directory
+    """
+    source = os.path.join(root, "tree")
+    os.makedirs(os.path.join(source, "a", "b"))
+    os.makedirs(os.path.join(source, ".hidden"))
+    os.makedirs(os.path.join(source, "a", "void"))
+    files = {
+        "text" : b"line\n" * 40000,
+        "a/empty" : b"",
+        "a/b/binary" : os.urandom(300000),
+        ".hidden/config" : b"hidden\n",
+    }
+    files.update({ f"a/small{i}" : f"small {i}\n".encode() * (i + 1) for i in range(20) })
+    for relpath, content in files.items():
+        with open(os.path.join(source, *relpath.split("/")), "wb") as f:
+            f.write(content)
+    return source
+
+def round_trip(source:str, destination:str, remote, **kwargs) -> None:
+    """
+    Upload 'source' to 'destination', then download the upload back next to it, both with 'kwargs'
+    """
+    local = pysys.LocalFileSystem()
+    os.makedirs(os.path.join(destination, "up"))
+    os.makedirs(os.path.join(destination, "down"))
+    pyrm.transfer(source, os.path.join(destination, "up"), local, remote, **kwargs)
+    uploaded = os.path.join(destination, "up", os.path.basename(source))
+    pyrm.transfer(uploaded, os.path.join(destination, "down"), remote, local, **kwargs)
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_round_trip_scp(remote, tmp_path, workers):
+    source = make_transfer_tree(str(tmp_path))
+    round_trip(source, str(tmp_path / "dst"), remote, strategy = "scp", workers = workers)
+    assert tree_content(str(tmp_path / "dst" / "up" / "tree")) == tree_content(source)
+    assert tree_content(str(tmp_path / "dst" / "down" / "tree")) == tree_content(source)
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_round_trip_tar(remote, tmp_path, workers):
+    source = make_transfer_tree(str(tmp_path))
+    round_trip(source, str(tmp_path / "dst"), remote, strategy = "tar", workers = workers)
+    assert tree_content(str(tmp_path / "dst" / "up" / "tree")) == tree_content(source)
+    assert tree_content(str(tmp_path / "dst" / "down" / "tree")) == tree_content(source)
+
+@pytest.mark.parametrize("codec", ["gzip", "zstd", "lz4", "auto"])
+def test_round_trip_compression(remote, tmp_path, codec):
+    from pyrc.remote.compression import local_codecs
+    if codec != "auto" and (codec not in local_codecs() or not remote.has_tool(codec)):
+        pytest.skip(f"{codec} is not installed")
+    source = make_transfer_tree(str(tmp_path))
+    round_trip(source, str(tmp_path / "dst"), remote, compression = codec)
+    assert tree_content(str(tmp_path / "dst" / "down" / "tree")) == tree_content(source)
+    # Single files are streamed
+    round_trip(os.path.join(source, "text"), str(tmp_path / "file"), remote, compression = codec)
+    assert tree_content(str(tmp_path / "file" / "down")) == { "text" : b"line\n" * 40000 }
+
+def test_codec_errors(monkeypatch):
+    import io
+    import pyrc.remote.compression as compression
+    monkeypatch.setattr(compression, "_ZSTD_ENABLED_", False)
+    for create in [compression.ZstdCodec, lambda: compression.get_codec("zstd")]:
+        with pytest.raises(RuntimeError, match = "zstandard"):
+            create()
+    assert "zstd" not in compression.local_codecs()
+    # A codec without a python implementation fails before anything is written
+    with pytest.raises(RuntimeError):
+        compression.CompressWriter(io.BytesIO(), compression.Codec("xz", "xz"))
+    with pytest.raises(RuntimeError):
+        compression.DecompressReader(io.BytesIO(), compression.Codec("xz", "xz"))
+
+def test_round_trip_resumable(remote, tmp_path):
+    from pyrc.remote.resumable import resumable_transfer
+    source = os.path.join(make_transfer_tree(str(tmp_path)), "a", "b", "binary")
+    local = pysys.LocalFileSystem()
+    journal = str(tmp_path / "journal")
+    os.makedirs(str(tmp_path / "up"))
+    os.makedirs(str(tmp_path / "down"))
+
+    class Interrupted(Exception):
+        pass
+    def interrupt(filename, size, sent):
+        if sent >= 2 * 65536:
+            raise Interrupted()
+    for from_fs, to_fs, to_dirpath in [(local, remote, "up"), (remote, local, "down")]:
+        with pytest.raises(Interrupted):
+            resumable_transfer(source, str(tmp_path / to_dirpath), from_fs, to_fs, chunk_size = 65536, journal_dir = journal, progress = interrupt)
+        received = resumable_transfer(source, str(tmp_path / to_dirpath), from_fs, to_fs, chunk_size = 65536, journal_dir = journal)
+        with open(received, "rb") as f, open(source, "rb") as s:
+            assert f.read() == s.read()
+        source = received
+    assert sorted(os.listdir(str(tmp_path / "down"))) == ["binary"]
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_round_trip_relay(remote, tmp_path, compression):
+    source = make_transfer_tree(str(tmp_path))
+    destination = str(tmp_path / "dst")
+    os.makedirs(destination)
+    with SSHServerFixture() as server:
+        other = pyrm.RemoteSSHFileSystem(**server.connect_kwargs())
+        other.open()
+        try:
+            pyrm.transfer(source, destination, remote, other, remote_mode = "relay", compression = compression)
+            pyrm.transfer(os.path.join(source, "text"), destination, remote, other, remote_mode = "relay", compression = compression)
+        finally:
+            other.close()
+    assert tree_content(os.path.join(destination, "tree")) == tree_content(source)
+    with open(os.path.join(destination, "text"), "rb") as f:
+        assert f.read() == b"line\n" * 40000
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_round_trip_pack(remote, tmp_path, workers):
+    source = make_transfer_tree(str(tmp_path))
+    # Small bundles so that the tree needs several of them next to files sent with scp
+    round_trip(source, str(tmp_path / "dst"), remote, strategy = "pack", workers = workers, pack_threshold = 100000, pack_bundle_size = 1024)
+    assert tree_content(str(tmp_path / "dst" / "up" / "tree")) == tree_content(source)
+    assert tree_content(str(tmp_path / "dst" / "down" / "tree")) == tree_content(source)
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_round_trip_local_copy(tmp_path, workers):
+    source = make_transfer_tree(str(tmp_path))
+    local = pysys.LocalFileSystem()
+    os.makedirs(str(tmp_path / "dst"))
+    pyrm.transfer(source, str(tmp_path / "dst"), local, local, workers = workers)
+    assert tree_content(str(tmp_path / "dst" / "tree")) == tree_content(source)
+    for dirpath, dirnames, filenames in os.walk(source):
+        for name in filenames:
+            copy = os.path.join(str(tmp_path / "dst"), os.path.relpath(os.path.join(dirpath, name), str(tmp_path)))
+            assert os.stat(copy).st_mode == os.stat(os.path.join(dirpath, name)).st_mode
+
+def test_local_copy_contract(tmp_path):
+    import shutil, stat
+    local = pysys.LocalFileSystem()
+    root = str(tmp_path)
+    source = make_transfer_tree(root)
+    script = os.path.join(source, "script")
+    with open(script, "w") as f:
+        f.write("#!/bin/sh\n")
+    os.chmod(script, 0o750)
+    os.makedirs(os.path.join(root, "into"))
+    os.makedirs(os.path.join(root, "twin"))
+
+    # Files: same return value and result as shutil.copy
+    for dst in ["into", "into/renamed"]:
+        copied = local.copy(script, os.path.join(root, dst))
+        expected = shutil.copy(script, os.path.join(root, dst.replace("into", "twin")))
+        assert copied == expected.replace("twin", "into")
+        assert open(copied).read() == "#!/bin/sh\n" and stat.S_IMODE(os.stat(copied).st_mode) == 0o750
+    os.symlink(script, os.path.join(root, "link"))
+    assert os.path.islink(local.copy(os.path.join(root, "link"), os.path.join(root, "into", "link"), follow_symlinks = False))
+
+    # Directories: copied recursively, into dst if it exists
+    assert local.copy(source, os.path.join(root, "into")) == os.path.join(root, "into", "tree")
+    assert local.copy(source, os.path.join(root, "new")) == os.path.join(root, "new")
+    assert tree_content(os.path.join(root, "into", "tree")) == tree_content(source)
+    assert tree_content(os.path.join(root, "new")) == tree_content(source)
+
+def test_round_trip_planner(remote, tmp_path):
+    source = make_transfer_tree(str(tmp_path))
+    plan = pyrm.plan_transfer(source, pysys.LocalFileSystem(), remote)
+    assert plan.choice in plan.candidates and plan.predicted == min(plan.candidates.values())
+    assert plan.stats["files"] == 24
+    round_trip(source, str(tmp_path / "dst"), remote, strategy = "auto")
+    assert tree_content(str(tmp_path / "dst" / "up" / "tree")) == tree_content(source)
+    assert tree_content(str(tmp_path / "dst" / "down" / "tree")) == tree_content(source)
+    round_trip(os.path.join(source, "text"), str(tmp_path / "file"), remote, strategy = "auto")
+    assert tree_content(str(tmp_path / "file" / "down")) == { "text" : b"line\n" * 40000 }
+
+
+# ------------------ Incremental transfers (transfer(sync = True), SyncPlan)
+
+@pytest.mark.parametrize("direction", ["upload", "download"])
+def test_sync_sends_changes_only(remote, tmp_path, direction):
+    from pyrc.remote import SyncPlan
+    source = make_transfer_tree(str(tmp_path / "src"))
+    destination = str(tmp_path / "dst")
+    os.makedirs(destination)
+    local = pysys.LocalFileSystem()
+    from_fs, to_fs = (local, remote) if direction == "upload" else (remote, local)
+
+    pyrm.transfer(source, destination, from_fs, to_fs, sync = True)
+    received = os.path.join(destination, "tree")
+    assert tree_content(received) == tree_content(source)
+    assert SyncPlan(source, received, from_fs, to_fs).files == {}
+
+    # A modified file, a new file and a file removed from the source
+    with open(os.path.join(source, "a", "small3"), "ab") as f:
+        f.write(b"more\n")
+    with open(os.path.join(source, "new"), "wb") as f:
+        f.write(b"new\n")
+    os.remove(os.path.join(source, "text"))
+    plan = SyncPlan(source, received, from_fs, to_fs, delete = True)
+    assert sorted(plan.files) == ["a/small3", "new"] and plan.unlinks == ["text"]
+    pyrm.transfer(source, destination, from_fs, to_fs, sync = True, sync_delete = True)
+    assert tree_content(received) == tree_content(source)
+
+def sync_fixture_trees(root:str) -> 'tuple[str, str]':
+    source, destination = os.path.join(root, "src"), os.path.join(root, "dst")
+    make_hidden_tree(source)
+    os.makedirs(destination)
+    return os.path.join(source, "d"), destination
+
+@pytest.mark.parametrize("direction", ["upload", "download"])
+def test_sync_twice_is_empty(remote, tmp_path, direction):
+    from pyrc.remote import SyncPlan
+    source, destination = sync_fixture_trees(str(tmp_path))
+    local = pysys.LocalFileSystem()
+    from_fs, to_fs = (local, remote) if direction == "upload" else (remote, local)
+
+    pyrm.transfer(source, destination, from_fs, to_fs, sync = True, sync_delete = True)
+    received = os.path.join(destination, "d")
+    assert tree_content(received) == tree_content(source)
+
+    plan = SyncPlan(source, received, from_fs, to_fs, delete = True)
+    assert plan.nfiles == 0 and plan.mkdirs == [] and plan.unlinks == [] and plan.rmdirs == []
+    pyrm.transfer(source, destination, from_fs, to_fs, sync = True, sync_delete = True)
+    assert tree_content(received) == tree_content(source)
+
+@pytest.mark.parametrize("direction", ["upload", "download"])
+def test_sync_delete_keeps_source_paths(remote, tmp_path, direction):
+    from pyrc.remote import SyncPlan
+    source, destination = sync_fixture_trees(str(tmp_path))
+    local = pysys.LocalFileSystem()
+    from_fs, to_fs = (local, remote) if direction == "upload" else (remote, local)
+    received = os.path.join(destination, "d")
+    # Destination entries missing from the source, next to ones the source has
+    os.makedirs(os.path.join(received, ".git", "stale"))
+    for relpath in [".git/HEAD", ".stale", "sub/stale", ".git/stale/o"]:
+        os.makedirs(os.path.dirname(os.path.join(received, relpath)), exist_ok = True)
+        with open(os.path.join(received, relpath), "w") as f:
+            f.write("stale")
+
+    plan = SyncPlan(source, received, from_fs, to_fs, delete = True)
+    removed = plan.unlinks + plan.rmdirs
+    assert sorted(removed) == [".git/stale", ".stale", "sub/stale"]
+    assert all(not os.path.exists(os.path.join(source, *rel.split("/"))) for rel in removed)
+    plan.run()
+    assert tree_content(received) == tree_content(source)
+
+
+# ------------------ Benchmark results (pyrc.bench.compare)
+
+def bench_results(path:str, medians:dict) -> str:
+    import json
+    with open(path, "w") as f:
+        json.dump({ "meta" : {}, "results" : [{ "name" : name, "tree" : "tiny", "median" : m } for name, m in medians.items()] }, f)
+    return path
+
+def test_bench_compare(tmp_path):
+    from pyrc.bench import compare
+    before = bench_results(str(tmp_path / "before.json"), {"lsdir" : 1.0, "walk0" : 2.0, "isfile" : 0.0, "gone" : 1.0})
+    after = bench_results(str(tmp_path / "after.json"), {"lsdir" : 1.05, "walk0" : 3.0, "isfile" : 0.5, "new" : 1.0})
+    rows = { r["name"] : r for r in compare(before, after) }
+    # Cases missing from either file are left out
+    assert sorted(rows) == ["isfile", "lsdir", "walk0"]
+    assert rows["lsdir"]["ratio"] == pytest.approx(1.05) and not rows["lsdir"]["regression"]
+    assert rows["walk0"]["ratio"] == pytest.approx(1.5) and rows["walk0"]["regression"]
+    assert (rows["walk0"]["before"], rows["walk0"]["after"], rows["walk0"]["tree"]) == (2.0, 3.0, "tiny")
+    assert rows["isfile"]["ratio"] is None and not rows["isfile"]["regression"]
+    assert compare(before, after, threshold = 0.01)[0]["regression"]
+
+def test_bench_compare_exit_status(tmp_path, monkeypatch, capsys):
+    from pyrc.bench.__main__ import main
+    before = bench_results(str(tmp_path / "before.json"), {"lsdir" : 1.0})
+    for median, status in [(1.05, 0), (2.0, 1)]:
+        after = bench_results(str(tmp_path / "after.json"), {"lsdir" : median})
+        monkeypatch.setattr("sys.argv", ["pyrc.bench", "compare", before, after])
+        with pytest.raises(SystemExit) as exit:
+            main()
+        assert exit.value.code == status
+    assert "REGRESSION" in capsys.readouterr().out
+
+
+# ------------------ Command outputs (FluxIterator)
+
+FLUX_TEXT = "première ligne\n€ at the start\n\nlast line without newline 日本"
+
+def chunks(data:bytes, size:int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7])
+def test_flux_iterator_chunks(size):
+    expected = FLUX_TEXT.split("\n")
+    assert list(pyevent.FluxIterator(chunks(FLUX_TEXT.encode("utf-8"), size))) == expected
+
+    class Pipe(object):
+        # Buffered pipe returning at most 'size' bytes per read
+        def __init__(self, data:bytes):
+            self.data = data
+        def read1(self, n:int) -> bytes:
+            chunk, self.data = self.data[:min(n, size)], self.data[min(n, size):]
+            return chunk
+    assert list(pyevent.FluxIterator(Pipe(FLUX_TEXT.encode("utf-8")))) == expected
+
+def test_flux_iterator_feed():
+    it = pyevent.FluxIterator(None)
+    euro = "€".encode("utf-8")
+    assert it.feed(b"ab") == []
+    # A line and a character both cut between chunks
+    assert it.feed(b"c\nd" + euro[:1]) == ["abc"]
+    assert it.feed(euro[1:] + b"e\n") == ["d€e"]
+    assert it.feed(b"tail") == []
+    assert it.feed(None) == ["tail"]
+
+
+# ------------------ Concurrent reads of stdout and stderr (MergedFluxIterator)
+
+def test_large_outputs(remote):
+    # Both outputs overflow the channel windows: reading them one after the other would hang
+    out, err, status = remote.exec_command("for i in $(seq 20000); do echo out $i; echo err $i >&2; done", event = pyevent.CommandStoreEvent())
+    # CommandStorer keeps stderr lines with stdout, each output in its own order
+    assert [line for line in out if line.startswith("out")] == [f"out {i}" for i in range(1, 20001)]
+    assert [line for line in out if line.startswith("err")] == [f"err {i}" for i in range(1, 20001)]
+    assert err == []
+
+def test_failing_event_releases_persistent_shell(sshserver):
+    import threading
+    class Failing(pyevent.CommandStoreEvent):
+        def progress(self, stdoutline:str, stderrline:str):
+            raise ValueError("progress failed")
+
+    fs = pyrm.RemoteSSHFileSystem(persistent_shell = True, **sshserver.connect_kwargs())
+    fs.open()
+    try:
+        for i in range(3):
+            with pytest.raises(ValueError):
+                fs.exec_command("for i in $(seq 5000); do echo out $i; echo err $i >&2; done", event = Failing())
+            assert not any(t.name == "pyrc-flux" and t.is_alive() for t in threading.enumerate())
+            out, err, status = fs.exec_command("echo next; echo warning >&2", event = pyevent.CommandStoreEvent())
+            # CommandStorer keeps stderr lines with stdout
+            assert (sorted(out), err, status) == (["next", "warning"], [], 0)
+    finally:
+        fs.close()
+
+def test_scrapper_events_status(sshserver):
+    # PersistentShell fluxes carry the status of each command
+    fs = pyrm.RemoteSSHFileSystem(persistent_shell = True, **sshserver.connect_kwargs())
+    fs.open()
+    try:
+        lines = []
+        assert fs.exec_command("echo out; echo err >&2; false", event = pyevent.CommandCallbackEvent(fs, lines.append)) == ([], ["err"], 1)
+        assert lines == ["out"]
+        assert fs.exec_command("printf 'a\\0b'; false", event = pyevent.CommandRawEvent(fs)) == ("a\0b", [], 1)
+        assert fs.exec_command("true", event = pyevent.CommandRawEvent(fs)) == ("", [], 0)
+    finally:
+        fs.close()
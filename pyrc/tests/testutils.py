@@ -3,6 +3,7 @@ import pytest, os
 import pyrc.remote as pyrm
 import pyrc.system as pysys
 import pyrc.event.event as pyevent
+from pyrc.bench import SSHServerFixture
 
 THIS_FILE = os.path.realpath(__file__)
 THIS_DIR = os.path.dirname(THIS_FILE)
@@ -41,4 +42,42 @@ FILESYSTEM_OBJECTS = [
 def filesystem(request):
     # Current element of FILESYSTEM_OBJECTS array
     # It should be a pyrc FileSystem obejct !
-    return request.param 
\ No newline at end of file
+    return request.param 
+
+# In-process SSH server running commands on localhost: paths of tmp_path are valid on both sides
+@pytest.fixture(scope="module")
+def sshserver():
+    with SSHServerFixture() as server:
+        yield server
+
+@pytest.fixture(scope="module")
+def remote(sshserver):
+    fs = pyrm.RemoteSSHFileSystem(**sshserver.connect_kwargs())
+    fs.open()
+    yield fs
+    fs.close()
+
+def count_execs(fs, monkeypatch) -> list:
+    """
+    Record the commands 'fs' executes from now on
+    """
+    cmds = []
+    exec_command = fs.exec_command
+    def recorded(cmd, *args, **kwargs):
+        cmds.append(cmd)
+        return exec_command(cmd, *args, **kwargs)
+    monkeypatch.setattr(fs, "exec_command", recorded)
+    return cmds
+
+def tree_content(root:str) -> dict:
+    """
+    {relative path : content} of the files under 'root', None for directories
+    """
+    content = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        for d in dirnames:
+            content[os.path.relpath(os.path.join(dirpath, d), root)] = None
+        for f in filenames:
+            with open(os.path.join(dirpath, f), "rb") as fd:
+                content[os.path.relpath(os.path.join(dirpath, f), root)] = fd.read()
+    return content
@@ -23,9 +23,10 @@ setuptools.setup(
         "pyrc.remote"    : "pyrc/remote",
         "pyrc.system"    : "pyrc/system",
         "pyrc.event"     : "pyrc/event",
+        "pyrc.bench"     : "pyrc/bench",
         "pyrc.cliwrapper" : "pyrc/cliwrapper"
     },
-    packages = ["pyrc", "pyrc.remote", "pyrc.system", "pyrc.event", "pyrc.cliwrapper", "pyrc.docker"], 
+    packages = ["pyrc", "pyrc.remote", "pyrc.system", "pyrc.event", "pyrc.cliwrapper", "pyrc.docker", "pyrc.bench"], 
     test_suite="pyrc.tests",
     #packages=setuptools.find_packages(where="pyrc"),
     python_requires=">=3.0",
@@ -34,4 +35,7 @@ setuptools.setup(
        "scp",
        "rich"
    ],
+   extras_require={
+       "compression": ["zstandard", "lz4"]
+   },
 )